@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from compression_codecs import codec_for_path
+from settings import DATA_DIR, ARCHIVE_CATALOG_FILE, ARCHIVE_CACHE_MAX_MB
+
+
+class ArchiveCatalog:
+    # One catalog per process so the deduplicator, DataSaver and CSV export share parses
+    _shared = None
+    _shared_guard = threading.Lock()
+
+    def __init__(self, catalog_file=ARCHIVE_CATALOG_FILE, max_cache_mb=ARCHIVE_CACHE_MAX_MB):
+        self.catalog_file = catalog_file
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)
+        self.lock = threading.RLock()
+        self.entries = self._load_entries()  # path key -> {size, mtime_ns, hash}
+        self.cache = OrderedDict()  # path key -> {fingerprint, hash, value, bytes}, least recently used first
+        self.cache_bytes = 0
+        self.stats = {
+            'files_decoded': 0,
+            'bytes_decoded': 0,
+            'cache_hits': 0,
+            'evictions': 0
+        }
+
+    @classmethod
+    def shared(cls):
+        """The process-wide catalog used by default everywhere."""
+        with cls._shared_guard:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _load_entries(self):
+        try:
+            if self.catalog_file.exists():
+                with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                    return json.load(f).get('files', {})
+        except Exception as e:
+            print(f"Error loading archive catalog: {e}")
+        return {}
+
+    def save(self):
+        """Persist the size/mtime/hash manifest, dropping files that no longer exist."""
+        try:
+            with self.lock:
+                files = {
+                    key: entry for key, entry in self.entries.items()
+                    if (DATA_DIR / key).exists() or os.path.exists(key)
+                }
+                self.entries = files
+
+            tmp_path = self.catalog_file.with_name(self.catalog_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'files': files}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.catalog_file)
+        except Exception as e:
+            print(f"Error saving archive catalog: {e}")
+
+    def _key(self, path):
+        try:
+            return path.resolve().relative_to(DATA_DIR.resolve()).as_posix()
+        except ValueError:
+            return str(path.resolve())
+
+    def _fingerprint(self, path):
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _record_entry(self, key, fingerprint, digest):
+        self.entries[key] = {'size': fingerprint[0], 'mtime_ns': fingerprint[1], 'hash': digest}
+
+    def load_json(self, path):
+        """Parsed JSON document (any codec), decoded at most once while the file is unchanged.
+
+        The returned object is shared - call invalidate(path) before modifying it.
+        """
+        return self._load(path, json.loads)
+
+    def load_records(self, path):
+        """Parsed JSON Lines records of a segment (any codec), decoded at most once while unchanged."""
+        return self._load(path, lambda data: [json.loads(line) for line in data.splitlines() if line.strip()])
+
+    def _load(self, path, parse):
+        key = self._key(path)
+        fingerprint = self._fingerprint(path)
+
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached['fingerprint'] == fingerprint:
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return cached['value']
+
+        raw = path.read_bytes()
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached['hash'] == digest:
+                # Rewritten with identical bytes - the earlier parse is still valid
+                cached['fingerprint'] = fingerprint
+                self._record_entry(key, fingerprint, digest)
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return cached['value']
+
+        data = codec_for_path(path).decompress(raw)
+        value = parse(data)
+
+        with self.lock:
+            self.stats['files_decoded'] += 1
+            self.stats['bytes_decoded'] += len(data)
+            self._record_entry(key, fingerprint, digest)
+            self._store(key, {'fingerprint': fingerprint, 'hash': digest, 'value': value, 'bytes': len(data)})
+
+        return value
+
+    def _store(self, key, cached):
+        self._drop(key)
+        self.cache[key] = cached
+        self.cache_bytes += cached['bytes']
+
+        # Evict least recently used parses; the newest entry stays even if it alone exceeds the budget
+        while self.cache_bytes > self.max_cache_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted['bytes']
+            self.stats['evictions'] += 1
+
+    def _drop(self, key):
+        cached = self.cache.pop(key, None)
+        if cached:
+            self.cache_bytes -= cached['bytes']
+
+    def invalidate(self, path):
+        """Drop the cached parse of a file (before modifying a shared object or rewriting the file)."""
+        with self.lock:
+            self._drop(self._key(path))
+
+    def record_write(self, path, parsed=None, decoded_bytes=0):
+        """Note that a file was (re)written: refresh size/mtime/hash and drop its old parse.
+
+        Writers that still hold what they wrote can pass it as parsed, so it is never decoded back.
+        """
+        raw = path.read_bytes()
+        fingerprint = self._fingerprint(path)
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+        with self.lock:
+            key = self._key(path)
+            self._drop(key)
+            self._record_entry(key, fingerprint, digest)
+            if parsed is not None and decoded_bytes <= self.max_cache_bytes:
+                self._store(key, {'fingerprint': fingerprint, 'hash': digest, 'value': parsed, 'bytes': decoded_bytes})
+
+    def forget(self, path):
+        """Note that a file was deleted or moved away."""
+        with self.lock:
+            key = self._key(path)
+            self._drop(key)
+            self.entries.pop(key, None)
+
+    def print_summary(self):
+        print(f"📚 Archive catalog: {self.stats['files_decoded']:,} files decoded "
+              f"({self.stats['bytes_decoded'] / (1024 * 1024):.1f} MB), "
+              f"{self.stats['cache_hits']:,} cache hits, {self.stats['evictions']:,} evictions")
@@ -0,0 +1,227 @@
+import json
+import mmap
+from bisect import bisect_right
+from archive_catalog import ArchiveCatalog
+from compression_codecs import codec_for_path
+from rolling_channel_files import RollingChannelFiles
+from video_metadata_store import VideoMetadataStore
+
+
+class FramedFile:
+    # Random access to a plain file (through mmap) or a frame-compressed file (one frame at a time)
+    def __init__(self, path, frames=None):
+        self.path = path
+        self.codec = codec_for_path(path)
+        # Files written without a frame table are treated as a single frame
+        self.frames = frames or [[0, 0]]
+        self.frame_starts = [frame[1] for frame in self.frames]
+        self._file = None
+        self._map = None
+        self._cached_frame = (None, b'')
+
+    def _open(self):
+        if self._map is None:
+            self._file = open(self.path, 'rb')
+            size = self.path.stat().st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        return self._map
+
+    def _frame(self, position):
+        """Decompress one frame, keeping the last one cached for neighbouring reads."""
+        if self._cached_frame[0] == position:
+            return self._cached_frame[1]
+
+        data = self._open()
+        start = self.frames[position][0]
+        end = self.frames[position + 1][0] if position + 1 < len(self.frames) else len(data)
+        frame = self.codec.decompress(data[start:end])
+        self._cached_frame = (position, frame)
+        return frame
+
+    def read_range(self, start, end):
+        """Return uncompressed bytes [start, end)."""
+        if not self.codec.extension:
+            return self._open()[start:end]
+
+        chunks = []
+        position = max(bisect_right(self.frame_starts, start) - 1, 0)
+        while position < len(self.frames) and self.frame_starts[position] < end:
+            frame_start = self.frame_starts[position]
+            frame = self._frame(position)
+            chunks.append(frame[max(start - frame_start, 0):end - frame_start])
+            position += 1
+        return b''.join(chunks)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self._file:
+            self._file.close()
+        self._map = None
+        self._file = None
+        self._cached_frame = (None, b'')
+
+
+class ChannelArchiveReader:
+    def __init__(self, channel_info, sources, comments_summary=None, catalog=None, video_store=None):
+        # Each source: {'path', 'format' ('jsonl' segment, 'json' part, 'monolith'), 'frames', 'video_offsets'}
+        self.catalog = catalog or ArchiveCatalog.shared()
+        self.video_store = video_store or VideoMetadataStore.shared()
+        self.channel_info = channel_info
+        self.comments_summary = comments_summary or {}
+        self.sources = sources
+        self._framed_files = {}
+        self._monoliths = {}
+
+    @classmethod
+    def from_segments(cls, segment_archive, safe_channel_name):
+        """Open a segmented channel archive from its manifest."""
+        manifest = segment_archive.load_manifest(safe_channel_name)
+        if not manifest:
+            return None
+
+        channel_dir = segment_archive.channel_dir(safe_channel_name)
+        sources = [
+            {
+                'path': channel_dir / segment['file'],
+                'format': 'jsonl',
+                'frames': segment.get('frames'),
+                'video_offsets': segment.get('video_offsets')
+            }
+            for segment in manifest['segments']
+        ]
+        return cls(manifest['channel_info'], sources, manifest['comments_summary'])
+
+    @classmethod
+    def from_channel_file(cls, file_path):
+        """Open a part index (comments_<channel>.index.json) or a legacy monolithic channel file."""
+        if RollingChannelFiles.is_index_file(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            sources = [
+                {
+                    'path': file_path.parent / part['file'],
+                    # Parts written without offsets are read whole, like a monolith
+                    'format': 'json' if part.get('video_offsets') is not None else 'monolith',
+                    'frames': part.get('frames'),
+                    'video_offsets': part.get('video_offsets')
+                }
+                for part in index['parts']
+            ]
+            return cls(index['channel_info'], sources, index['comments_summary'])
+
+        # Legacy monoliths have no offset index - they are parsed in full on first access
+        reader = cls({}, [{'path': file_path, 'format': 'monolith', 'frames': None, 'video_offsets': None}])
+        reader.channel_info = reader._load_monolith(reader.sources[0])[0].get('channel_info', {})
+        return reader
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for framed_file in self._framed_files.values():
+            framed_file.close()
+        self._framed_files = {}
+        self._monoliths = {}
+
+    def _framed_file(self, source):
+        path = source['path']
+        if path not in self._framed_files:
+            self._framed_files[path] = FramedFile(path, source.get('frames'))
+        return self._framed_files[path]
+
+    def _load_monolith(self, source):
+        """Parse a legacy monolith once; returns (file data, video_id -> video data)."""
+        path = source['path']
+        if path not in self._monoliths:
+            data = self.catalog.load_json(path)
+            self._monoliths[path] = (data, data.get('videos', data))
+        return self._monoliths[path]
+
+    def _video_offsets(self, source):
+        """Offsets stored by the writer, or built once by scanning a segment written before they existed."""
+        if source['video_offsets'] is None and source['format'] == 'jsonl':
+            offsets = {}
+            position = 0
+            with codec_for_path(source['path']).open_reader(source['path']) as f:
+                for line in f:
+                    video_id = json.loads(line)['video_id']
+                    video_range = offsets.setdefault(video_id, [position, position])
+                    video_range[1] = position + len(line)
+                    position += len(line)
+            source['video_offsets'] = offsets
+        return source['video_offsets']
+
+    def video_ids(self):
+        """List the channel's videos from the offset indexes, in first-seen order."""
+        video_ids = {}
+        for source in self.sources:
+            if source['format'] == 'monolith':
+                video_ids.update(dict.fromkeys(self._load_monolith(source)[1]))
+            else:
+                video_ids.update(dict.fromkeys(self._video_offsets(source)))
+        return list(video_ids)
+
+    def get_video(self, video_id):
+        """Return {video_info, comments} for one video, reading only the bytes that hold it."""
+        video = None
+        for source in self.sources:
+            if source['format'] == 'monolith':
+                found = self._load_monolith(source)[1].get(video_id)
+                if found is None:
+                    continue
+                video = video or {'video_info': {}, 'comments': []}
+                video['video_info'] = found.get('video_info') or video['video_info']
+                video['comments'].extend(found.get('comments', []))
+                continue
+
+            video_range = self._video_offsets(source).get(video_id)
+            if video_range is None:
+                continue
+
+            raw = self._framed_file(source).read_range(*video_range)
+            video = video or {'video_info': {}, 'comments': []}
+            if source['format'] == 'json':
+                found = json.loads(raw)
+                video['video_info'] = found.get('video_info') or video['video_info']
+                video['comments'].extend(found.get('comments', []))
+            else:
+                for line in raw.splitlines():
+                    record = json.loads(line)
+                    if record['type'] == 'video':
+                        video['video_info'] = record.get('video_info') or video['video_info']
+                    else:
+                        video['comments'].append(record['comment'])
+
+        if video is not None:
+            video['video_info'] = self.video_store.expand(video['video_info'])
+        return video
+
+    def iter_comments(self):
+        """Yield (video_id, video_info, comment) over the whole channel, one file at a time.
+
+        Files are parsed through the shared catalog, so a file already decoded this run is not decoded again.
+        """
+        for source in self.sources:
+            if source['format'] == 'jsonl':
+                video_infos = {}
+                for record in self.catalog.load_records(source['path']):
+                    if record['type'] == 'video':
+                        video_infos[record['video_id']] = self.video_store.expand(record.get('video_info')) or {}
+                    else:
+                        yield record['video_id'], video_infos.get(record['video_id'], {}), record['comment']
+                continue
+
+            if source['format'] == 'json':
+                # Parts are bounded by MAX_FILE_SIZE_MB, so one part at a time stays small
+                videos = self.catalog.load_json(source['path'])['videos']
+            else:
+                videos = self._load_monolith(source)[1]
+
+            for video_id, video_data in videos.items():
+                video_info = self.video_store.expand(video_data.get('video_info')) or {}
+                for comment in video_data.get('comments', []):
+                    yield video_id, video_info, comment
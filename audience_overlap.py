@@ -0,0 +1,223 @@
+import json
+import os
+import time
+import zlib
+import numpy as np
+from near_duplicate_detector import MinHasher, MERSENNE_PRIME, MAX_HASH
+from settings import AUDIENCE_OVERLAP_FILE, AUDIENCE_NUM_PERM, AUDIENCE_EXACT_MAX_AUTHORS
+
+EMPTY = np.uint32(MAX_HASH)
+CHUNK = 8192  # Author hashes per vectorized batch (num_perm x CHUNK uint64 intermediates)
+
+
+def _mod_mersenne(values):
+    values = (values & np.uint64(MERSENNE_PRIME)) + (values >> np.uint64(61))
+    return np.where(values >= np.uint64(MERSENNE_PRIME), values - np.uint64(MERSENNE_PRIME), values)
+
+
+def author_hash(author_channel_id):
+    return zlib.crc32(author_channel_id.encode('utf-8'))
+
+
+class AudienceOverlap:
+    # MinHash signatures of commenter IDs (author_channel_id) per channel and per video, built with
+    # the MinHasher permutations and folded in run by run (a signature is the element-wise minimum
+    # over its authors). Jaccard overlap of two audiences is the share of equal signature slots, so
+    # every channel pair is compared without an author x channel matrix. Audiences of at most
+    # AUDIENCE_EXACT_MAX_AUTHORS also keep their author hashes, giving exact Jaccard for validation.
+    def __init__(self, overlap_file=AUDIENCE_OVERLAP_FILE, num_perm=AUDIENCE_NUM_PERM, channel_readers=None):
+        self.overlap_file = overlap_file
+        self.minhasher = MinHasher(num_perm=num_perm)
+        permutations = np.array(self.minhasher.permutations, dtype=np.uint64)
+        self._a_high = (permutations[:, 0] >> np.uint64(32))[:, None]
+        self._a_low = (permutations[:, 0] & np.uint64(0xffffffff))[:, None]
+        self._b = permutations[:, 1][:, None]
+
+        self.scopes = {}  # 'channel:<name>' or 'video:<id>' -> row in self.signatures
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self.exact = {}  # scope -> set of author hashes, while the audience is small
+        self._pending = {}  # scope -> set of author hashes
+        self.load(channel_readers)
+
+    def signature(self, author_hashes):
+        """MinHash signature of 32-bit author hashes; equals MinHasher.signature, vectorized."""
+        signature = np.full(self.minhasher.num_perm, EMPTY, dtype=np.uint32)
+        hashes = np.fromiter(author_hashes, dtype=np.uint64)
+        for start in range(0, len(hashes), CHUNK):
+            chunk = hashes[None, start:start + CHUNK]
+            # (a * h + b) mod 2**61 - 1 without overflow: a = a_high * 2**32 + a_low, 2**61 = 1 (mod p)
+            high = self._a_high * chunk
+            high = ((high & np.uint64((1 << 29) - 1)) << np.uint64(32)) + (high >> np.uint64(29))
+            values = _mod_mersenne(_mod_mersenne(high) + _mod_mersenne(self._a_low * chunk) + self._b)
+            np.minimum(signature, (values & np.uint64(MAX_HASH)).min(axis=1).astype(np.uint32), out=signature)
+        return signature
+
+    def load(self, channel_readers=None):
+        """Load saved signatures, building them from the archives if there are none yet."""
+        try:
+            if self.overlap_file.exists():
+                with np.load(self.overlap_file) as data:
+                    meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                    self.signatures = data['signatures']
+                    exact_hashes, exact_lengths = data['exact_hashes'], data['exact_lengths']
+                if meta['num_perm'] != self.minhasher.num_perm:
+                    print("⚠️ Audience MinHash settings changed - starting fresh signatures")
+                    self.signatures = np.zeros((0, self.minhasher.num_perm), dtype=np.uint32)
+                    if channel_readers is not None:
+                        self.rebuild(channel_readers)
+                    return
+                self.scopes = {scope: row for row, scope in enumerate(meta['scopes'])}
+                offsets = np.r_[0, np.cumsum(np.maximum(exact_lengths, 0))]
+                self.exact = {
+                    scope: set(exact_hashes[offsets[row]:offsets[row + 1]].tolist())
+                    for scope, row in self.scopes.items() if exact_lengths[row] >= 0
+                }
+            elif channel_readers is not None:
+                print("No audience signatures found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading audience signatures: {e}")
+
+    def rebuild(self, channel_readers):
+        """Fold in every archived comment; channel_readers yields (source_name, reader)."""
+        start = time.perf_counter()
+        self.scopes, self.exact, self._pending = {}, {}, {}
+        self.signatures = np.zeros((0, self.minhasher.num_perm), dtype=np.uint32)
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        self.add_comment(comment, video_id)
+            except Exception as e:
+                print(f"Error reading authors of {source_name}: {e}")
+            self.flush()
+
+        self.save()
+        print(f"Built audience signatures for {len(self.scopes):,} channels and videos "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    def add_comment(self, comment, video_id=None):
+        """Queue a comment's author for its channel and video audiences (repeats change nothing)."""
+        author = comment.get('author_channel_id')
+        if not author:
+            return
+        author = author_hash(author)
+        video_id = comment.get('video_id') or video_id
+        for scope in (f"channel:{comment.get('source_channel', 'Unknown')}", f"video:{video_id}"):
+            self._pending.setdefault(scope, set()).add(author)
+
+    def add_new_comments(self, new_comments_only):
+        """Fold a run's new comments into the signatures (channel_id -> video_id -> {comments})."""
+        for channel_data in (new_comments_only or {}).values():
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    self.add_comment(comment, video_id)
+        updated = len(self._pending)
+        self.flush()
+        print(f"👥 Audience overlap: {updated:,} channel/video signatures updated")
+        return updated
+
+    def flush(self):
+        """Merge queued authors into the signatures and the exact sets of small audiences."""
+        if not self._pending:
+            return
+        new_scopes = [scope for scope in self._pending if scope not in self.scopes]
+        if new_scopes:
+            for scope in new_scopes:
+                self.scopes[scope] = len(self.scopes)
+                self.exact[scope] = set()
+            self.signatures = np.vstack([
+                self.signatures,
+                np.full((len(new_scopes), self.minhasher.num_perm), EMPTY, dtype=np.uint32)
+            ])
+
+        for scope, authors in self._pending.items():
+            row = self.scopes[scope]
+            np.minimum(self.signatures[row], self.signature(authors), out=self.signatures[row])
+            exact = self.exact.get(scope)
+            if exact is not None:
+                exact |= authors
+                if len(exact) > AUDIENCE_EXACT_MAX_AUTHORS:
+                    del self.exact[scope]
+        self._pending = {}
+
+    def audience_size(self, scope):
+        """Distinct commenters of a scope: exact for small audiences, else from the k minimum hashes."""
+        if scope in self.exact:
+            return len(self.exact[scope])
+        signature = self.signatures[self.scopes[scope]].astype(np.float64)
+        return int(round((len(signature) - 1) / np.sum(signature / (MAX_HASH + 1))))
+
+    def overlap(self, scope_a, scope_b, exact=False):
+        """Jaccard overlap and estimated shared commenters of two scopes ('channel:<name>' / 'video:<id>').
+
+        exact=True uses the stored author hashes when both audiences are small enough to have them.
+        """
+        self.flush()
+        if scope_a not in self.scopes or scope_b not in self.scopes:
+            return None
+        if exact and scope_a in self.exact and scope_b in self.exact:
+            union = len(self.exact[scope_a] | self.exact[scope_b])
+            shared = len(self.exact[scope_a] & self.exact[scope_b])
+            return {'jaccard': shared / union if union else 0.0, 'shared_authors': shared, 'exact': True}
+
+        jaccard = float(np.mean(self.signatures[self.scopes[scope_a]] == self.signatures[self.scopes[scope_b]]))
+        sizes = self.audience_size(scope_a) + self.audience_size(scope_b)
+        return {'jaccard': jaccard, 'shared_authors': int(round(jaccard / (1 + jaccard) * sizes)), 'exact': False}
+
+    def channel_overlap_matrix(self):
+        """(channel names, Jaccard matrix) for every channel pair from one broadcast comparison."""
+        self.flush()
+        channels = sorted(scope for scope in self.scopes if scope.startswith('channel:'))
+        signatures = self.signatures[[self.scopes[scope] for scope in channels]]
+        matrix = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+        return [scope[len('channel:'):] for scope in channels], matrix
+
+    def top_channel_overlaps(self, limit=10):
+        """Channel pairs sharing the largest share of their audiences."""
+        channels, matrix = self.channel_overlap_matrix()
+        pairs = [
+            {
+                'channels': [channels[i], channels[j]],
+                'jaccard': round(float(matrix[i, j]), 4),
+                'shared_authors': self.overlap(f"channel:{channels[i]}", f"channel:{channels[j]}")['shared_authors']
+            }
+            for i in range(len(channels)) for j in range(i + 1, len(channels))
+        ]
+        pairs.sort(key=lambda pair: pair['jaccard'], reverse=True)
+        return pairs[:limit]
+
+    def validation_error(self):
+        """Mean absolute MinHash Jaccard error over the pairs of small audiences that have exact sets."""
+        self.flush()
+        scopes = [scope for scope in self.exact if len(self.exact[scope]) >= 20]
+        errors = [
+            abs(self.overlap(scope_a, scope_b)['jaccard'] - self.overlap(scope_a, scope_b, exact=True)['jaccard'])
+            for position, scope_a in enumerate(scopes) for scope_b in scopes[position + 1:]
+        ]
+        return {'pairs': len(errors), 'mean_absolute_error': float(np.mean(errors)) if errors else None}
+
+    def save(self):
+        """Persist signatures and the exact author hashes of small audiences."""
+        try:
+            self.flush()
+            ordered = sorted(self.scopes, key=self.scopes.get)
+            exact_lengths = np.array([len(self.exact[scope]) if scope in self.exact else -1 for scope in ordered],
+                                     dtype=np.int64)
+            exact_hashes = np.array([author for scope in ordered if scope in self.exact
+                                     for author in sorted(self.exact[scope])], dtype=np.uint32)
+            meta = {'num_perm': self.minhasher.num_perm, 'scopes': ordered}
+
+            self.overlap_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.overlap_file.with_name(self.overlap_file.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+                    signatures=self.signatures,
+                    exact_hashes=exact_hashes,
+                    exact_lengths=exact_lengths
+                )
+            os.replace(tmp_path, self.overlap_file)
+        except Exception as e:
+            print(f"Error saving audience signatures: {e}")
@@ -0,0 +1,263 @@
+import json
+import os
+import time
+import numpy as np
+from comment_leaderboards import Leaderboard
+from comment_ordinals import CommentOrdinals
+from comment_record import to_epoch_seconds, format_timestamp
+from comment_search_index import encode_varints, decode_varints, delta_encode, delta_decode
+from settings import (
+    AUTHOR_INDEX_FILE, LEADERBOARD_SIZE, LEADERBOARD_SLACK,
+    BOT_MIN_COMMENTS, BOT_BURST_COMMENTS, BOT_BURST_SECONDS, BOT_DAILY_RATE
+)
+
+
+def _encode_lists(lists):
+    """Sort each integer list and store them as one varint stream of per-list deltas plus list lengths."""
+    lengths = np.array([len(values) for values in lists], dtype=np.int64)
+    values = np.fromiter((value for values in lists for value in sorted(values)), dtype=np.int64, count=int(lengths.sum()))
+    data, _ = encode_varints(delta_encode(values, lengths))
+    return np.frombuffer(data, dtype=np.uint8), lengths
+
+
+class AuthorIndex:
+    # Per-author activity keyed by author_channel_id: comment counts per channel, first/last seen and
+    # the author's comment ordinals and publish times (CommentOrdinals), so "everything this author
+    # posted" is a dict lookup. Total likes are summed from the ordinals' likes column, which
+    # CommentOrdinals.refresh_likes keeps current as comments are re-fetched. The most active authors
+    # are kept in a streaming Leaderboard and posting-rate outliers (bursts, high volume per active
+    # day) are reported as suspected bots.
+    def __init__(self, index_file=AUTHOR_INDEX_FILE, ordinals=None, channel_readers=None):
+        self.index_file = index_file
+        self.ordinals = ordinals if ordinals is not None else CommentOrdinals.shared()
+        self.rows = {}  # author_channel_id -> row
+        self.author_ids = []
+        self.names = []
+        self.comments = []
+        self.first_seen = []
+        self.last_seen = []
+        self.channels = []  # channel code -> name
+        self._channel_codes = {}
+        self.channel_counts = {}  # row -> {channel code: comments}
+        self.ordinal_lists = []  # row -> [ordinals]
+        self.timestamp_lists = []  # row -> [publish epoch seconds]
+        self.indexed_comments = 0  # ordinals below this are in the saved index
+        self._pending_ordinals = set()
+        self.top_authors = Leaderboard(LEADERBOARD_SIZE + LEADERBOARD_SLACK)
+        self.load(channel_readers)
+
+    def load(self, channel_readers=None):
+        """Load the saved index, building it from the archives if there is none yet."""
+        try:
+            if self.index_file.exists():
+                with np.load(self.index_file) as data:
+                    arrays = {name: data[name] for name in data.files}
+                meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+                self.author_ids = meta['authors']
+                self.names = meta['names']
+                self.channels = meta['channels']
+                self.indexed_comments = meta['comments_indexed']
+                self.rows = {author_id: row for row, author_id in enumerate(self.author_ids)}
+                self._channel_codes = {name: code for code, name in enumerate(self.channels)}
+                self.comments = arrays['comments'].tolist()
+                self.first_seen = arrays['first_seen'].tolist()
+                self.last_seen = arrays['last_seen'].tolist()
+
+                self.channel_counts = {}
+                for row, code, count in arrays['channel_counts'].tolist():
+                    self.channel_counts.setdefault(row, {})[code] = count
+                self.ordinal_lists = self._decode_lists(arrays['ordinals'], arrays['ordinal_lengths'])
+                self.timestamp_lists = self._decode_lists(arrays['timestamps'], arrays['timestamp_lengths'])
+                for row in np.argsort(arrays['comments'])[::-1][:self.top_authors.capacity].tolist():
+                    self.top_authors.offer(self.author_ids[row], self.comments[row])
+            elif channel_readers is not None:
+                print("No author index found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading author index: {e}")
+
+    @staticmethod
+    def _decode_lists(data, lengths):
+        values = delta_decode(decode_varints(data.tobytes()), lengths).tolist()
+        offsets = np.r_[0, np.cumsum(lengths)].tolist()
+        return [values[offsets[row]:offsets[row + 1]] for row in range(len(lengths))]
+
+    def rebuild(self, channel_readers):
+        """Index every archived comment; channel_readers yields (source_name, reader)."""
+        start = time.perf_counter()
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        self.add_comment(comment, video_id, source_name)
+            except Exception as e:
+                print(f"Error indexing authors of {source_name}: {e}")
+
+        self.save()
+        print(f"Indexed {len(self.author_ids):,} authors in {time.perf_counter() - start:.1f}s")
+
+    def add_comment(self, comment, video_id=None, archive=None):
+        """Register a comment and add it to its author's activity (comments already indexed are skipped)."""
+        ordinal, is_new = self.ordinals.register(comment, video_id, archive)
+        if not is_new and (ordinal < self.indexed_comments or ordinal in self._pending_ordinals):
+            return False
+        self._pending_ordinals.add(ordinal)
+
+        author_id = comment.get('author_channel_id')
+        if not author_id:
+            return False
+        row = self.rows.get(author_id)
+        if row is None:
+            row = self.rows[author_id] = len(self.author_ids)
+            self.author_ids.append(author_id)
+            self.names.append(comment.get('author', 'Unknown'))
+            self.comments.append(0)
+            self.first_seen.append(0)
+            self.last_seen.append(0)
+            self.ordinal_lists.append([])
+            self.timestamp_lists.append([])
+
+        channel_name = comment.get('source_channel', 'Unknown')
+        code = self._channel_codes.get(channel_name)
+        if code is None:
+            code = self._channel_codes[channel_name] = len(self.channels)
+            self.channels.append(channel_name)
+        counts = self.channel_counts.setdefault(row, {})
+        counts[code] = counts.get(code, 0) + 1
+
+        published = to_epoch_seconds(comment.get('publish_date'))
+        self.comments[row] += 1
+        if published:
+            self.first_seen[row] = min(self.first_seen[row], published) if self.first_seen[row] else published
+            self.last_seen[row] = max(self.last_seen[row], published)
+            self.timestamp_lists[row].append(published)
+        self.ordinal_lists[row].append(ordinal)
+        self.top_authors.offer(author_id, self.comments[row])
+        return True
+
+    def add_new_comments(self, new_comments_only, channel_references=None):
+        """Index a run's new comments (channel_id -> video_id -> {comments})."""
+        added = 0
+        for channel_id, channel_data in (new_comments_only or {}).items():
+            archive = (channel_references or {}).get(channel_id, {}).get('archive')
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    added += self.add_comment(comment, video_id, archive)
+        print(f"🧑 Author index: +{added:,} comments ({len(self.author_ids):,} authors)")
+        return added
+
+    def author(self, author_id):
+        """Activity of one author (None if unknown); ordinals resolve with CommentOrdinals.describe."""
+        row = self.rows.get(author_id)
+        if row is None:
+            return None
+        return {
+            'author_channel_id': author_id,
+            'author': self.names[row],
+            'comments': self.comments[row],
+            'likes': self.total_likes(author_id),
+            'first_seen': format_timestamp(self.first_seen[row]),
+            'last_seen': format_timestamp(self.last_seen[row]),
+            'channels': {self.channels[code]: count for code, count in
+                         sorted(self.channel_counts.get(row, {}).items(), key=lambda item: item[1], reverse=True)},
+            'ordinals': sorted(self.ordinal_lists[row])
+        }
+
+    def total_likes(self, author_id):
+        """Current like total of an author's comments (from the ordinals' refreshed likes column)."""
+        row = self.rows.get(author_id)
+        if row is None or not self.ordinal_lists[row]:
+            return 0
+        return int(self.ordinals.columns['likes'][self.ordinal_lists[row]].sum())
+
+    def author_comments(self, author_id, limit=None):
+        """Archive references (comment_id, video_id, channel, archive, publish_day, likes) of an author's comments."""
+        row = self.rows.get(author_id)
+        if row is None:
+            return []
+        return self.ordinals.describe(sorted(self.ordinal_lists[row])[:limit])
+
+    def most_active(self, limit=LEADERBOARD_SIZE):
+        """Authors with the most indexed comments."""
+        return [self.author(author_id) for author_id, _ in self.top_authors.top(min(limit, LEADERBOARD_SIZE))]
+
+    def posting_rate(self, author_id):
+        """Most comments inside any BOT_BURST_SECONDS window and comments per active day (UTC days with a comment)."""
+        row = self.rows.get(author_id)
+        timestamps = np.sort(np.array(self.timestamp_lists[row] if row is not None else [], dtype=np.int64))
+        if not len(timestamps):
+            return {'max_burst': 0, 'comments_per_active_day': 0.0}
+        burst = np.searchsorted(timestamps, timestamps + BOT_BURST_SECONDS, side='right') - np.arange(len(timestamps))
+        active_days = len(np.unique(timestamps // 86400))
+        return {'max_burst': int(burst.max()), 'comments_per_active_day': round(len(timestamps) / active_days, 2)}
+
+    def suspected_bots(self, limit=50):
+        """Authors posting BOT_BURST_COMMENTS within BOT_BURST_SECONDS, or BOT_DAILY_RATE comments per active day.
+
+        Only authors with at least BOT_MIN_COMMENTS comments are considered; most bursty first.
+        """
+        suspects = []
+        for row in np.flatnonzero(np.array(self.comments) >= BOT_MIN_COMMENTS).tolist():
+            author_id = self.author_ids[row]
+            rate = self.posting_rate(author_id)
+            reasons = []
+            if rate['max_burst'] >= BOT_BURST_COMMENTS:
+                reasons.append(f"{rate['max_burst']} comments within {BOT_BURST_SECONDS // 60} minutes")
+            if rate['comments_per_active_day'] >= BOT_DAILY_RATE:
+                reasons.append(f"{rate['comments_per_active_day']} comments per active day")
+            if reasons:
+                suspects.append({
+                    'author_channel_id': author_id,
+                    'author': self.names[row],
+                    'comments': self.comments[row],
+                    'channels': len(self.channel_counts.get(row, {})),
+                    **rate,
+                    'reasons': reasons
+                })
+        suspects.sort(key=lambda suspect: (suspect['max_burst'], suspect['comments_per_active_day']), reverse=True)
+        return suspects[:limit]
+
+    def report(self, limit=20):
+        """Most active authors (without their ordinal lists) and suspected bots."""
+        return {
+            'authors': len(self.author_ids),
+            'most_active': [{key: value for key, value in entry.items() if key != 'ordinals'}
+                            for entry in self.most_active(limit)],
+            'suspected_bots': self.suspected_bots(limit)
+        }
+
+    def save(self):
+        """Commit the ordinals, then atomically rewrite the author index."""
+        try:
+            self.ordinals.save()
+            ordinals, ordinal_lengths = _encode_lists(self.ordinal_lists)
+            timestamps, timestamp_lengths = _encode_lists(self.timestamp_lists)
+            channel_counts = np.array([(row, code, count) for row, counts in self.channel_counts.items()
+                                       for code, count in counts.items()], dtype=np.int64).reshape(-1, 3)
+            meta = {
+                'authors': self.author_ids,
+                'names': self.names,
+                'channels': self.channels,
+                'comments_indexed': len(self.ordinals)
+            }
+
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_file.with_name(self.index_file.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+                    comments=np.array(self.comments, dtype=np.int64),
+                    first_seen=np.array(self.first_seen, dtype=np.int64),
+                    last_seen=np.array(self.last_seen, dtype=np.int64),
+                    channel_counts=channel_counts,
+                    ordinals=ordinals,
+                    ordinal_lengths=ordinal_lengths,
+                    timestamps=timestamps,
+                    timestamp_lengths=timestamp_lengths
+                )
+            os.replace(tmp_path, self.index_file)
+            self.indexed_comments = meta['comments_indexed']
+            self._pending_ordinals = set()
+        except Exception as e:
+            print(f"Error saving author index: {e}")
@@ -0,0 +1,94 @@
+import sys
+import time
+from compression_codecs import CODECS, available_codecs, iter_blocks, open_text
+from data_saver import DataSaver
+from settings import COMPRESSION_WORKERS, COMPRESSION_BLOCK_BYTES
+
+# Levels worth comparing per codec (fast / default / small)
+BENCHMARK_LEVELS = {
+    'none': [None],
+    'gzip': [1, 6, 9],
+    'zstd': [1, 3, 9, 19],
+    'lz4': [0, 9]
+}
+
+
+def load_archive_payload(max_mb=None):
+    """Concatenate the uncompressed bytes of the real channel archives in data/raw."""
+    data_saver = DataSaver()
+    chunks = []
+    total_bytes = 0
+
+    sources = []
+    for file_path in data_saver.list_legacy_channel_files():
+        sources.extend(data_saver._channel_file_companions(file_path) or [file_path])
+    for safe_channel_name in data_saver.segment_archive.list_channels():
+        channel_dir = data_saver.segment_archive.channel_dir(safe_channel_name)
+        sources.extend(sorted(channel_dir.glob('segment_*')))
+
+    for source in sources:
+        with open_text(source) as f:
+            chunk = f.read().encode('utf-8')
+        chunks.append(chunk)
+        total_bytes += len(chunk)
+        if max_mb and total_bytes >= max_mb * 1024 * 1024:
+            break
+
+    print(f"📦 Benchmark payload: {len(chunks)} archive file(s), {total_bytes / (1024 * 1024):.1f} MB uncompressed")
+    return b''.join(chunks)
+
+
+def benchmark_codec(codec, payload, workers):
+    """Measure compression ratio and encode/decode throughput (MB/s of uncompressed data)."""
+    start = time.perf_counter()
+    compressed = b''.join(codec.compress_blocks(iter_blocks([payload], COMPRESSION_BLOCK_BYTES), workers))
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored = codec.decompress(compressed)
+    decode_seconds = time.perf_counter() - start
+
+    if restored != payload:
+        raise ValueError(f"{codec.describe()} round-trip mismatch")
+
+    megabytes = len(payload) / (1024 * 1024)
+    return {
+        'codec': codec.describe(),
+        'workers': workers,
+        'compressed_mb': len(compressed) / (1024 * 1024),
+        'ratio': len(payload) / len(compressed) if compressed else 0.0,
+        'encode_mb_s': megabytes / encode_seconds if encode_seconds else float('inf'),
+        'decode_mb_s': megabytes / decode_seconds if decode_seconds else float('inf')
+    }
+
+
+def run_benchmark(max_mb=None):
+    """Benchmark every installed codec/level, single-threaded and block-parallel."""
+    payload = load_archive_payload(max_mb)
+    if not payload:
+        print("❌ No archives found in data/raw to benchmark")
+        return []
+
+    missing = [name for name in CODECS if name not in available_codecs()]
+    if missing:
+        print(f"⚠️ Skipping codecs without their package installed: {', '.join(missing)}")
+
+    results = []
+    worker_counts = sorted({1, COMPRESSION_WORKERS})
+
+    print(f"\n{'codec':<10} {'workers':>7} {'size MB':>9} {'ratio':>7} {'encode MB/s':>12} {'decode MB/s':>12}")
+    for name in available_codecs():
+        for level in BENCHMARK_LEVELS.get(name, [None]):
+            codec = CODECS[name](level)
+            for workers in worker_counts:
+                result = benchmark_codec(codec, payload, workers)
+                results.append(result)
+                print(f"{result['codec']:<10} {result['workers']:>7} {result['compressed_mb']:>9.2f} "
+                      f"{result['ratio']:>7.2f} {result['encode_mb_s']:>12.1f} {result['decode_mb_s']:>12.1f}")
+
+    return results
+
+
+if __name__ == "__main__":
+    # Optional argument: cap the payload size in MB for a quick run
+    run_benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,318 @@
+import json
+import os
+import time
+import numpy as np
+from comment_ordinals import CommentOrdinals
+from settings import BITMAP_INDEX_FILE
+
+ARRAY_LIMIT = 4096  # A chunk with more values than this is stored as a 65536-bit bitmap (8 KB)
+FACETS = ('keyword', 'channel', 'sentiment', 'month')
+
+
+def _popcount(bitmap):
+    return int(np.unpackbits(bitmap).sum())
+
+
+def _to_bitmap(values):
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[values] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def _to_values(bitmap):
+    return np.flatnonzero(np.unpackbits(bitmap, bitorder='little')).astype(np.uint16)
+
+
+def _contains(bitmap, values):
+    return (bitmap[values >> 3] >> (values & 7).astype(np.uint8)) & 1 == 1
+
+
+def _normalize(container):
+    """Smallest container kind for a chunk (None when empty)."""
+    if container.dtype == np.uint16:
+        if len(container) > ARRAY_LIMIT:
+            return _to_bitmap(container)
+        return container if len(container) else None
+    cardinality = _popcount(container)
+    if cardinality > ARRAY_LIMIT:
+        return container
+    return _to_values(container) if cardinality else None
+
+
+def _and(left, right):
+    if left.dtype == np.uint16 and right.dtype == np.uint16:
+        return np.intersect1d(left, right, assume_unique=True)
+    if left.dtype == np.uint16:
+        return left[_contains(right, left)]
+    if right.dtype == np.uint16:
+        return right[_contains(left, right)]
+    return left & right
+
+
+def _or(left, right):
+    if left.dtype == np.uint16 and right.dtype == np.uint16:
+        return np.union1d(left, right)
+    if left.dtype == np.uint16:
+        left, right = right, left
+    if right.dtype == np.uint16:
+        return left | _to_bitmap(right)
+    return left | right
+
+
+def _and_not(left, right):
+    if left.dtype == np.uint16:
+        if right.dtype == np.uint16:
+            return np.setdiff1d(left, right, assume_unique=True)
+        return left[~_contains(right, left)]
+    if right.dtype == np.uint16:
+        return left & ~_to_bitmap(right)
+    return left & ~right
+
+
+class RoaringBitmap:
+    # Roaring-style compressed set of comment ordinals: values are split by their high 16 bits into
+    # chunks, each a sorted uint16 array while sparse or a packed 65536-bit bitmap once dense.
+    # Combine with & (AND), | (OR) and - (AND NOT); len() is the count, to_array() the ordinals.
+    def __init__(self, containers=None):
+        self.containers = containers or {}  # high 16 bits -> uint16 array or uint8[8192] bitmap
+
+    @classmethod
+    def from_array(cls, values):
+        """Bitmap of an iterable of non-negative integers (duplicates allowed)."""
+        values = np.unique(np.asarray(values, dtype=np.int64))
+        containers = {}
+        if len(values):
+            highs, starts = np.unique(values >> 16, return_index=True)
+            for high, chunk in zip(highs.tolist(), np.split(values, starts[1:])):
+                containers[high] = _normalize((chunk & 0xffff).astype(np.uint16))
+        return cls(containers)
+
+    @classmethod
+    def range(cls, stop):
+        """Bitmap of 0 .. stop - 1 (the universe for NOT)."""
+        return cls.from_array(np.arange(stop))
+
+    def _combine(self, other, operation, keep_left=False, keep_right=False):
+        containers = {}
+        for high in set(self.containers) | set(other.containers):
+            left, right = self.containers.get(high), other.containers.get(high)
+            if left is not None and right is not None:
+                container = _normalize(operation(left, right))
+            else:
+                container = left if keep_left else None
+                container = right if keep_right and container is None else container
+            if container is not None:
+                containers[high] = container
+        return RoaringBitmap(containers)
+
+    def __and__(self, other):
+        return self._combine(other, _and)
+
+    def __or__(self, other):
+        return self._combine(other, _or, keep_left=True, keep_right=True)
+
+    def __sub__(self, other):
+        return self._combine(other, _and_not, keep_left=True)
+
+    def __len__(self):
+        return sum(len(container) if container.dtype == np.uint16 else _popcount(container)
+                   for container in self.containers.values())
+
+    def __contains__(self, value):
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        low = np.uint16(value & 0xffff)
+        if container.dtype == np.uint16:
+            position = np.searchsorted(container, low)
+            return position < len(container) and container[position] == low
+        return bool(_contains(container, np.array([low]))[0])
+
+    def to_array(self):
+        """Sorted ordinals as an int64 array."""
+        chunks = [(high << 16) + (container if container.dtype == np.uint16 else _to_values(container)).astype(np.int64)
+                  for high, container in sorted(self.containers.items())]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+    def serialize(self):
+        """(highs, cardinalities, payload) arrays; bitmap chunks are stored as 4096 uint16 words."""
+        highs = sorted(self.containers)
+        payload = [self.containers[high] if self.containers[high].dtype == np.uint16
+                   else self.containers[high].view(np.uint16) for high in highs]
+        cardinalities = [len(container) if container.dtype == np.uint16 else _popcount(container)
+                         for container in (self.containers[high] for high in highs)]
+        return (np.array(highs, dtype=np.uint32), np.array(cardinalities, dtype=np.uint32),
+                np.concatenate(payload) if payload else np.zeros(0, dtype=np.uint16))
+
+    @classmethod
+    def deserialize(cls, highs, cardinalities, payload):
+        containers = {}
+        offset = 0
+        for high, cardinality in zip(highs.tolist(), cardinalities.tolist()):
+            length = cardinality if cardinality <= ARRAY_LIMIT else 4096
+            chunk = payload[offset:offset + length]
+            containers[high] = chunk.copy() if cardinality <= ARRAY_LIMIT else chunk.copy().view(np.uint8)
+            offset += length
+        return cls(containers)
+
+
+class CommentBitmapIndex:
+    # One RoaringBitmap of CommentOrdinals ordinals per facet value: detected keyword, channel,
+    # sentiment category and publish month ('YYYY-MM'). Faceted questions become bitmap AND/OR/NOT
+    # without reading comments, e.g. count(keyword='boring', channel='ALLEN NEET', month='2025-05', min_likes=10).
+    def __init__(self, index_file=BITMAP_INDEX_FILE, ordinals=None, channel_readers=None):
+        self.index_file = index_file
+        self.ordinals = ordinals if ordinals is not None else CommentOrdinals.shared()
+        self.bitmaps = {}  # (facet, value) -> RoaringBitmap
+        self.indexed_comments = 0  # ordinals below this are in the saved bitmaps
+        self._pending = {}  # (facet, value) -> [ordinals]
+        self._pending_ordinals = set()
+        self.load(channel_readers)
+
+    def load(self, channel_readers=None):
+        """Load the saved bitmaps, building them from the archives if there are none yet."""
+        try:
+            if self.index_file.exists():
+                with np.load(self.index_file) as data:
+                    meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                    for position, (facet, value) in enumerate(meta['keys']):
+                        self.bitmaps[(facet, value)] = RoaringBitmap.deserialize(
+                            data[f'highs_{position}'], data[f'cardinalities_{position}'], data[f'payload_{position}'])
+                self.indexed_comments = meta['comments']
+            elif channel_readers is not None:
+                print("No comment bitmap index found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading comment bitmap index: {e}")
+
+    def rebuild(self, channel_readers):
+        """Index every archived comment; channel_readers yields (source_name, reader)."""
+        start = time.perf_counter()
+        self.bitmaps = {}
+        self.indexed_comments = 0
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        self.add_comment(comment, video_id, source_name)
+            except Exception as e:
+                print(f"Error indexing {source_name}: {e}")
+
+        added = len(self._pending_ordinals)
+        self.save()
+        print(f"Built {len(self.bitmaps):,} bitmaps over {added:,} archived comments "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    @staticmethod
+    def facet_values(comment):
+        """(facet, value) keys a comment belongs to."""
+        keys = [('keyword', keyword) for keyword in comment.get('detected_keywords') or {}]
+        keys.append(('channel', comment.get('source_channel', 'Unknown')))
+        keys.append(('sentiment', comment.get('sentiment_category', 'neutral')))
+        month = (comment.get('publish_date') or '')[:7]
+        if month:
+            keys.append(('month', month))
+        return keys
+
+    def add_comment(self, comment, video_id=None, archive=None):
+        """Register a comment and queue its facet values; comments already indexed are skipped."""
+        ordinal, is_new = self.ordinals.register(comment, video_id, archive)
+        if not is_new and (ordinal < self.indexed_comments or ordinal in self._pending_ordinals):
+            return False
+        self._pending_ordinals.add(ordinal)
+        for key in self.facet_values(comment):
+            self._pending.setdefault(key, []).append(ordinal)
+        return True
+
+    def add_new_comments(self, new_comments_only, channel_references=None):
+        """Index a run's new comments (channel_id -> video_id -> {comments})."""
+        added = 0
+        for channel_id, channel_data in (new_comments_only or {}).items():
+            archive = (channel_references or {}).get(channel_id, {}).get('archive')
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    added += self.add_comment(comment, video_id, archive)
+        print(f"🧮 Bitmap index: +{added:,} comments across {len(self.bitmaps):,} facet values")
+        return added
+
+    def flush(self):
+        """Merge queued ordinals into the bitmaps."""
+        for key, ordinals in self._pending.items():
+            bitmap = RoaringBitmap.from_array(ordinals)
+            self.bitmaps[key] = self.bitmaps[key] | bitmap if key in self.bitmaps else bitmap
+        self._pending = {}
+
+    def save(self):
+        """Merge queued comments, commit the ordinals, then atomically rewrite the bitmap file."""
+        try:
+            self.flush()
+            self.ordinals.save()
+            keys = sorted(self.bitmaps)
+            arrays = {'meta': np.frombuffer(json.dumps({
+                'keys': keys,
+                'comments': len(self.ordinals)
+            }, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)}
+            for position, key in enumerate(keys):
+                highs, cardinalities, payload = self.bitmaps[key].serialize()
+                arrays[f'highs_{position}'] = highs
+                arrays[f'cardinalities_{position}'] = cardinalities
+                arrays[f'payload_{position}'] = payload
+
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_file.with_name(self.index_file.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.index_file)
+            self.indexed_comments = len(self.ordinals)
+            self._pending_ordinals = set()
+        except Exception as e:
+            print(f"Error saving comment bitmap index: {e}")
+
+    def values(self, facet):
+        """Indexed values of a facet, e.g. values('month')."""
+        return sorted(value for key_facet, value in set(self.bitmaps) | set(self._pending) if key_facet == facet)
+
+    def bitmap(self, facet, values):
+        """Comments with any of the given values (a single value or a list) of a facet."""
+        self.flush()
+        result = RoaringBitmap()
+        for value in [values] if isinstance(values, str) else values:
+            result = result | self.bitmaps.get((facet, value), RoaringBitmap())
+        return result
+
+    def all(self):
+        return RoaringBitmap.range(len(self.ordinals))
+
+    def likes_at_least(self, min_likes):
+        return RoaringBitmap.from_array(np.flatnonzero(self.ordinals.columns['likes'] >= min_likes))
+
+    def select(self, keyword=None, channel=None, sentiment=None, month=None, min_likes=None, exclude=None):
+        """AND of the given facets (each a value or list of values, OR-ed), minus any exclude facets.
+
+        exclude maps facet -> values, e.g. exclude={'sentiment': 'negative'}.
+        """
+        result = None
+        for facet, values in zip(FACETS, (keyword, channel, sentiment, month)):
+            if values is not None:
+                bitmap = self.bitmap(facet, values)
+                result = bitmap if result is None else result & bitmap
+        if min_likes is not None:
+            bitmap = self.likes_at_least(min_likes)
+            result = bitmap if result is None else result & bitmap
+        if result is None:
+            result = self.all()
+        for facet, values in (exclude or {}).items():
+            result = result - self.bitmap(facet, values)
+        return result
+
+    def count(self, **filters):
+        return len(self.select(**filters))
+
+    def comment_ids(self, bitmap, limit=None):
+        """Comment IDs of a bitmap's ordinals (in ordinal order)."""
+        ordinals = bitmap.to_array()[:limit]
+        return [self.ordinals.comment_ids[ordinal] for ordinal in ordinals]
+
+    def describe(self, bitmap, limit=None):
+        """Archive references (comment_id, video_id, channel, archive, publish_day, likes) of a bitmap."""
+        return self.ordinals.describe(bitmap.to_array()[:limit])
@@ -1,8 +1,11 @@
 import json
-import gzip
 from datetime import datetime
 from pathlib import Path
 from settings import RAW_DATA_DIR
+from archive_reader import ChannelArchiveReader
+from compression_codecs import CODEC_EXTENSIONS, strip_codec_suffix
+from rolling_channel_files import RollingChannelFiles
+from segmented_archive import SegmentedChannelArchive
 
 
 class CommentDeduplicator:
@@ -30,60 +33,49 @@ class CommentDeduplicator:
         rebuilt_history = {}
 
         try:
-            # Look for previous raw comment files (both .json and .json.gz)
-            json_files = list(RAW_DATA_DIR.glob('comments_*.json'))
-            gz_files = list(RAW_DATA_DIR.glob('comments_*.json.gz'))
-            raw_files = json_files + gz_files
+            # Look for previous raw comment files (.json and compressed .json.gz/.zst/.lz4)
+            raw_files = list(RAW_DATA_DIR.glob('comments_*.json'))
+            for extension in CODEC_EXTENSIONS:
+                raw_files.extend(RAW_DATA_DIR.glob(f'comments_*.json{extension}'))
+            # Parted channels are read through their index
+            raw_files = [raw_file for raw_file in raw_files if not RollingChannelFiles.is_part_file(raw_file)]
 
-            if raw_files:
-                print(f"Found {len(raw_files)} previous comment files. Rebuilding history...")
+            segment_archive = SegmentedChannelArchive()
+            segmented_channels = segment_archive.list_channels()
+
+            if raw_files or segmented_channels:
+                print(f"Found {len(raw_files)} previous comment files and {len(segmented_channels)} "
+                      f"segmented channel archives. Rebuilding history...")
 
                 for raw_file in raw_files:
                     try:
-                        # Handle both compressed and regular files
-                        if raw_file.suffix == '.gz':
-                            with gzip.open(raw_file, 'rt', encoding='utf-8') as f:
-                                previous_data = json.load(f)
-                        else:
-                            with open(raw_file, 'r', encoding='utf-8') as f:
-                                previous_data = json.load(f)
-
                         # Extract timestamp from filename
-                        file_timestamp = raw_file.stem.replace('comments_', '').replace('.json', '')
-
-                        # Handle different file structures
-                        if 'videos' in previous_data:
-                            # New file format with channel_info and videos
-                            videos = previous_data.get('videos', {})
-                        else:
-                            # Old format - direct channel data
-                            videos = previous_data
-
-                        # Process all comments from this file
-                        for video_id, video_data in videos.items():
-                            for comment in video_data.get('comments', []):
-                                comment_id = comment.get('comment_id')
-                                if not comment_id:
-                                    continue
-
-                                if comment_id not in rebuilt_history:
-                                    rebuilt_history[comment_id] = {
-                                        'first_collected': comment.get('publish_date', ''),
-                                        'last_collected': file_timestamp,
-                                        'collection_history': [file_timestamp],
-                                        'author': comment.get('author', 'Unknown'),
-                                        'video_id': comment.get('video_id', '')
-                                    }
-                                else:
-                                    # Update if this file is newer
-                                    if file_timestamp not in rebuilt_history[comment_id]['collection_history']:
-                                        rebuilt_history[comment_id]['collection_history'].append(file_timestamp)
-                                        rebuilt_history[comment_id]['last_collected'] = file_timestamp
+                        file_timestamp = strip_codec_suffix(raw_file.name).replace('comments_', '')
+                        file_timestamp = file_timestamp.replace('.index.json', '').replace('.json', '')
+
+                        # Stream comments (compressed, parted and old direct-channel formats alike)
+                        with ChannelArchiveReader.from_channel_file(raw_file) as reader:
+                            for video_id, video_info, comment in reader.iter_comments():
+                                self._add_to_rebuilt_history(rebuilt_history, comment, file_timestamp)
 
                     except Exception as file_error:
                         print(f"Error processing {raw_file}: {file_error}")
                         continue
 
+                # Segmented archives: each segment is one run's worth of comments
+                for safe_channel_name in segmented_channels:
+                    try:
+                        manifest = segment_archive.load_manifest(safe_channel_name)
+                        for segment in manifest['segments']:
+                            for record in segment_archive.iter_records(safe_channel_name, [segment]):
+                                if record['type'] == 'comment':
+                                    self._add_to_rebuilt_history(
+                                        rebuilt_history, record['comment'], segment['created']
+                                    )
+                    except Exception as channel_error:
+                        print(f"Error processing segments for {safe_channel_name}: {channel_error}")
+                        continue
+
                 print(f"Rebuilt history with {len(rebuilt_history)} comments from previous runs")
 
                 # Save the rebuilt history
@@ -95,6 +87,26 @@ class CommentDeduplicator:
             print(f"Error rebuilding from previous runs: {e}")
             return {}
 
+    def _add_to_rebuilt_history(self, rebuilt_history, comment, file_timestamp):
+        """Record one archived comment in the history being rebuilt."""
+        comment_id = comment.get('comment_id')
+        if not comment_id:
+            return
+
+        if comment_id not in rebuilt_history:
+            rebuilt_history[comment_id] = {
+                'first_collected': comment.get('publish_date', ''),
+                'last_collected': file_timestamp,
+                'collection_history': [file_timestamp],
+                'author': comment.get('author', 'Unknown'),
+                'video_id': comment.get('video_id', '')
+            }
+        else:
+            # Update if this file is newer
+            if file_timestamp not in rebuilt_history[comment_id]['collection_history']:
+                rebuilt_history[comment_id]['collection_history'].append(file_timestamp)
+                rebuilt_history[comment_id]['last_collected'] = file_timestamp
+
     def save_rebuilt_history(self, rebuilt_history):
         """Save rebuilt comment history."""
         try:
@@ -0,0 +1,205 @@
+import heapq
+import json
+import math
+import os
+import time
+from settings import LIKE_WEIGHT, REPLY_WEIGHT, LEADERBOARD_FILE, LEADERBOARD_SIZE, LEADERBOARD_SLACK
+
+METRICS = ('likes', 'score')
+
+
+def score_contributions(likes, reply_count):
+    """(likes term, replies term) of comment_score."""
+    return LIKE_WEIGHT * math.log(likes + 1), REPLY_WEIGHT * math.log(reply_count + 1)
+
+
+def comment_score(likes, reply_count):
+    """Weighted ranking score of a comment from its likes and replies (log-scaled)."""
+    like_contribution, reply_contribution = score_contributions(likes, reply_count)
+    return like_contribution + reply_contribution
+
+
+class Leaderboard:
+    # Bounded top-N of comment IDs by one value, as a min-heap with lazy deletion: a changed value
+    # is pushed again and the stale pair skipped when it reaches the top. Keeps `capacity` entries
+    # (size + slack), so a member whose likes drop is replaced by the next retained comment.
+    def __init__(self, capacity, values=None):
+        self.capacity = capacity
+        self.values = dict(values or {})  # comment_id -> current value
+        self._heap = [(value, comment_id) for comment_id, value in self.values.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _drop_stale(self):
+        while self._heap and self.values.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def offer(self, comment_id, value):
+        """Add or update a comment; returns whether it is on the leaderboard."""
+        current = self.values.get(comment_id)
+        if current is not None:
+            if current != value:
+                self.values[comment_id] = value
+                heapq.heappush(self._heap, (value, comment_id))
+                if len(self._heap) > 2 * self.capacity:
+                    self._heap = [(value, comment_id) for comment_id, value in self.values.items()]
+                    heapq.heapify(self._heap)
+            return True
+
+        if len(self.values) < self.capacity:
+            self.values[comment_id] = value
+            heapq.heappush(self._heap, (value, comment_id))
+            return True
+
+        self._drop_stale()
+        if value <= self._heap[0][0]:
+            return False
+        _, evicted = heapq.heapreplace(self._heap, (value, comment_id))
+        del self.values[evicted]
+        self.values[comment_id] = value
+        return True
+
+    def top(self, limit=None):
+        """(comment_id, value) pairs, highest value first."""
+        ranked = sorted(self.values.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return ranked[:limit] if limit else ranked
+
+
+class CommentLeaderboards:
+    # Persistent top comments by likes and by comment_score, globally, per detected keyword and per
+    # channel. Every crawled comment (new or re-fetched with a new like count) is offered once per
+    # run, so reading a leaderboard never sorts the corpus. Entries are archive references plus a preview.
+    def __init__(self, leaderboard_file=LEADERBOARD_FILE, size=LEADERBOARD_SIZE, slack=LEADERBOARD_SLACK,
+                 channel_readers=None):
+        self.leaderboard_file = leaderboard_file
+        self.size = size
+        self.capacity = size + slack
+        self.boards = {metric: {} for metric in METRICS}  # metric -> scope -> Leaderboard
+        self.comments = {}  # comment_id -> entry, for every comment on any board
+        self.updated = None
+        self.load(channel_readers)
+
+    def load(self, channel_readers=None):
+        """Load saved leaderboards, building them from the archives if there are none yet."""
+        try:
+            if self.leaderboard_file.exists():
+                with open(self.leaderboard_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.comments = data.get('comments', {})
+                self.updated = data.get('updated')
+                for metric, scopes in data.get('boards', {}).items():
+                    self.boards[metric] = {
+                        scope: Leaderboard(self.capacity, {comment_id: value for value, comment_id in ranked})
+                        for scope, ranked in scopes.items()
+                    }
+            elif channel_readers is not None:
+                print("No comment leaderboards found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading comment leaderboards: {e}")
+
+    def rebuild(self, channel_readers):
+        """Offer every archived comment; channel_readers yields (source_name, reader)."""
+        start = time.perf_counter()
+        offered = 0
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        self.add_comment(comment, video_id, source_name)
+                        offered += 1
+            except Exception as e:
+                print(f"Error ranking {source_name}: {e}")
+
+        self.save()
+        print(f"Ranked {offered:,} archived comments into {sum(len(scopes) for scopes in self.boards.values()):,} "
+              f"leaderboards in {time.perf_counter() - start:.1f}s")
+
+    @staticmethod
+    def scopes(comment):
+        """Leaderboards a comment competes on: 'global', 'keyword:<keyword>' and 'channel:<channel>'."""
+        return (['global']
+                + [f"keyword:{keyword}" for keyword in comment.get('detected_keywords') or {}]
+                + [f"channel:{comment.get('source_channel', 'Unknown')}"])
+
+    def add_comment(self, comment, video_id=None, archive=None):
+        """Offer a comment to every leaderboard it belongs to (updating its likes if already ranked)."""
+        comment_id = comment.get('comment_id')
+        likes = comment.get('likes', 0) or 0
+        reply_count = comment.get('reply_count', 0) or 0
+        values = {'likes': likes, 'score': round(comment_score(likes, reply_count), 6)}
+
+        kept = False
+        for scope in self.scopes(comment):
+            for metric, value in values.items():
+                board = self.boards[metric].get(scope)
+                if board is None:
+                    board = self.boards[metric][scope] = Leaderboard(self.capacity)
+                kept = board.offer(comment_id, value) or kept
+
+        if kept:
+            cleaned_text = comment.get('cleaned_text', '')
+            previous = self.comments.get(comment_id, {})
+            self.comments[comment_id] = {
+                'comment_id': comment_id,
+                'video_id': comment.get('video_id') or video_id or previous.get('video_id'),
+                'archive': archive or previous.get('archive'),
+                'channel': comment.get('source_channel', 'Unknown'),
+                'author': comment.get('author', 'Unknown'),
+                'text_preview': cleaned_text[:100] + '...' if len(cleaned_text) > 100 else cleaned_text,
+                'likes': likes,
+                'reply_count': reply_count,
+                'score': values['score'],
+                'publish_date': comment.get('publish_date', '')
+            }
+        return kept
+
+    def update_from_run(self, comments_data, channel_references=None):
+        """Offer a run's crawled comments (channel_id -> video_id -> {comments}), new and re-fetched alike."""
+        offered = kept = 0
+        for channel_id, channel_data in (comments_data or {}).items():
+            archive = (channel_references or {}).get(channel_id, {}).get('archive')
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    kept += self.add_comment(comment, video_id, archive)
+                    offered += 1
+
+        self.updated = time.strftime("%Y%m%d_%H%M%S")
+        print(f"🏆 Leaderboards: {kept:,} of {offered:,} crawled comments ranked")
+        return kept
+
+    def top(self, metric='likes', keyword=None, channel=None, limit=None):
+        """Top comment entries by 'likes' or 'score' - globally, for a keyword or for a channel."""
+        scope = f"keyword:{keyword}" if keyword else f"channel:{channel}" if channel else 'global'
+        board = self.boards[metric].get(scope)
+        if board is None:
+            return []
+        return [self.comments[comment_id] for comment_id, _ in board.top(min(limit or self.size, self.size))]
+
+    def save(self):
+        """Persist every leaderboard and the entries they reference."""
+        try:
+            boards = {
+                metric: {scope: [[value, comment_id] for comment_id, value in board.top()]
+                         for scope, board in scopes.items()}
+                for metric, scopes in self.boards.items()
+            }
+            # Entries evicted from every leaderboard are dropped
+            referenced = {comment_id for scopes in self.boards.values()
+                          for board in scopes.values() for comment_id in board.values}
+            self.comments = {comment_id: entry for comment_id, entry in self.comments.items() if comment_id in referenced}
+
+            self.leaderboard_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.leaderboard_file.with_name(self.leaderboard_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'size': self.size,
+                    'updated': self.updated,
+                    'boards': boards,
+                    'comments': self.comments
+                }, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.leaderboard_file)
+        except Exception as e:
+            print(f"Error saving comment leaderboards: {e}")
@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+from datetime import date
+import numpy as np
+from comment_record import to_epoch_seconds
+from settings import COMMENT_ORDINALS_DIR
+
+# Fixed-width row per comment ordinal; likes is updated in place when a comment is seen again
+ORDINAL_COLUMNS = np.dtype([('channel', '<u2'), ('video', '<u4'), ('day', '<i4'), ('likes', '<i8')])
+EPOCH = date(1970, 1, 1)
+
+
+def day_number(publish_date):
+    """Days since 1970-01-01 of a YouTube timestamp or 'YYYY-MM-DD' date (-1 if unknown)."""
+    if not publish_date:
+        return -1
+    if len(publish_date) == 10:
+        try:
+            return (date.fromisoformat(publish_date) - EPOCH).days
+        except ValueError:
+            return -1
+    epoch_seconds = to_epoch_seconds(publish_date)
+    return epoch_seconds // 86400 if epoch_seconds else -1
+
+
+class CommentOrdinals:
+    # Dense integer ordinals for archived comments (0, 1, 2, ... in the order they were first
+    # indexed) plus a fixed-width column row per ordinal: channel, video, publish day and likes.
+    # Indexes store ordinals instead of comment IDs and filter on these columns without touching
+    # comment payloads. Files are append-only; meta.json is written last and marks what is committed.
+    _shared = None
+    _shared_guard = threading.Lock()
+
+    def __init__(self, ordinals_dir=COMMENT_ORDINALS_DIR):
+        self.ordinals_dir = ordinals_dir
+        self.meta_file = ordinals_dir / 'meta.json'
+        self.ids_file = ordinals_dir / 'comment_ids.txt'
+        self.videos_file = ordinals_dir / 'video_ids.txt'
+        self.columns_file = ordinals_dir / 'columns.bin'
+        self.lock = threading.RLock()
+
+        self.comment_ids = []
+        self.video_ids = []
+        self.channels = []  # channel code -> name
+        self.channel_archives = {}  # channel name -> archive source name
+        self._ordinals = {}
+        self._video_codes = {}
+        self._channel_codes = {}
+        self._columns = np.zeros(0, dtype=ORDINAL_COLUMNS)
+        self._pending_rows = []
+        self._updated_likes = {}
+        self._committed = {'comments': 0, 'ids_bytes': 0, 'videos': 0, 'videos_bytes': 0}
+        self.load()
+
+    @classmethod
+    def shared(cls):
+        """The process-wide registry shared by every ordinal-based index."""
+        with cls._shared_guard:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __len__(self):
+        return len(self.comment_ids)
+
+    def load(self):
+        """Load the committed ordinals (anything appended after the last meta.json is ignored)."""
+        try:
+            if not self.meta_file.exists():
+                return
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            with open(self.ids_file, 'rb') as f:
+                self.comment_ids = f.read(meta['ids_bytes']).decode('utf-8').splitlines()
+            with open(self.videos_file, 'rb') as f:
+                self.video_ids = f.read(meta['videos_bytes']).decode('utf-8').splitlines()
+            self._columns = np.fromfile(self.columns_file, dtype=ORDINAL_COLUMNS, count=meta['comments'])
+
+            self.channels = meta['channels']
+            self.channel_archives = meta.get('channel_archives', {})
+            self._ordinals = {comment_id: ordinal for ordinal, comment_id in enumerate(self.comment_ids)}
+            self._video_codes = {video_id: code for code, video_id in enumerate(self.video_ids)}
+            self._channel_codes = {name: code for code, name in enumerate(self.channels)}
+            self._committed = {key: meta[key] for key in self._committed}
+        except Exception as e:
+            print(f"Error loading comment ordinals: {e}")
+
+    def ordinal(self, comment_id):
+        """Ordinal of a comment ID (None if it was never registered)."""
+        return self._ordinals.get(comment_id)
+
+    def register(self, comment, video_id=None, archive=None):
+        """Ordinal of a comment, assigning the next one if it is new; returns (ordinal, is_new).
+
+        A comment seen again only has its like count refreshed.
+        """
+        comment_id = comment.get('comment_id')
+        likes = comment.get('likes', 0) or 0
+        with self.lock:
+            ordinal = self._ordinals.get(comment_id)
+            if ordinal is not None:
+                if self.likes(ordinal) != likes:
+                    self._updated_likes[ordinal] = likes
+                return ordinal, False
+
+            channel_name = comment.get('source_channel', 'Unknown')
+            channel_code = self._channel_codes.get(channel_name)
+            if channel_code is None:
+                channel_code = self._channel_codes[channel_name] = len(self.channels)
+                self.channels.append(channel_name)
+            if archive:
+                self.channel_archives[channel_name] = archive
+
+            video_id = comment.get('video_id') or video_id
+            video_code = self._video_codes.get(video_id)
+            if video_code is None:
+                video_code = self._video_codes[video_id] = len(self.video_ids)
+                self.video_ids.append(video_id)
+
+            ordinal = self._ordinals[comment_id] = len(self.comment_ids)
+            self.comment_ids.append(comment_id)
+            self._pending_rows.append((channel_code, video_code, day_number(comment.get('publish_date')), likes))
+            return ordinal, True
+
+    def refresh_likes(self, comments_data):
+        """Update the like counts of already registered comments from a crawl (channel_id -> video_id -> {comments}).
+
+        Indexes only register new comments, so this is what keeps min_likes filters current; returns how many changed.
+        """
+        refreshed = 0
+        with self.lock:
+            for channel_data in (comments_data or {}).values():
+                for video_data in channel_data.values():
+                    for comment in video_data.get('comments', []):
+                        ordinal = self._ordinals.get(comment.get('comment_id'))
+                        likes = comment.get('likes', 0) or 0
+                        if ordinal is not None and self.likes(ordinal) != likes:
+                            self._updated_likes[ordinal] = likes
+                            refreshed += 1
+        return refreshed
+
+    @property
+    def columns(self):
+        """Structured numpy array of every ordinal's row (channel, video, day, likes)."""
+        with self.lock:
+            if self._pending_rows:
+                self._columns = np.concatenate([self._columns, np.array(self._pending_rows, dtype=ORDINAL_COLUMNS)])
+                self._pending_rows = []
+            for ordinal, likes in self._updated_likes.items():
+                self._columns[ordinal]['likes'] = likes
+            return self._columns
+
+    def likes(self, ordinal):
+        if ordinal in self._updated_likes:
+            return self._updated_likes[ordinal]
+        if ordinal < len(self._columns):
+            return int(self._columns[ordinal]['likes'])
+        return self._pending_rows[ordinal - len(self._columns)][3]
+
+    def filter_mask(self, channels=None, since=None, until=None, min_likes=None):
+        """Boolean array over all ordinals for channel names, a date range ('YYYY-MM-DD') and a like floor.
+
+        Returns None when no filter is given.
+        """
+        if channels is None and since is None and until is None and min_likes is None:
+            return None
+
+        columns = self.columns
+        mask = np.ones(len(columns), dtype=bool)
+        if channels is not None:
+            codes = [self._channel_codes[name] for name in channels if name in self._channel_codes]
+            mask &= np.isin(columns['channel'], codes)
+        if since is not None:
+            mask &= columns['day'] >= day_number(since)
+        if until is not None:
+            mask &= (columns['day'] <= day_number(until)) & (columns['day'] >= 0)
+        if min_likes is not None:
+            mask &= columns['likes'] >= min_likes
+        return mask
+
+    def describe(self, ordinals):
+        """Reference dicts (comment_id, video_id, channel, archive, publish_day, likes) for ordinals."""
+        columns = self.columns
+        references = []
+        for ordinal in ordinals:
+            row = columns[ordinal]
+            channel_name = self.channels[row['channel']]
+            references.append({
+                'comment_id': self.comment_ids[ordinal],
+                'video_id': self.video_ids[row['video']],
+                'channel': channel_name,
+                'archive': self.channel_archives.get(channel_name),
+                'publish_day': date.fromordinal(EPOCH.toordinal() + int(row['day'])).isoformat() if row['day'] >= 0 else None,
+                'likes': int(row['likes'])
+            })
+        return references
+
+    def save(self):
+        """Append new ordinals, refresh changed like counts in place, then commit meta.json."""
+        try:
+            with self.lock:
+                self.ordinals_dir.mkdir(parents=True, exist_ok=True)
+                columns = self.columns
+                committed = self._committed
+
+                # Drop anything an interrupted save appended past the last commit
+                for path, size in ((self.ids_file, committed['ids_bytes']),
+                                   (self.videos_file, committed['videos_bytes']),
+                                   (self.columns_file, committed['comments'] * ORDINAL_COLUMNS.itemsize)):
+                    if path.exists() and path.stat().st_size > size:
+                        os.truncate(path, size)
+
+                new_ids = ''.join(f"{comment_id}\n" for comment_id in self.comment_ids[committed['comments']:]).encode('utf-8')
+                new_videos = ''.join(f"{video_id}\n" for video_id in self.video_ids[committed['videos']:]).encode('utf-8')
+                with open(self.ids_file, 'ab') as f:
+                    f.write(new_ids)
+                with open(self.videos_file, 'ab') as f:
+                    f.write(new_videos)
+                with open(self.columns_file, 'ab') as f:
+                    columns[committed['comments']:].tofile(f)
+
+                # Like counts of already committed rows are rewritten in place
+                updated = sorted(ordinal for ordinal in self._updated_likes if ordinal < committed['comments'])
+                if updated:
+                    stored = np.memmap(self.columns_file, dtype=ORDINAL_COLUMNS, mode='r+', shape=(committed['comments'],))
+                    stored['likes'][updated] = columns['likes'][updated]
+                    stored.flush()
+                    del stored
+                self._updated_likes = {}
+
+                meta = {
+                    'comments': len(self.comment_ids),
+                    'ids_bytes': committed['ids_bytes'] + len(new_ids),
+                    'videos': len(self.video_ids),
+                    'videos_bytes': committed['videos_bytes'] + len(new_videos),
+                    'channels': self.channels,
+                    'channel_archives': self.channel_archives
+                }
+                tmp_path = self.meta_file.with_name(self.meta_file.name + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, ensure_ascii=False)
+                os.replace(tmp_path, self.meta_file)
+                self._committed = {key: meta[key] for key in self._committed}
+        except Exception as e:
+            print(f"Error saving comment ordinals: {e}")
@@ -1,12 +1,14 @@
 import time
-import math
+import heapq
 from collections import defaultdict
 from googleapiclient.errors import HttpError
 from text_cleaner import TextCleaner
+from comment_leaderboards import comment_score, score_contributions
+from comment_record import CommentRecord, keyword_comment_preview
 from settings import (
     MAX_COMMENTS_PER_REQUEST, MAX_RETRIES, BACKOFF_FACTOR,
     RETRY_STATUS_CODES, TOP_COMMENTS_COUNT, REPLIES_PER_TOP_COMMENT,
-    LIKE_WEIGHT, REPLY_WEIGHT, MIN_COMMENTS_THRESHOLD, RATE_LIMIT_DELAY
+    MIN_COMMENTS_THRESHOLD, RATE_LIMIT_DELAY
 )
 
 
@@ -38,10 +40,7 @@ class CommentThreadProcessor:
 
     def calculate_comment_score(self, likes, reply_count):
         """Calculate weighted score for comment ranking using likes and replies."""
-        like_score = math.log(likes + 1)
-        reply_score = math.log(reply_count + 1)
-        weighted_score = (LIKE_WEIGHT * like_score) + (REPLY_WEIGHT * reply_score)
-        return weighted_score
+        return comment_score(likes, reply_count)
 
     def is_unlimited_priority_channel(self, channel_name):
         """Check if channel gets unlimited collection first."""
@@ -328,28 +327,27 @@ class CommentThreadProcessor:
         snippet = comment_data['snippet']
 
         raw_text = snippet.get('textDisplay', '') or snippet.get('textOriginal', '')
-        cleaned_text = self.text_cleaner.clean_text(raw_text)
-        detected_keywords = self.text_cleaner.detect_target_keywords(cleaned_text)
-        sentiment_category = self.text_cleaner.categorize_comment_sentiment(detected_keywords)
-
-        return {
-            'comment_id': comment_data['id'],
-            'video_id': video_id,
-            'parent_id': parent_id,
-            'is_reply': is_reply,
-            'author': snippet.get('authorDisplayName', 'Unknown'),
-            'author_channel_id': snippet.get('authorChannelId', {}).get('value', ''),
-            'raw_text': raw_text,
-            'cleaned_text': cleaned_text,
-            'likes': snippet.get('likeCount', 0),
-            'publish_date': snippet.get('publishedAt', ''),
-            'updated_date': snippet.get('updatedAt', ''),
-            'reply_count': 0 if is_reply else snippet.get('totalReplyCount', 0),
-            'detected_keywords': detected_keywords,
-            'sentiment_category': sentiment_category,
-            'source_channel': channel_info.get('title') if channel_info else 'Unknown',
-            'channel_title': channel_info.get('title') if channel_info else 'Unknown'  # ADDED: For proper file naming
-        }
+        cleaned_text, detected_keywords, sentiment_category = self.text_cleaner.process_text(raw_text)
+
+        # Compact slotted record; converts losslessly to the JSON schema dict when saved
+        return CommentRecord(
+            comment_id=comment_data['id'],
+            video_id=video_id,
+            parent_id=parent_id,
+            is_reply=is_reply,
+            author=snippet.get('authorDisplayName', 'Unknown'),
+            author_channel_id=snippet.get('authorChannelId', {}).get('value', ''),
+            raw_text=raw_text,
+            cleaned_text=cleaned_text,
+            likes=snippet.get('likeCount', 0),
+            publish_date=snippet.get('publishedAt', ''),
+            updated_date=snippet.get('updatedAt', ''),
+            reply_count=0 if is_reply else snippet.get('totalReplyCount', 0),
+            detected_keywords=detected_keywords,
+            sentiment_category=sentiment_category,
+            # Stored once; serialised as both source_channel and channel_title
+            channel=channel_info.get('title') if channel_info else 'Unknown'
+        )
 
     def _analyze_comments_with_keywords(self, video_id, all_comments, channel_info):
         """Analyze comments with enhanced keyword segmentation."""
@@ -360,10 +358,11 @@ class CommentThreadProcessor:
                 comment['likes'], comment['reply_count']
             )
 
-        top_comments = sorted(top_level_comments, key=lambda x: x['weighted_score'], reverse=True)[:TOP_COMMENTS_COUNT]
+        top_comments = heapq.nlargest(TOP_COMMENTS_COUNT, top_level_comments, key=lambda x: x['weighted_score'])
 
         top_comments_with_replies = []
         for top_comment in top_comments:
+            like_contribution, reply_contribution = score_contributions(top_comment['likes'], top_comment['reply_count'])
             comment_thread_id = top_comment['comment_id']
             existing_replies = [c for c in all_comments if c.get('parent_id') == comment_thread_id]
             limited_replies = existing_replies[:REPLIES_PER_TOP_COMMENT]
@@ -376,8 +375,8 @@ class CommentThreadProcessor:
                 'score_breakdown': {
                     'likes': top_comment['likes'],
                     'reply_count': top_comment['reply_count'],
-                    'like_contribution': LIKE_WEIGHT * math.log(top_comment['likes'] + 1),
-                    'reply_contribution': REPLY_WEIGHT * math.log(top_comment['reply_count'] + 1)
+                    'like_contribution': like_contribution,
+                    'reply_contribution': reply_contribution
                 }
             })
 
@@ -404,18 +403,8 @@ class CommentThreadProcessor:
             channel_name = comment.get('source_channel', 'Unknown')
 
             for main_keyword, variations in detected_keywords.items():
-                keyword_stats[main_keyword]['comments'].append({
-                    'comment_id': comment['comment_id'],
-                    'text_preview': comment['cleaned_text'][:100] + '...' if len(comment['cleaned_text']) > 100 else
-                    comment['cleaned_text'],
-                    'full_text': comment['cleaned_text'],
-                    'likes': comment['likes'],
-                    'author': comment['author'],
-                    'variations_found': variations,
-                    'sentiment': sentiment,
-                    'channel': channel_name,
-                    'video_id': comment['video_id']
-                })
+                # Keep a reference only; preview dicts are built for the top comments below
+                keyword_stats[main_keyword]['comments'].append((comment, variations, sentiment, channel_name))
 
                 keyword_stats[main_keyword]['total_count'] += 1
                 keyword_stats[main_keyword]['total_likes'] += comment['likes']
@@ -424,7 +413,7 @@ class CommentThreadProcessor:
 
         result = {}
         for keyword, stats in keyword_stats.items():
-            stats['comments'].sort(key=lambda x: x['likes'], reverse=True)
+            stats['comments'].sort(key=lambda x: x[0]['likes'], reverse=True)
 
             if stats['channels']:
                 most_common_channel = max(stats['channels'].items(), key=lambda x: x[1])
@@ -441,10 +430,10 @@ class CommentThreadProcessor:
                 },
                 'channel_distribution': dict(stats['channels']),
                 'sentiment_distribution': dict(stats['sentiment_distribution']),
-                'top_comments': stats['comments'][:10],
+                'top_comments': [keyword_comment_preview(*entry) for entry in stats['comments'][:10]],
                 'sample_variations': list(set([
-                    var for comment in stats['comments'][:5]
-                    for var in comment.get('variations_found', [])
+                    var for _, variations, _, _ in stats['comments'][:5]
+                    for var in variations
                 ]))[:5]
             }
 
@@ -0,0 +1,228 @@
+import calendar
+import sys
+import time
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+
+YOUTUBE_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def to_epoch_seconds(timestamp):
+    """Convert a YouTube ISO-8601 timestamp ('2025-05-04T17:20:41Z') to epoch seconds."""
+    if not timestamp:
+        return 0
+    try:
+        return calendar.timegm(time.strptime(timestamp, YOUTUBE_TIMESTAMP_FORMAT))
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return 0
+    return int(parsed.timestamp())
+
+
+def format_timestamp(epoch_seconds):
+    """Inverse of to_epoch_seconds for YouTube-format timestamps (0 -> '')."""
+    if not epoch_seconds:
+        return ''
+    return time.strftime(YOUTUBE_TIMESTAMP_FORMAT, time.gmtime(epoch_seconds))
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def keyword_comment_preview(comment, variations, sentiment, channel_name):
+    """Build the keyword_segmentation entry for one top comment."""
+    return {
+        'comment_id': comment['comment_id'],
+        'text_preview': comment['cleaned_text'][:100] + '...' if len(comment['cleaned_text']) > 100 else
+        comment['cleaned_text'],
+        'full_text': comment['cleaned_text'],
+        'likes': comment['likes'],
+        'author': comment['author'],
+        'variations_found': variations,
+        'sentiment': sentiment,
+        'channel': channel_name,
+        'video_id': comment['video_id']
+    }
+
+
+def json_default(obj):
+    """json `default` hook so CommentRecord objects serialise as their JSON-schema dicts."""
+    if isinstance(obj, CommentRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class CommentRecord(MutableMapping):
+    # Fixed slots instead of a 17-key dict per comment. Repeated strings (video, channel, author,
+    # sentiment) are interned, timestamps are epoch ints, and keywords are a tuple of tuples.
+    # Keys outside the schema (weighted_score, duplicate_cluster_id, ...) live in `extra`.
+    __slots__ = (
+        'comment_id', 'video_id', 'parent_id', 'is_reply', 'author', 'author_channel_id',
+        'raw_text', 'cleaned_text', 'likes', 'publish_ts', 'updated_ts', 'reply_count',
+        'keywords', 'sentiment_category', 'channel', 'extra'
+    )
+
+    # JSON schema key order, as written by _process_comment_with_keywords
+    SCHEMA_KEYS = (
+        'comment_id', 'video_id', 'parent_id', 'is_reply', 'author', 'author_channel_id',
+        'raw_text', 'cleaned_text', 'likes', 'publish_date', 'updated_date', 'reply_count',
+        'detected_keywords', 'sentiment_category', 'source_channel', 'channel_title'
+    )
+
+    def __init__(self, comment_id, video_id, parent_id=None, is_reply=False, author='Unknown',
+                 author_channel_id='', raw_text='', cleaned_text='', likes=0, publish_date='',
+                 updated_date='', reply_count=0, detected_keywords=None, sentiment_category='neutral',
+                 channel='Unknown'):
+        self.comment_id = comment_id
+        self.video_id = _intern(video_id)
+        self.parent_id = parent_id
+        self.is_reply = is_reply
+        self.author = _intern(author)
+        self.author_channel_id = _intern(author_channel_id)
+        self.raw_text = raw_text
+        self.cleaned_text = cleaned_text
+        self.likes = likes
+        self.reply_count = reply_count
+        self.sentiment_category = _intern(sentiment_category)
+        self.channel = _intern(channel)
+        self.extra = None
+        self.publish_ts = self._store_timestamp('publish_date', publish_date)
+        self.updated_ts = self._store_timestamp('updated_date', updated_date)
+        self.keywords = self._pack_keywords(detected_keywords)
+
+    def _store_timestamp(self, key, value):
+        """Store a timestamp as epoch seconds; non-canonical strings are kept verbatim in extra."""
+        epoch_seconds = to_epoch_seconds(value) if isinstance(value, str) else 0
+        if format_timestamp(epoch_seconds) != value:
+            self._set_extra(key, value)
+        return epoch_seconds
+
+    def _pack_keywords(self, detected_keywords):
+        if not isinstance(detected_keywords, dict):
+            return ()
+        return tuple(
+            (_intern(keyword), tuple(_intern(variation) for variation in variations))
+            for keyword, variations in detected_keywords.items()
+        )
+
+    def _set_extra(self, key, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from the JSON schema dict (lossless: to_dict() returns an equal dict)."""
+        if isinstance(data, CommentRecord):
+            return data
+
+        record = cls(
+            data.get('comment_id'), data.get('video_id'), data.get('parent_id'),
+            data.get('is_reply', False), data.get('author', 'Unknown'), data.get('author_channel_id', ''),
+            data.get('raw_text', ''), data.get('cleaned_text', ''), data.get('likes', 0),
+            data.get('publish_date', ''), data.get('updated_date', ''), data.get('reply_count', 0),
+            data.get('detected_keywords'), data.get('sentiment_category', 'neutral'),
+            data.get('source_channel', 'Unknown')
+        )
+        if data.get('channel_title', record.channel) != record.channel:
+            record._set_extra('channel_title', data['channel_title'])
+        if 'detected_keywords' in data and not isinstance(data['detected_keywords'], dict):
+            record._set_extra('detected_keywords', data['detected_keywords'])
+
+        # Keys missing from the source dict must stay missing
+        missing = [key for key in cls.SCHEMA_KEYS if key not in data]
+        if missing:
+            record._set_extra('_missing', missing)
+
+        for key, value in data.items():
+            if key not in cls.SCHEMA_KEYS:
+                record._set_extra(key, value)
+        return record
+
+    def _schema_value(self, key):
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if key == 'publish_date':
+            return format_timestamp(self.publish_ts)
+        if key == 'updated_date':
+            return format_timestamp(self.updated_ts)
+        if key == 'detected_keywords':
+            return {keyword: list(variations) for keyword, variations in self.keywords}
+        if key in ('source_channel', 'channel_title'):
+            return self.channel
+        return getattr(self, key)
+
+    def _is_missing(self, key):
+        return bool(self.extra) and key in self.extra.get('_missing', ())
+
+    def to_dict(self):
+        """Convert back to the JSON schema dict used in archives and outputs."""
+        result = {key: self._schema_value(key) for key in self.SCHEMA_KEYS if not self._is_missing(key)}
+        if self.extra:
+            for key, value in self.extra.items():
+                if key not in result and key != '_missing' and not self._is_missing(key):
+                    result[key] = value
+        return result
+
+    def __getitem__(self, key):
+        if key in self.SCHEMA_KEYS and not self._is_missing(key):
+            return self._schema_value(key)
+        if self.extra and key in self.extra and key != '_missing':
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if self._is_missing(key):
+            self.extra['_missing'] = [k for k in self.extra['_missing'] if k != key]
+        if key in ('publish_date', 'updated_date'):
+            if self.extra:
+                self.extra.pop(key, None)
+            epoch_seconds = self._store_timestamp(key, value)
+            setattr(self, 'publish_ts' if key == 'publish_date' else 'updated_ts', epoch_seconds)
+        elif key == 'detected_keywords' and isinstance(value, dict):
+            if self.extra:
+                self.extra.pop(key, None)
+            self.keywords = self._pack_keywords(value)
+        elif key in ('source_channel', 'channel_title'):
+            self._set_extra(key, value)
+        elif key in self.SCHEMA_KEYS:
+            setattr(self, key, value)
+        else:
+            self._set_extra(key, value)
+
+    def __delitem__(self, key):
+        if key in self.SCHEMA_KEYS:
+            if self._is_missing(key):
+                raise KeyError(key)
+            if self.extra and key in self.extra:
+                del self.extra[key]
+            self._set_extra('_missing', list(self.extra.get('_missing', [])) + [key])
+        elif self.extra and key in self.extra and key != '_missing':
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.SCHEMA_KEYS:
+            if not self._is_missing(key):
+                yield key
+        if self.extra:
+            for key in self.extra:
+                if key not in self.SCHEMA_KEYS and key != '_missing':
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        if key in self.SCHEMA_KEYS:
+            return not self._is_missing(key)
+        return bool(self.extra) and key in self.extra and key != '_missing'
+
+    def __repr__(self):
+        return f"CommentRecord({self.comment_id!r}, video_id={self.video_id!r}, likes={self.likes!r})"
@@ -0,0 +1,398 @@
+import json
+import os
+import re
+import time
+import unicodedata
+import numpy as np
+from comment_ordinals import CommentOrdinals
+from settings import SEARCH_INDEX_DIR, SEARCH_INDEX_COMPACTION_THRESHOLD
+
+# Latin/Hinglish words and digits, or Devanagari runs including vowel signs and viramas (not \w)
+TOKEN_PATTERN = re.compile(r'(?:[^\W_]|[\u0900-\u0963\u0966-\u097f\u200c\u200d])+')
+LATIN_MARKS = re.compile(r'[\u0300-\u036f]')
+REPEATED_LETTERS = re.compile(r'(\D)\1{2,}')
+QUERY_PATTERN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+MAX_POSITION = (1 << 20) - 1  # Later tokens of very long comments are not indexed
+
+
+def tokenize(text):
+    """Lowercase search tokens of a comment or query.
+
+    Accents are dropped ('café' -> 'cafe') and letters repeated three or more times collapse to
+    two ('sooo' -> 'soo', 'bahuttt' -> 'bahutt'), so elongated Hinglish spellings meet.
+    """
+    if not text:
+        return []
+    text = text.lower()
+    if not text.isascii():
+        text = LATIN_MARKS.sub('', unicodedata.normalize('NFKD', text))
+    return TOKEN_PATTERN.findall(REPEATED_LETTERS.sub(r'\1\1', text))
+
+
+def encode_varints(values):
+    """LEB128 varint bytes of non-negative integers, plus each value's encoded length."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+
+    owner = np.repeat(np.arange(len(values)), lengths)
+    byte_index = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    encoded = ((values[owner] >> (np.uint64(7) * byte_index.astype(np.uint64))) & np.uint64(0x7f)).astype(np.uint8)
+    encoded[byte_index < lengths[owner] - 1] |= 0x80
+    return encoded.tobytes(), lengths
+
+
+def decode_varints(data):
+    """Inverse of encode_varints (exact for values below 2**53, far above any ordinal or position)."""
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    if not len(encoded):
+        return np.zeros(0, dtype=np.int64)
+    ends = encoded < 0x80
+    owner = np.cumsum(ends) - ends
+    starts = np.flatnonzero(np.r_[True, ends[:-1]])
+    parts = (encoded & 0x7f).astype(np.float64) * np.exp2(7 * (np.arange(len(encoded)) - starts[owner]))
+    return np.bincount(owner, weights=parts, minlength=len(starts)).astype(np.int64)
+
+
+def _group_starts(lengths):
+    return np.cumsum(lengths) - lengths
+
+
+def delta_encode(values, lengths):
+    """Deltas within consecutive groups of the given lengths; each group's first value stays absolute."""
+    deltas = values.copy()
+    deltas[1:] -= values[:-1]
+    starts = _group_starts(lengths)[lengths > 0]
+    deltas[starts] = values[starts]
+    return deltas
+
+
+def delta_decode(deltas, lengths):
+    """Inverse of delta_encode."""
+    totals = np.cumsum(deltas)
+    starts = _group_starts(lengths)
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    non_empty = lengths > 0
+    offsets[non_empty] = totals[starts[non_empty]] - deltas[starts[non_empty]]
+    return totals - np.repeat(offsets, lengths)
+
+
+class IndexSegment:
+    # One immutable .npz segment: sorted vocabulary and, per token, byte ranges into three varint
+    # streams - ordinal deltas, term frequencies and in-comment position deltas.
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as data:
+            self.arrays = {name: data[name] for name in data.files}
+        self.tokens = self.arrays['vocab'].tobytes().decode('utf-8').split('\n') if len(self.arrays['vocab']) else []
+        self.vocab = {token: position for position, token in enumerate(self.tokens)}
+        self.docs = self.arrays['docs'].tobytes()
+        self.freqs = self.arrays['freqs'].tobytes()
+        self.positions = self.arrays['positions'].tobytes()
+
+    def postings(self, token, with_positions=False):
+        """Ordinals containing a token; with positions also (ordinal per occurrence, position) arrays."""
+        position = self.vocab.get(token)
+        if position is None:
+            empty = np.zeros(0, dtype=np.int64)
+            return (empty, empty, empty) if with_positions else empty
+
+        starts = self.arrays
+        docs = np.cumsum(decode_varints(self.docs[starts['doc_bytes'][position]:starts['doc_bytes'][position + 1]]))
+        if not with_positions:
+            return docs
+
+        freqs = decode_varints(self.freqs[starts['freq_bytes'][position]:starts['freq_bytes'][position + 1]])
+        positions = delta_decode(
+            decode_varints(self.positions[starts['position_bytes'][position]:starts['position_bytes'][position + 1]]),
+            freqs
+        )
+        return docs, np.repeat(docs, freqs), positions
+
+    def flat_postings(self):
+        """Every posting as flat arrays (token per posting, ordinal, frequency, positions), for merging."""
+        counts = self.arrays['counts']
+        docs = delta_decode(decode_varints(self.docs), counts)
+        freqs = decode_varints(self.freqs)
+        positions = delta_decode(decode_varints(self.positions), freqs)
+        return np.repeat(np.arange(len(self.tokens)), counts), docs, freqs, positions
+
+
+def write_segment(path, tokens, token_ids, docs, freqs, positions):
+    """Write postings (token_ids index tokens; positions are grouped per posting) as a sorted segment."""
+    # Only tokens with postings are written, in sorted order
+    token_order = sorted(np.unique(token_ids), key=tokens.__getitem__)
+    remap = np.zeros(len(tokens), dtype=np.int64)
+    remap[token_order] = np.arange(len(token_order))
+
+    # Postings sorted by token, then ordinal; each posting's positions move with it
+    order = np.lexsort((docs, remap[token_ids]))
+    sorted_freqs = freqs[order]
+    position_order = (np.repeat(_group_starts(freqs)[order] - _group_starts(sorted_freqs), sorted_freqs)
+                      + np.arange(int(freqs.sum())))
+    token_ids, docs, freqs, positions = remap[token_ids][order], docs[order], sorted_freqs, positions[position_order]
+
+    counts = np.bincount(token_ids, minlength=len(token_order))
+    doc_bytes, doc_lengths = encode_varints(delta_encode(docs, counts))
+    freq_bytes, freq_lengths = encode_varints(freqs)
+    position_bytes, position_lengths = encode_varints(delta_encode(positions, freqs))
+
+    def byte_starts(lengths, value_starts):
+        return np.r_[0, np.cumsum(lengths)][value_starts]
+
+    token_doc_starts = np.r_[_group_starts(counts), len(docs)]
+    token_position_starts = np.r_[_group_starts(freqs), len(positions)][token_doc_starts]
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            vocab=np.frombuffer('\n'.join(tokens[token_id] for token_id in token_order).encode('utf-8'), dtype=np.uint8),
+            counts=counts,
+            doc_bytes=byte_starts(doc_lengths, token_doc_starts),
+            freq_bytes=byte_starts(freq_lengths, token_doc_starts),
+            position_bytes=byte_starts(position_lengths, token_position_starts),
+            docs=np.frombuffer(doc_bytes, dtype=np.uint8),
+            freqs=np.frombuffer(freq_bytes, dtype=np.uint8),
+            positions=np.frombuffer(position_bytes, dtype=np.uint8)
+        )
+    os.replace(tmp_path, path)
+
+
+class CommentSearchIndex:
+    # Positional inverted index over cleaned_text, keyed by CommentOrdinals ordinals. Each run's new
+    # comments become one immutable segment; segments are merged past a threshold. Queries support
+    # AND (implicit), OR, NOT / -term, "phrases" and parentheses, filtered by channel, date and likes.
+    def __init__(self, index_dir=SEARCH_INDEX_DIR, ordinals=None, channel_readers=None):
+        self.index_dir = index_dir
+        self.manifest_file = index_dir / 'manifest.json'
+        self.ordinals = ordinals if ordinals is not None else CommentOrdinals.shared()
+        self.segments = []
+        self.next_segment = 1
+        self.indexed_comments = 0  # ordinals below this are in committed segments
+        self._pending = {}  # token -> [ordinals, frequencies, positions]
+        self._pending_ordinals = set()
+        self.load(channel_readers)
+
+    def load(self, channel_readers=None):
+        """Open the committed segments, building the index from the archives if there is none yet."""
+        try:
+            if self.manifest_file.exists():
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                self.segments = [IndexSegment(self.index_dir / name) for name in manifest['segments']]
+                self.next_segment = manifest['next_segment']
+                self.indexed_comments = manifest['comments']
+            elif channel_readers is not None:
+                print("No comment search index found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading comment search index: {e}")
+
+    def rebuild(self, channel_readers):
+        """Index every archived comment (first run only); channel_readers yields (source, reader)."""
+        start = time.perf_counter()
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        self.add_comment(comment, video_id, source_name)
+            except Exception as e:
+                print(f"Error indexing {source_name}: {e}")
+
+        added = len(self._pending_ordinals)
+        self.save()
+        print(f"Indexed {added:,} archived comments in {time.perf_counter() - start:.1f}s")
+
+    def add_comment(self, comment, video_id=None, archive=None):
+        """Register a comment and queue its tokens; known comments only refresh their like count."""
+        ordinal, is_new = self.ordinals.register(comment, video_id, archive)
+        # Ordinals past the committed segments were registered but never indexed (interrupted save)
+        if not is_new and (ordinal < self.indexed_comments or ordinal in self._pending_ordinals):
+            return False
+        self._pending_ordinals.add(ordinal)
+
+        token_positions = {}
+        for position, token in enumerate(tokenize(comment.get('cleaned_text', ''))):
+            if position > MAX_POSITION:
+                break
+            token_positions.setdefault(token, []).append(position)
+
+        for token, positions in token_positions.items():
+            postings = self._pending.get(token)
+            if postings is None:
+                postings = self._pending[token] = [[], [], []]
+            postings[0].append(ordinal)
+            postings[1].append(len(positions))
+            postings[2].extend(positions)
+        return True
+
+    def add_new_comments(self, new_comments_only, channel_references=None):
+        """Index a run's new comments (channel_id -> video_id -> {comments})."""
+        added = 0
+        for channel_id, channel_data in (new_comments_only or {}).items():
+            archive = (channel_references or {}).get(channel_id, {}).get('archive')
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    added += self.add_comment(comment, video_id, archive)
+        print(f"🔎 Search index: +{added:,} comments ({len(self.ordinals):,} indexed)")
+        return added
+
+    def _segment_name(self):
+        name = f"segment_{self.next_segment:05d}.npz"
+        self.next_segment += 1
+        return name
+
+    def flush(self):
+        """Write queued postings as a new segment (not yet committed to the manifest)."""
+        if not self._pending:
+            return None
+
+        tokens = list(self._pending)
+        counts = np.array([len(self._pending[token][0]) for token in tokens], dtype=np.int64)
+        docs = np.fromiter((o for token in tokens for o in self._pending[token][0]), dtype=np.int64, count=int(counts.sum()))
+        freqs = np.fromiter((n for token in tokens for n in self._pending[token][1]), dtype=np.int64, count=len(docs))
+        positions = np.fromiter((p for token in tokens for p in self._pending[token][2]), dtype=np.int64, count=int(freqs.sum()))
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        segment_path = self.index_dir / self._segment_name()
+        write_segment(segment_path, tokens, np.repeat(np.arange(len(tokens)), counts), docs, freqs, positions)
+        self._pending = {}
+        return IndexSegment(segment_path)
+
+    def compact(self):
+        """Merge every segment into one (keeps per-query work proportional to the vocabulary hits)."""
+        if len(self.segments) < 2:
+            return None
+
+        tokens, token_ids, docs, freqs, positions = [], [], [], [], []
+        vocabulary = {}
+        for segment in self.segments:
+            segment_token_ids, segment_docs, segment_freqs, segment_positions = segment.flat_postings()
+            remap = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in segment.tokens], dtype=np.int64)
+            token_ids.append(remap[segment_token_ids] if len(remap) else segment_token_ids)
+            docs.append(segment_docs)
+            freqs.append(segment_freqs)
+            positions.append(segment_positions)
+        tokens = list(vocabulary)
+
+        segment_path = self.index_dir / self._segment_name()
+        write_segment(segment_path, tokens, np.concatenate(token_ids), np.concatenate(docs),
+                      np.concatenate(freqs), np.concatenate(positions))
+        print(f"🗜️ Compacted search index: {len(self.segments)} segments → 1 ({len(tokens):,} tokens)")
+        return IndexSegment(segment_path)
+
+    def save(self):
+        """Flush queued comments, commit the ordinals, then the manifest (merging segments past the threshold)."""
+        try:
+            merged_segments = []
+            segment = self.flush()
+            if segment:
+                self.segments.append(segment)
+            if len(self.segments) >= SEARCH_INDEX_COMPACTION_THRESHOLD:
+                merged_segments = self.segments
+                self.segments = [self.compact()]
+
+            self.ordinals.save()
+            manifest = {
+                'segments': [segment.path.name for segment in self.segments],
+                'next_segment': self.next_segment,
+                'comments': len(self.ordinals)
+            }
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_file.with_name(self.manifest_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_file)
+            self.indexed_comments = manifest['comments']
+            self._pending_ordinals = set()
+
+            # Merged segments are only removed once the manifest no longer lists them
+            for segment in merged_segments:
+                if segment.path.exists():
+                    segment.path.unlink()
+        except Exception as e:
+            print(f"Error saving comment search index: {e}")
+
+    def _term(self, text):
+        """Ordinals matching a query word or phrase (several tokens must appear consecutively)."""
+        tokens = tokenize(text)
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        if len(tokens) == 1:
+            return np.unique(np.concatenate([segment.postings(tokens[0]) for segment in self.segments] or [[]])
+                             .astype(np.int64))
+
+        # Phrase: (ordinal, position - offset) keys shared by every token of the phrase
+        keys = None
+        for offset, token in enumerate(tokens):
+            occurrences = [segment.postings(token, with_positions=True)[1:] for segment in self.segments]
+            owners = np.concatenate([owner for owner, _ in occurrences] or [np.zeros(0, dtype=np.int64)])
+            positions = np.concatenate([position for _, position in occurrences] or [np.zeros(0, dtype=np.int64)])
+            token_keys = np.unique(owners * (MAX_POSITION + 1) + positions - offset)
+            keys = token_keys if keys is None else np.intersect1d(keys, token_keys, assume_unique=True)
+            if not len(keys):
+                break
+        return np.unique(keys // (MAX_POSITION + 1))
+
+    def _parse(self, parts):
+        """Recursive-descent evaluation: expr := and_expr (OR and_expr)*; and_expr := unary (AND? unary)*."""
+        def expression():
+            result = conjunction()
+            while parts and parts[0] == 'OR':
+                parts.pop(0)
+                result = np.union1d(result, conjunction())
+            return result
+
+        def conjunction():
+            result = unary()
+            while parts and parts[0] not in ('OR', ')'):
+                if parts[0] == 'AND':
+                    parts.pop(0)
+                result = np.intersect1d(result, unary(), assume_unique=True)
+            return result
+
+        def unary():
+            if not parts:
+                return np.zeros(0, dtype=np.int64)
+            part = parts.pop(0)
+            if part == 'NOT':
+                return np.setdiff1d(np.arange(len(self.ordinals)), unary(), assume_unique=True)
+            if part.startswith('-') and len(part) > 1:
+                parts.insert(0, part[1:])
+                return np.setdiff1d(np.arange(len(self.ordinals)), unary(), assume_unique=True)
+            if part == '(':
+                result = expression()
+                if parts and parts[0] == ')':
+                    parts.pop(0)
+                return result
+            return self._term(part.strip('"'))
+
+        return expression()
+
+    def matching_ordinals(self, query, channels=None, since=None, until=None, min_likes=None):
+        """Sorted ordinals matching a query and the channel / date ('YYYY-MM-DD') / likes filters."""
+        ordinals = self._parse(QUERY_PATTERN.findall(query))
+        mask = self.ordinals.filter_mask(channels, since, until, min_likes)
+        return ordinals[mask[ordinals]] if mask is not None else ordinals
+
+    def count(self, query, **filters):
+        return len(self.matching_ordinals(query, **filters))
+
+    def search(self, query, channels=None, since=None, until=None, min_likes=None, limit=20, order='likes'):
+        """Matching comments as references (comment_id, video_id, channel, archive, publish_day, likes).
+
+        order is 'likes' (most liked first), 'newest' or 'oldest'; resolve texts with RunReferenceResolver.
+        """
+        ordinals = self.matching_ordinals(query, channels, since, until, min_likes)
+        columns = self.ordinals.columns
+        if order == 'likes':
+            ordinals = ordinals[np.argsort(-columns['likes'][ordinals], kind='stable')]
+        elif order == 'newest':
+            ordinals = ordinals[np.argsort(-columns['day'][ordinals], kind='stable')]
+        return {
+            'query': query,
+            'total': len(ordinals),
+            'results': self.ordinals.describe(ordinals[:limit] if limit else ordinals)
+        }
@@ -0,0 +1,160 @@
+from collections import defaultdict
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from text_cleaner import TextCleaner
+from comment_record import to_epoch_seconds
+from settings import WAREHOUSE_DIR, WAREHOUSE_COMPRESSION
+
+WAREHOUSE_SCHEMA = pa.schema([
+    ('comment_id', pa.string()),
+    ('parent_id', pa.string()),
+    ('channel_id', pa.string()),
+    ('channel_name', pa.string()),
+    ('video_id', pa.string()),
+    ('author', pa.string()),
+    ('author_channel_id', pa.string()),
+    ('is_reply', pa.bool_()),
+    ('publish_ts', pa.int64()),
+    ('updated_ts', pa.int64()),
+    ('likes', pa.int64()),
+    ('reply_count', pa.int32()),
+    ('keyword_mask', pa.uint64()),
+    ('sentiment_code', pa.int8()),
+    ('duplicate_cluster_id', pa.int64()),
+    ('cleaned_text', pa.string())
+])
+
+WAREHOUSE_PARTITIONING = ds.partitioning(
+    pa.schema([('channel_id', pa.string()), ('month', pa.string())]), flavor='hive'
+)
+
+
+class CommentWarehouse:
+    def __init__(self, warehouse_dir=WAREHOUSE_DIR):
+        self.warehouse_dir = warehouse_dir
+        self.warehouse_dir.mkdir(parents=True, exist_ok=True)
+        self.text_cleaner = TextCleaner()
+
+    def _comment_row(self, comment, channel_id, channel_name, video_id):
+        """Flatten one comment dict into a warehouse row."""
+        return {
+            'comment_id': comment.get('comment_id', ''),
+            'parent_id': comment.get('parent_id'),
+            'channel_id': channel_id,
+            'channel_name': channel_name,
+            'video_id': comment.get('video_id') or video_id,
+            'author': comment.get('author', 'Unknown'),
+            'author_channel_id': comment.get('author_channel_id', ''),
+            'is_reply': bool(comment.get('is_reply', False)),
+            'publish_ts': to_epoch_seconds(comment.get('publish_date', '')),
+            'updated_ts': to_epoch_seconds(comment.get('updated_date', '')),
+            'likes': comment.get('likes', 0) or 0,
+            'reply_count': comment.get('reply_count', 0) or 0,
+            'keyword_mask': self.text_cleaner.keyword_bitmask(comment.get('detected_keywords', {})),
+            'sentiment_code': self.text_cleaner.sentiment_code(comment.get('sentiment_category', 'neutral')),
+            'duplicate_cluster_id': comment.get('duplicate_cluster_id'),
+            'cleaned_text': comment.get('cleaned_text', '')
+        }
+
+    def _partition_rows(self, comments_data, channel_names=None):
+        """Group comments into (channel_id, month) partitions of column lists."""
+        channel_names = channel_names or {}
+        partitions = defaultdict(lambda: {name: [] for name in WAREHOUSE_SCHEMA.names})
+
+        for channel_id, channel_data in comments_data.items():
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    channel_name = channel_names.get(channel_id) or comment.get('source_channel', 'Unknown')
+                    row = self._comment_row(comment, channel_id, channel_name, video_id)
+                    month = (comment.get('publish_date') or '')[:7] or 'unknown'
+
+                    columns = partitions[(channel_id, month)]
+                    for name, value in row.items():
+                        columns[name].append(value)
+
+        return partitions
+
+    def write_run(self, comments_data, timestamp, channel_names=None):
+        """Append one run's comments as new Parquet files (one per channel/month partition)."""
+        written_files = []
+        total_rows = 0
+
+        for (channel_id, month), columns in self._partition_rows(comments_data, channel_names).items():
+            table = pa.Table.from_pydict(columns, schema=WAREHOUSE_SCHEMA)
+            partition_dir = self.warehouse_dir / f"channel_id={channel_id}" / f"month={month}"
+            partition_dir.mkdir(parents=True, exist_ok=True)
+
+            filepath = partition_dir / f"part-{timestamp}.parquet"
+            pq.write_table(table, filepath, compression=WAREHOUSE_COMPRESSION)
+
+            written_files.append(filepath)
+            total_rows += table.num_rows
+
+        print(f"🗄️ Warehouse updated: {total_rows:,} rows in {len(written_files)} partition files")
+        return written_files
+
+    def backfill_from_archives(self, data_saver):
+        """One-time load of every existing channel archive into an empty warehouse."""
+        if any(self.warehouse_dir.glob('channel_id=*/month=*/*.parquet')):
+            print("🗄️ Warehouse already populated - skipping backfill")
+            return []
+
+        written_files = []
+        seen_comment_ids = set()
+
+        for file_number, (source_name, channel_file_data) in enumerate(data_saver.load_all_channel_data(), 1):
+            channel_info = channel_file_data.get('channel_info', {})
+            channel_id = channel_info.get('channel_id', source_name)
+
+            # Legacy .json/.json.gz copies of a channel overlap - keep each comment once
+            videos = {}
+            for video_id, video_data in channel_file_data.get('videos', {}).items():
+                comments = [c for c in video_data.get('comments', [])
+                            if c.get('comment_id') not in seen_comment_ids]
+                seen_comment_ids.update(c.get('comment_id') for c in comments)
+                videos[video_id] = {'comments': comments}
+
+            written_files.extend(self.write_run(
+                {channel_id: videos}, f"backfill_{data_saver.timestamp}_{file_number:03d}",
+                {channel_id: channel_info.get('channel_name', 'Unknown')}
+            ))
+        return written_files
+
+    def dataset(self):
+        """Open the warehouse as a Hive-partitioned Arrow dataset."""
+        return ds.dataset(self.warehouse_dir, format='parquet', partitioning=WAREHOUSE_PARTITIONING)
+
+    def read(self, columns=None, channel_ids=None, months=None, filter_expression=None):
+        """Read selected columns, pruning partition directories by channel and month."""
+        expression = filter_expression
+        if channel_ids:
+            channel_filter = ds.field('channel_id').isin(list(channel_ids))
+            expression = channel_filter if expression is None else expression & channel_filter
+        if months:
+            month_filter = ds.field('month').isin(list(months))
+            expression = month_filter if expression is None else expression & month_filter
+
+        return self.dataset().to_table(columns=columns, filter=expression)
+
+    def keyword_filter(self, keyword):
+        """Dataset expression selecting rows whose keyword bitmask contains a main keyword."""
+        bit = self.text_cleaner.keyword_bitmask({keyword: []})
+        return pc.bit_wise_and(ds.field('keyword_mask'), pa.scalar(bit, pa.uint64())) != 0
+
+    def read_keyword(self, keyword, columns=None, channel_ids=None, months=None):
+        """Read rows mentioning a main keyword without loading other rows' payloads."""
+        return self.read(columns=columns, channel_ids=channel_ids, months=months,
+                         filter_expression=self.keyword_filter(keyword))
+
+    def to_pandas(self, columns=None, channel_ids=None, months=None):
+        """Read the warehouse (or a projection of it) into a pandas DataFrame."""
+        return self.read(columns=columns, channel_ids=channel_ids, months=months).to_pandas()
+
+
+if __name__ == "__main__":
+    from data_saver import DataSaver
+
+    warehouse = CommentWarehouse()
+    warehouse.backfill_from_archives(DataSaver())
@@ -0,0 +1,196 @@
+import gzip
+import io
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from settings import COMPRESSION_WORKERS, COMPRESSION_BLOCK_BYTES
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class CompressionCodec:
+    name = 'none'
+    extension = ''
+    default_level = None
+    available = True
+
+    def __init__(self, level=None):
+        self.level = self.default_level if level is None else level
+
+    def compress(self, data):
+        """Compress one block into a self-contained frame."""
+        return data
+
+    def decompress(self, data):
+        """Decompress one or more concatenated frames."""
+        return data
+
+    def open_reader(self, filepath):
+        """Open a binary reader that decompresses across all frames of a file."""
+        return open(filepath, 'rb')
+
+    def compress_blocks(self, blocks, workers=COMPRESSION_WORKERS):
+        """Compress an iterable of blocks in parallel, yielding frames in input order."""
+        if not self.extension or workers <= 1:
+            for block in blocks:
+                yield self.compress(block)
+            return
+
+        # zlib/zstd/lz4 release the GIL, so threads give real parallelism.
+        # A bounded window keeps at most 2 * workers blocks in memory.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for block in blocks:
+                pending.append(executor.submit(self.compress, block))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def write_frames(self, output, blocks, workers=COMPRESSION_WORKERS):
+        """Write blocks to output as frames; returns the frame table for random access.
+
+        Each entry is [compressed_offset, uncompressed_offset] of one frame's start, so a reader
+        can decompress just the frames covering a byte range.
+        """
+        block_sizes = []
+
+        def sized(blocks):
+            for block in blocks:
+                block_sizes.append(len(block))
+                yield block
+
+        frames = []
+        compressed_offset = 0
+        uncompressed_offset = 0
+        for position, frame in enumerate(self.compress_blocks(sized(blocks), workers)):
+            frames.append([compressed_offset, uncompressed_offset])
+            output.write(frame)
+            compressed_offset += len(frame)
+            uncompressed_offset += block_sizes[position]
+        return frames
+
+    def path_for(self, plain_path):
+        """Append this codec's extension to an uncompressed path."""
+        return plain_path.with_name(plain_path.name + self.extension)
+
+    def describe(self):
+        return self.name if self.level is None else f"{self.name}-{self.level}"
+
+
+class GzipCodec(CompressionCodec):
+    name = 'gzip'
+    extension = '.gz'
+    default_level = 6
+
+    def compress(self, data):
+        # mtime=0 keeps output deterministic; each block is a separate gzip member
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+    def open_reader(self, filepath):
+        return gzip.open(filepath, 'rb')
+
+
+class ZstdCodec(CompressionCodec):
+    name = 'zstd'
+    extension = '.zst'
+    default_level = 3
+    available = zstandard is not None
+
+    def compress(self, data):
+        # Compressor objects are not thread-safe, so each block gets its own
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return self.open_reader_from(io.BytesIO(data)).read()
+
+    def open_reader(self, filepath):
+        return self.open_reader_from(open(filepath, 'rb'))
+
+    def open_reader_from(self, source):
+        return zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True, closefd=True)
+
+
+class Lz4Codec(CompressionCodec):
+    name = 'lz4'
+    extension = '.lz4'
+    default_level = 0
+    available = lz4_frame is not None
+
+    def compress(self, data):
+        return lz4_frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        return lz4_frame.LZ4FrameFile(io.BytesIO(data)).read()
+
+    def open_reader(self, filepath):
+        return lz4_frame.open(filepath, 'rb')
+
+
+CODECS = {codec.name: codec for codec in [CompressionCodec, GzipCodec, ZstdCodec, Lz4Codec]}
+CODEC_EXTENSIONS = [codec.extension for codec in CODECS.values() if codec.extension]
+CODEC_SUFFIX_PATTERN = re.compile(r'(' + '|'.join(re.escape(ext) for ext in CODEC_EXTENSIONS) + r')$')
+
+
+def available_codecs():
+    """Names of codecs usable in this environment."""
+    return [name for name, codec in CODECS.items() if codec.available]
+
+
+def get_codec(name, level=None):
+    """Build a codec by name, falling back to gzip when an optional package is missing."""
+    codec_class = CODECS.get(name)
+    if codec_class is None:
+        raise ValueError(f"Unknown compression codec: {name} (choose from {', '.join(CODECS)})")
+
+    if not codec_class.available:
+        print(f"⚠️ {name} codec not installed - falling back to gzip")
+        return GzipCodec()
+
+    return codec_class(level)
+
+
+def codec_for_path(filepath):
+    """Pick the codec that reads a file, based on its extension."""
+    for codec_class in CODECS.values():
+        if codec_class.extension and filepath.name.endswith(codec_class.extension):
+            return codec_class()
+    return CompressionCodec()
+
+
+def strip_codec_suffix(filename):
+    """Remove a trailing codec extension ('x.json.zst' -> 'x.json')."""
+    return CODEC_SUFFIX_PATTERN.sub('', filename)
+
+
+def open_text(filepath, encoding='utf-8'):
+    """Open any (possibly compressed) file for text reading."""
+    return io.TextIOWrapper(codec_for_path(filepath).open_reader(filepath), encoding=encoding)
+
+
+def iter_blocks(chunks, block_bytes=COMPRESSION_BLOCK_BYTES):
+    """Regroup a stream of byte chunks into blocks of about block_bytes for compression."""
+    pending = []
+    pending_bytes = 0
+
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_bytes += len(chunk)
+        if pending_bytes >= block_bytes:
+            yield b''.join(pending)
+            pending = []
+            pending_bytes = 0
+
+    if pending:
+        yield b''.join(pending)
@@ -1,7 +1,5 @@
-import json
-import gzip
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
 import re
 from settings import (
     RAW_DATA_DIR,
@@ -9,8 +7,17 @@ from settings import (
     ANALYSIS_DATA_DIR,
     SPLIT_FILES_BY_CHANNEL,
     MAX_FILE_SIZE_MB,
-    COMPRESS_LARGE_FILES
+    COMPRESS_LARGE_FILES,
+    ARCHIVE_FORMAT,
+    COMPRESSION_WORKERS
 )
+from archive_catalog import ArchiveCatalog
+from archive_reader import ChannelArchiveReader
+from compression_codecs import CODEC_EXTENSIONS, strip_codec_suffix
+from rolling_channel_files import RollingChannelFiles
+from segmented_archive import SegmentedChannelArchive
+from streaming_json import StreamingJSONWriter
+from video_metadata_store import VideoMetadataStore
 
 
 class DataSaver:
@@ -19,39 +26,62 @@ class DataSaver:
         self.raw_data_dir = RAW_DATA_DIR
         self.processed_data_dir = PROCESSED_DATA_DIR
         self.analysis_data_dir = ANALYSIS_DATA_DIR
+        self.catalog = ArchiveCatalog.shared()
+        self.video_store = VideoMetadataStore.shared()
+        self.segment_archive = SegmentedChannelArchive(catalog=self.catalog)
+        self.rolling_files = RollingChannelFiles(self.raw_data_dir, catalog=self.catalog)
+        self.json_writer = StreamingJSONWriter()
+        self.run_segments = {}  # channel_id -> segment appended this run
+        self.compaction_candidates = []  # channels appended this run, compacted once the run stops reading
 
     def find_existing_channel_files(self):
         """Find existing channel files (without timestamps)."""
         existing_files = {}
 
-        # Look for existing channel files
-        json_files = list(self.raw_data_dir.glob('comments_*.json'))
-        gz_files = list(self.raw_data_dir.glob('comments_*.json.gz'))
-        all_files = json_files + gz_files
+        for file_path in self.list_legacy_channel_files():
+            existing_files[self._channel_name_from_path(file_path)] = file_path
 
-        for file_path in all_files:
-            # Extract channel name from filename (remove timestamp if present)
-            filename = file_path.stem.replace('.gz', '') if file_path.suffix == '.gz' else file_path.stem
+        return existing_files
 
-            # Remove 'comments_' prefix
-            channel_part = filename.replace('comments_', '')
+    def list_legacy_channel_files(self):
+        """List channel files: monoliths (.json plus compressed .json.gz/.zst/.lz4 copies) and part indexes.
 
-            # Remove timestamp suffix if present (pattern: _YYYYMMDD_HHMMSS)
-            channel_name = re.sub(r'_\d{8}_\d{6}$', '', channel_part)
+        Part files are reached through their index. Indexes come last so they win over an older
+        monolith of the same channel.
+        """
+        channel_files = list(self.raw_data_dir.glob('comments_*.json'))
+        for extension in CODEC_EXTENSIONS:
+            channel_files.extend(self.raw_data_dir.glob(f'comments_*.json{extension}'))
 
-            existing_files[channel_name] = file_path
+        monoliths = [path for path in channel_files
+                     if not self.rolling_files.is_part_file(path) and not self.rolling_files.is_index_file(path)]
+        indexes = [path for path in channel_files if self.rolling_files.is_index_file(path)]
+        return monoliths + indexes
 
-        return existing_files
+    def _channel_file_companions(self, file_path):
+        """Files that belong to a channel file (the parts of a part index)."""
+        if self.rolling_files.is_index_file(file_path):
+            return self.rolling_files.part_files(file_path)
+        return []
+
+    def _channel_name_from_path(self, file_path):
+        """Extract the safe channel name from a channel file name."""
+        # Extract channel name from filename (strip .json / codec extension, then any timestamp)
+        filename = strip_codec_suffix(file_path.name).replace('.index.json', '').replace('.json', '')
+
+        # Remove 'comments_' prefix
+        channel_part = filename.replace('comments_', '')
+
+        # Remove timestamp suffix if present (pattern: _YYYYMMDD_HHMMSS)
+        return re.sub(r'_\d{8}_\d{6}$', '', channel_part)
 
     def load_existing_channel_data(self, file_path):
-        """Load existing channel data from file."""
+        """Load existing channel data from file (parsed once per run via the archive catalog)."""
         try:
-            if file_path.suffix == '.gz':
-                with gzip.open(file_path, 'rt', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            if self.rolling_files.is_index_file(file_path):
+                return self.rolling_files.load_channel_data(file_path)
+
+            return self.catalog.load_json(file_path)
         except Exception as e:
             print(f"Error loading {file_path}: {e}")
             return None
@@ -90,52 +120,18 @@ class DataSaver:
             print("📁 No new comments to save.")
             return []
 
-        saved_files = []
         existing_files = self.find_existing_channel_files()
 
         print(f"\n📁 Saving new comments only:")
         print(f"   Found {len(existing_files)} existing channel files")
 
-        for channel_id, new_channel_data in new_comments_only.items():
-            if not new_channel_data:
-                continue
-
-            # Get channel info
-            channel_name = self._extract_channel_name(channel_id, new_channel_data, videos_data)
-            safe_channel_name = self._clean_filename(channel_name)
-
-            # Count new comments
-            new_comment_count = sum(
-                len(video_data.get('comments', []))
-                for video_data in new_channel_data.values()
-            )
-
-            print(f"   📺 {channel_name}: {new_comment_count:,} new comments")
-
-            # Check if file exists
-            existing_file_path = existing_files.get(safe_channel_name)
-
-            if existing_file_path and existing_file_path.exists():
-                # UPDATE EXISTING FILE
-                print(f"      🔄 Updating existing file: {existing_file_path.name}")
-
-                existing_data = self.load_existing_channel_data(existing_file_path)
-                if existing_data:
-                    merged_data = self.merge_new_comments_with_existing(existing_data, new_channel_data)
-
-                    # Save back to same file
-                    self._save_channel_file(existing_file_path, merged_data, channel_name, is_update=True)
-                    saved_files.append(existing_file_path)
-                else:
-                    print(f"      ❌ Could not load existing file, creating new one")
-                    new_file_path = self._create_new_channel_file(channel_id, new_channel_data, videos_data,
-                                                                  channel_name)
-                    saved_files.append(new_file_path)
-            else:
-                # CREATE NEW FILE (First time scenario)
-                print(f"      ✨ Creating new file for {channel_name}")
-                new_file_path = self._create_new_channel_file(channel_id, new_channel_data, videos_data, channel_name)
-                saved_files.append(new_file_path)
+        # Channels are independent files, so they are written (and compressed) in parallel
+        channels = [(channel_id, channel_data) for channel_id, channel_data in new_comments_only.items() if channel_data]
+        with ThreadPoolExecutor(max_workers=COMPRESSION_WORKERS) as executor:
+            saved_files = list(executor.map(
+                lambda channel: self._save_channel_update(channel[0], channel[1], videos_data, existing_files),
+                channels
+            ))
 
         print(f"\n📊 Save Summary:")
         print(f"   Files updated/created: {len(saved_files)}")
@@ -146,8 +142,145 @@ class DataSaver:
         )
         print(f"   Total new comments saved: {total_new_comments:,}")
 
+        if ARCHIVE_FORMAT == 'segmented':
+            # Compaction deletes the segments readers may still hold, so it waits for compact_saved_channels
+            self.compaction_candidates.extend(
+                self._clean_filename(self._extract_channel_name(channel_id, channel_data, videos_data))
+                for channel_id, channel_data in new_comments_only.items() if channel_data
+            )
+
         return saved_files
 
+    def compact_saved_channels(self):
+        """Start background compaction of the channels appended this run (call after the last archive read)."""
+        candidates, self.compaction_candidates = self.compaction_candidates, []
+        if candidates:
+            return self.segment_archive.start_background_compaction(candidates)
+        return None
+
+    def _save_channel_update(self, channel_id, new_channel_data, videos_data, existing_files):
+        """Save one channel's new comments; returns the file written."""
+        # Get channel info
+        channel_name = self._extract_channel_name(channel_id, new_channel_data, videos_data)
+        safe_channel_name = self._clean_filename(channel_name)
+
+        # Count new comments
+        new_comment_count = sum(
+            len(video_data.get('comments', []))
+            for video_data in new_channel_data.values()
+        )
+
+        print(f"   📺 {channel_name}: {new_comment_count:,} new comments")
+
+        if ARCHIVE_FORMAT == 'segmented':
+            # APPEND-ONLY: cost is proportional to the new comments, not the channel history
+            return self._append_channel_segment(channel_id, new_channel_data, channel_name)
+
+        # Check if file exists
+        existing_file_path = existing_files.get(safe_channel_name)
+
+        if existing_file_path and self.rolling_files.is_index_file(existing_file_path):
+            # UPDATE PARTED CHANNEL: only the parts holding affected videos are read and rewritten
+            index, touched_parts = self.rolling_files.update_channel(
+                existing_file_path, new_channel_data, self.timestamp
+            )
+            print(f"      🔄 Updated {touched_parts} of {len(index['parts'])} parts: {existing_file_path.name}")
+            print(f"         Total comments in file: {index['channel_info']['total_comments']:,}")
+            return existing_file_path
+
+        if existing_file_path and existing_file_path.exists():
+            # UPDATE EXISTING FILE
+            print(f"      🔄 Updating existing file: {existing_file_path.name}")
+
+            existing_data = self.load_existing_channel_data(existing_file_path)
+            # The merge modifies the cached parse in place
+            self.catalog.invalidate(existing_file_path)
+            if existing_data:
+                merged_data = self.merge_new_comments_with_existing(existing_data, new_channel_data)
+
+                # Rewrite as size-bounded parts; the monolith is removed afterwards
+                return self._save_channel_file(existing_file_path, merged_data, channel_name, is_update=True)
+
+            print(f"      ❌ Could not load existing file, creating new one")
+            return self._create_new_channel_file(channel_id, new_channel_data, videos_data, channel_name)
+
+        # CREATE NEW FILE (First time scenario)
+        print(f"      ✨ Creating new file for {channel_name}")
+        return self._create_new_channel_file(channel_id, new_channel_data, videos_data, channel_name)
+
+    def _append_channel_segment(self, channel_id, channel_data, channel_name):
+        """Append new comments as a segment, importing any legacy channel file first."""
+        safe_channel_name = self._clean_filename(channel_name)
+
+        if self.segment_archive.load_manifest(safe_channel_name) is None:
+            legacy_files = [
+                file_path for file_path in self.list_legacy_channel_files()
+                if self._channel_name_from_path(file_path) == safe_channel_name
+            ]
+            if legacy_files:
+                self.segment_archive.import_legacy_files(
+                    safe_channel_name, channel_id, channel_name, sorted(legacy_files),
+                    self.load_existing_channel_data, self.timestamp,
+                    companion_files=self._channel_file_companions
+                )
+
+        segment_path, manifest = self.segment_archive.append_segment(
+            safe_channel_name, channel_id, channel_name, channel_data, self.timestamp
+        )
+        self.run_segments[channel_id] = segment_path.name
+
+        print(f"      ✅ Appended: {safe_channel_name}/{segment_path.name} "
+              f"({self._get_file_size_mb(segment_path):.2f} MB)")
+        print(f"         Total comments in archive: {manifest['channel_info']['total_comments']:,} "
+              f"across {len(manifest['segments'])} segments")
+        return segment_path
+
+    def load_all_channel_data(self):
+        """Yield (source_name, channel_data) for every channel archive, segmented or legacy."""
+        for safe_channel_name in self.segment_archive.list_channels():
+            channel_data = self.segment_archive.load_channel_data(safe_channel_name)
+            if channel_data:
+                yield f"segments/{safe_channel_name}", channel_data
+
+        for file_path in self.list_legacy_channel_files():
+            channel_data = self.load_existing_channel_data(file_path)
+            if channel_data:
+                yield file_path.name, channel_data
+
+    def open_channel_readers(self):
+        """Yield (source_name, ChannelArchiveReader) for every channel archive, segmented or legacy."""
+        for safe_channel_name in self.segment_archive.list_channels():
+            reader = ChannelArchiveReader.from_segments(self.segment_archive, safe_channel_name)
+            if reader:
+                yield f"segments/{safe_channel_name}", reader
+
+        for file_path in self.list_legacy_channel_files():
+            try:
+                reader = ChannelArchiveReader.from_channel_file(file_path)
+            except Exception as e:
+                print(f"Error opening {file_path}: {e}")
+                continue
+            yield file_path.name, reader
+
+    def channel_archive_source(self, channel_id, channel_data, videos_data=None, existing_files=None):
+        """Source name (as yielded by open_channel_readers) of the archive holding a channel's comments."""
+        safe_channel_name = self._clean_filename(self._extract_channel_name(channel_id, channel_data, videos_data))
+        if self.segment_archive.load_manifest(safe_channel_name) is not None:
+            return f"segments/{safe_channel_name}"
+
+        if existing_files is None:
+            existing_files = self.find_existing_channel_files()
+        file_path = existing_files.get(safe_channel_name)
+        return file_path.name if file_path else None
+
+    def open_archive(self, source_name):
+        """Open one archive by its source name; None if it no longer exists."""
+        if source_name.startswith('segments/'):
+            return ChannelArchiveReader.from_segments(self.segment_archive, source_name.split('/', 1)[1])
+
+        file_path = self.raw_data_dir / source_name
+        return ChannelArchiveReader.from_channel_file(file_path) if file_path.exists() else None
+
     def _create_new_channel_file(self, channel_id, channel_data, videos_data, channel_name):
         """Create a new channel file (first time scenario)."""
         safe_channel_name = self._clean_filename(channel_name)
@@ -174,43 +307,28 @@ class DataSaver:
             }
         }
 
-        # Create file path (without timestamp for consistency)
-        filename = f"comments_{safe_channel_name}.json"
-        filepath = self.raw_data_dir / filename
+        # Create the part index path (without timestamp for consistency)
+        filepath = self.rolling_files.index_path(safe_channel_name)
 
-        self._save_channel_file(filepath, channel_file_data, channel_name, is_update=False)
-        return filepath
+        return self._save_channel_file(filepath, channel_file_data, channel_name, is_update=False)
 
     def _save_channel_file(self, filepath, channel_data, channel_name, is_update=False):
-        """Save channel data to file with compression if needed."""
-        # Check if compression needed
-        json_str = json.dumps(channel_data, indent=2, ensure_ascii=False)
-        estimated_size = len(json_str.encode('utf-8')) / (1024 * 1024)
-
-        if COMPRESS_LARGE_FILES and estimated_size > MAX_FILE_SIZE_MB:
-            if not filepath.name.endswith('.gz'):
-                filepath = filepath.with_suffix('.json.gz')
-
-            with gzip.open(filepath, 'wt', encoding='utf-8') as f:
-                f.write(json_str)
-            compression_note = " (compressed)"
-        else:
-            # Ensure .json extension
-            if filepath.suffix == '.gz':
-                filepath = filepath.with_suffix('')
-            if not filepath.name.endswith('.json'):
-                filepath = filepath.with_suffix('.json')
+        """Write channel data as parts of at most MAX_FILE_SIZE_MB, aligned to video boundaries."""
+        safe_channel_name = self._clean_filename(channel_name)
+        index_path, index = self.rolling_files.write_channel(safe_channel_name, channel_data)
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(json_str)
-            compression_note = ""
+        # The old monolith was merged into the parts - drop it
+        if is_update and filepath != index_path and filepath.exists():
+            filepath.unlink()
+            self.catalog.forget(filepath)
 
-        file_size = self._get_file_size_mb(filepath)
+        stored_mb = sum(part['stored_bytes'] for part in index['parts']) / (1024 * 1024)
         action = "Updated" if is_update else "Created"
         total_comments = channel_data.get('channel_info', {}).get('total_comments', 0)
 
-        print(f"      ✅ {action}: {filepath.name} ({file_size:.2f} MB){compression_note}")
+        print(f"      ✅ {action}: {index_path.name} ({len(index['parts'])} parts, {stored_mb:.2f} MB)")
         print(f"         Total comments in file: {total_comments:,}")
+        return index_path
 
     # Update your existing save_raw_data method
     def save_raw_data(self, videos_data, comments_data, new_comments_only=None):
@@ -233,10 +351,9 @@ class DataSaver:
     def _save_videos_data(self, videos_data):
         """Save videos data."""
         filename = f"videos_{self.timestamp}.json"
-        filepath = self.raw_data_dir / filename
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(videos_data, f, indent=2, ensure_ascii=False)
+        # Static metadata goes to the content-addressed store; the run file keeps hashes and stats
+        compact_videos_data = self.video_store.record_run(videos_data, self.timestamp)
+        filepath = self.json_writer.write(self.raw_data_dir / filename, compact_videos_data)['path']
 
         file_size = self._get_file_size_mb(filepath)
         print(f"📁 Videos saved: {filename} ({file_size:.2f} MB)")
@@ -247,19 +364,13 @@ class DataSaver:
         filename = f"comments_{self.timestamp}.json"
         filepath = self.raw_data_dir / filename
 
-        # Check if compression needed
-        json_str = json.dumps(comments_data, indent=2, ensure_ascii=False)
-        estimated_size = len(json_str.encode('utf-8')) / (1024 * 1024)
-
-        if COMPRESS_LARGE_FILES and estimated_size > MAX_FILE_SIZE_MB:
-            filepath = filepath.with_suffix('.json.gz')
-            with gzip.open(filepath, 'wt', encoding='utf-8') as f:
-                f.write(json_str)
-            print(f"📁 Comments saved (compressed): {filepath.name} ({self._get_file_size_mb(filepath):.2f} MB)")
-        else:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(json_str)
-            print(f"📁 Comments saved: {filepath.name} ({self._get_file_size_mb(filepath):.2f} MB)")
+        result = self.json_writer.write(
+            filepath, comments_data,
+            compress_over_mb=MAX_FILE_SIZE_MB if COMPRESS_LARGE_FILES else None
+        )
+        filepath = result['path']
+        compression_note = " (compressed)" if result['compressed'] else ""
+        print(f"📁 Comments saved{compression_note}: {filepath.name} ({self._get_file_size_mb(filepath):.2f} MB)")
 
         return filepath
 
@@ -279,13 +390,10 @@ class DataSaver:
             safe_channel_name = self._clean_filename(channel_name)
 
             # Count comments for this channel
-            channel_comments = []
-            channel_comment_count = 0
-
-            for video_id, video_data in channel_data.items():
-                comments = video_data.get('comments', [])
-                channel_comments.extend(comments)
-                channel_comment_count += len(comments)
+            channel_comment_count = sum(
+                len(video_data.get('comments', []))
+                for video_data in channel_data.values()
+            )
 
             if channel_comment_count == 0:
                 print(f"  ⚠️ {channel_name}: No comments - skipping")
@@ -311,19 +419,12 @@ class DataSaver:
             filename = f"comments_{safe_channel_name}_{self.timestamp}.json"
             filepath = self.raw_data_dir / filename
 
-            # Check if compression needed
-            json_str = json.dumps(channel_file_data, indent=2, ensure_ascii=False)
-            estimated_size = len(json_str.encode('utf-8')) / (1024 * 1024)
-
-            if COMPRESS_LARGE_FILES and estimated_size > MAX_FILE_SIZE_MB:
-                filepath = filepath.with_suffix('.json.gz')
-                with gzip.open(filepath, 'wt', encoding='utf-8') as f:
-                    f.write(json_str)
-                compression_note = " (compressed)"
-            else:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(json_str)
-                compression_note = ""
+            result = self.json_writer.write(
+                filepath, channel_file_data,
+                compress_over_mb=MAX_FILE_SIZE_MB if COMPRESS_LARGE_FILES else None
+            )
+            filepath = result['path']
+            compression_note = " (compressed)" if result['compressed'] else ""
 
             file_size = self._get_file_size_mb(filepath)
             print(
@@ -407,10 +508,7 @@ class DataSaver:
     def save_processed_data(self, processed_data):
         """Save processed data."""
         filename = f"processed_{self.timestamp}.json"
-        filepath = self.processed_data_dir / filename
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(processed_data, f, indent=2, ensure_ascii=False)
+        filepath = self.json_writer.write(self.processed_data_dir / filename, processed_data)['path']
 
         file_size = self._get_file_size_mb(filepath)
         print(f"📁 Processed data saved: {filename} ({file_size:.2f} MB)")
@@ -419,10 +517,7 @@ class DataSaver:
     def save_analysis_data(self, analysis_data):
         """Save analysis data."""
         filename = f"analysis_{self.timestamp}.json"
-        filepath = self.analysis_data_dir / filename
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(analysis_data, f, indent=2, ensure_ascii=False)
+        filepath = self.json_writer.write(self.analysis_data_dir / filename, analysis_data)['path']
 
         file_size = self._get_file_size_mb(filepath)
         print(f"📁 Analysis data saved: {filename} ({file_size:.2f} MB)")
@@ -434,10 +529,7 @@ class DataSaver:
         filepath = self.raw_data_dir / 'backups' / filename
         filepath.parent.mkdir(exist_ok=True)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-
-        return filepath
+        return self.json_writer.write(filepath, data)['path']
 
     def _get_file_size_mb(self, filepath):
         """Get file size in MB."""
@@ -0,0 +1,249 @@
+import json
+import math
+import os
+import time
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+from comment_search_index import tokenize
+from keyword_matcher import KeywordMatcher
+from streaming_sketches import CountMinSketch, SpaceSaving
+from settings import (
+    EMERGING_TERMS_FILE, EMERGING_TERMS_MAX_NGRAM, EMERGING_TERMS_CAPACITY, EMERGING_TERMS_WEEKS,
+    EMERGING_TERMS_RECENT_WEEKS, EMERGING_TERMS_MIN_COUNT, EMERGING_TERMS_MIN_LIFT
+)
+
+ALL_CHANNELS = '__all__'
+
+# Function words (English and romanised Hindi) that never start or end a candidate term
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in is it its me my no not of on or so that the this
+to was we were will with you your u ur all am can do just very also our us they he she them then than
+hai hain ho hu hoon hoga hogi ka ke ki ko se me mein main mai bhi to toh tha thi the na nahi nhi kya ye yeh
+wo woh aur par pe ek koi kuch ab jo sab ne hi tu tum aap apna apne apni sir mam maam
+""".split())
+
+
+@lru_cache(maxsize=4096)
+def week_start(day):
+    """Monday ('YYYY-MM-DD') of the week a 'YYYY-MM-DD' day falls in."""
+    parsed = date.fromisoformat(day)
+    return (parsed - timedelta(days=parsed.weekday())).isoformat()
+
+
+def comment_terms(text, max_ngram=EMERGING_TERMS_MAX_NGRAM):
+    """Distinct unigrams, bigrams and trigrams of a comment, without stopword-edged n-grams."""
+    tokens = tokenize(text)
+    terms = set()
+    for size in range(1, max_ngram + 1):
+        for start in range(len(tokens) - size + 1):
+            first, last = tokens[start], tokens[start + size - 1]
+            if first in STOPWORDS or last in STOPWORDS or first.isdigit() or last.isdigit():
+                continue
+            if size == 1 and len(first) < 3:
+                continue
+            terms.add(' '.join(tokens[start:start + size]))
+    return terms
+
+
+class EmergingTerms:
+    # Streaming n-gram counts per channel (and over all channels) in bounded memory: a Count-Min
+    # sketch of every term ever seen is the baseline, and Space-Saving heavy hitters of the last
+    # EMERGING_TERMS_WEEKS publish weeks are the recent windows. A term is rising when its share of
+    # recent comments is EMERGING_TERMS_MIN_LIFT times its share of earlier ones. Terms count once per comment.
+    def __init__(self, terms_file=EMERGING_TERMS_FILE, channel_readers=None):
+        self.terms_file = terms_file
+        self.scopes = {}  # channel name or ALL_CHANNELS -> {baseline, weeks, week_comments, comments}
+        self.matcher = KeywordMatcher()
+        self._pending = {}  # (scope, week) -> [Counter of terms, comment count]
+        self.load(channel_readers)
+
+    def load(self, channel_readers=None):
+        """Load the saved sketches, building them from the archives if there are none yet."""
+        try:
+            if self.terms_file.exists():
+                with open(self.terms_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.scopes = {
+                    scope: {
+                        'baseline': CountMinSketch.from_dict(stats['baseline']),
+                        'weeks': {week: SpaceSaving.from_dict(summary) for week, summary in stats['weeks'].items()},
+                        'week_comments': stats['week_comments'],
+                        'comments': stats['comments']
+                    }
+                    for scope, stats in data['scopes'].items()
+                }
+            elif channel_readers is not None:
+                print("No emerging-term sketches found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading emerging-term sketches: {e}")
+
+    def rebuild(self, channel_readers):
+        """Stream every archived comment once; channel_readers yields (source_name, reader)."""
+        start = time.perf_counter()
+        seen_comment_ids = set()
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        comment_id = comment.get('comment_id')
+                        if comment_id in seen_comment_ids:
+                            continue
+                        seen_comment_ids.add(comment_id)
+                        self.add_comment(comment)
+                        if len(seen_comment_ids) % 10000 == 0:
+                            self.flush()
+            except Exception as e:
+                print(f"Error streaming {source_name}: {e}")
+
+        self.save()
+        print(f"Sketched terms of {len(seen_comment_ids):,} archived comments in {time.perf_counter() - start:.1f}s")
+
+    def add_comment(self, comment):
+        """Queue a comment's terms for its channel and publish week (undated comments only feed the baseline)."""
+        terms = comment_terms(comment.get('cleaned_text', ''))
+        day = (comment.get('publish_date') or '')[:10]
+        try:
+            week = week_start(day)
+        except ValueError:
+            week = None
+
+        for scope in (ALL_CHANNELS, comment.get('source_channel', 'Unknown')):
+            pending = self._pending.get((scope, week))
+            if pending is None:
+                pending = self._pending[(scope, week)] = [Counter(), 0]
+            pending[0].update(terms)
+            pending[1] += 1
+
+    def add_new_comments(self, new_comments_only):
+        """Stream a run's new comments (channel_id -> video_id -> {comments})."""
+        added = 0
+        for channel_data in (new_comments_only or {}).values():
+            for video_data in channel_data.values():
+                for comment in video_data.get('comments', []):
+                    self.add_comment(comment)
+                    added += 1
+        self.flush()
+        print(f"🌱 Emerging terms: +{added:,} comments sketched")
+        return added
+
+    def _scope(self, scope):
+        stats = self.scopes.get(scope)
+        if stats is None:
+            stats = self.scopes[scope] = {'baseline': CountMinSketch(), 'weeks': {}, 'week_comments': {}, 'comments': 0}
+        return stats
+
+    def flush(self):
+        """Fold queued terms into the sketches, keeping only the most recent weeks as heavy-hitter windows."""
+        for (scope, week), (terms, comments) in self._pending.items():
+            stats = self._scope(scope)
+            stats['baseline'].add(list(terms), list(terms.values()))
+            stats['comments'] += comments
+            if week is None:
+                continue
+            stats['week_comments'][week] = stats['week_comments'].get(week, 0) + comments
+            summary = stats['weeks'].get(week)
+            if summary is None:
+                summary = stats['weeks'][week] = SpaceSaving(EMERGING_TERMS_CAPACITY)
+            summary.add_counts(terms)
+        self._pending = {}
+
+        for stats in self.scopes.values():
+            for week in sorted(stats['weeks'])[:-EMERGING_TERMS_WEEKS]:
+                del stats['weeks'][week]
+
+    def latest_week(self):
+        weeks = self.scopes.get(ALL_CHANNELS, {}).get('weeks', {})
+        return max(weeks) if weeks else None
+
+    def rising_terms(self, channel=None, limit=20, min_count=EMERGING_TERMS_MIN_COUNT, min_lift=EMERGING_TERMS_MIN_LIFT):
+        """Terms whose share of comments in the recent weeks is at least min_lift times their earlier share.
+
+        Recent counts use the Space-Saving lower bound and the baseline the Count-Min estimate, so
+        lift errs low. Returns [{term, recent_mentions, baseline_mentions, lift}], highest lift first.
+        """
+        self.flush()
+        stats = self.scopes.get(channel or ALL_CHANNELS)
+        latest = self.latest_week()
+        if not stats or latest is None:
+            return []
+
+        first_recent = (date.fromisoformat(latest) - timedelta(weeks=EMERGING_TERMS_RECENT_WEEKS - 1)).isoformat()
+        recent_weeks = [week for week in stats['weeks'] if week >= first_recent]
+        recent_comments = sum(stats['week_comments'].get(week, 0) for week in recent_weeks)
+        baseline_comments = stats['comments'] - recent_comments
+        if not recent_weeks or recent_comments == 0 or baseline_comments <= 0:
+            return []
+
+        recent = stats['weeks'][recent_weeks[0]]
+        for week in recent_weeks[1:]:
+            recent = recent.merge(stats['weeks'][week])
+
+        candidates = [(term, count - error) for term, count, error in recent.top() if count - error >= min_count]
+        estimates = stats['baseline'].estimate([term for term, _ in candidates])
+        rising = []
+        for (term, mentions), estimate in zip(candidates, estimates):
+            baseline_mentions = max(int(estimate) - mentions, 0)
+            lift = (mentions / recent_comments) / ((baseline_mentions + 1) / (baseline_comments + 1))
+            if lift >= min_lift:
+                rising.append({
+                    'term': term,
+                    'recent_mentions': mentions,
+                    'baseline_mentions': baseline_mentions,
+                    'lift': round(lift, 2)
+                })
+
+        rising.sort(key=lambda entry: (entry['lift'] * math.log1p(entry['recent_mentions']), entry['term']), reverse=True)
+        return rising[:limit]
+
+    def suggest_keywords(self, limit=10):
+        """Rising terms not already matched by TARGET_KEYWORDS, with the channels they rise in."""
+        channels_rising = {}
+        for scope in self.scopes:
+            if scope == ALL_CHANNELS:
+                continue
+            for entry in self.rising_terms(scope, limit=None):
+                channels_rising.setdefault(entry['term'], []).append(scope)
+
+        suggestions = []
+        for entry in self.rising_terms(limit=None):
+            if self.matcher.match(entry['term']):
+                continue
+            suggestions.append({**entry, 'channels': sorted(channels_rising.get(entry['term'], []))})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def report(self, limit=10):
+        """Rising terms overall and per channel plus candidate TARGET_KEYWORDS additions."""
+        return {
+            'latest_week': self.latest_week(),
+            'rising_terms': {
+                scope: self.rising_terms(None if scope == ALL_CHANNELS else scope, limit)
+                for scope in sorted(self.scopes)
+            },
+            'suggested_keywords': self.suggest_keywords(limit)
+        }
+
+    def save(self):
+        """Persist the sketches (tables are zlib-compressed)."""
+        try:
+            self.flush()
+            data = {
+                'scopes': {
+                    scope: {
+                        'baseline': stats['baseline'].to_dict(),
+                        'weeks': {week: summary.to_dict() for week, summary in stats['weeks'].items()},
+                        'week_comments': stats['week_comments'],
+                        'comments': stats['comments']
+                    }
+                    for scope, stats in self.scopes.items()
+                }
+            }
+            tmp_path = self.terms_file.with_name(self.terms_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.terms_file)
+        except Exception as e:
+            print(f"Error saving emerging-term sketches: {e}")
@@ -0,0 +1,280 @@
+import heapq
+import json
+import os
+from datetime import datetime
+from keyword_cooccurrence import KeywordCooccurrence, keyword_mask
+from keyword_trends import KeywordTrends
+from settings import ALL_KEYWORDS, KEYWORD_AGGREGATES_FILE, KEYWORD_TOP_COMMENTS, KEYWORD_TOP_COMMENTS_SLACK
+
+# Bump when new aggregates are added; older files are rebuilt from the archives
+AGGREGATES_VERSION = 3
+
+
+class KeywordAggregates:
+    # Whole-corpus keyword x channel x video counters. Only comments flagged new by
+    # filter_new_comments_only are added, so a run costs O(new comments), and reports
+    # are built from the counters without rescanning the archives. The per-keyword top-comment
+    # heaps also see re-fetched comments (refresh_top_comments), so their likes stay current.
+    def __init__(self, aggregates_file=KEYWORD_AGGREGATES_FILE, channel_readers=None, top_comments=KEYWORD_TOP_COMMENTS):
+        self.aggregates_file = aggregates_file
+        self.top_comments = top_comments
+        self.heap_capacity = top_comments + KEYWORD_TOP_COMMENTS_SLACK
+        self.keywords = {}
+        self.comments_aggregated = 0
+        self.updated = None
+        self._heaps = {}  # keyword -> min-heap of (likes, comment_id, entry)
+        self._clusters = {}  # keyword -> near-duplicate cluster ids already counted
+        self.cooccurrence = KeywordCooccurrence()
+        self.trends = KeywordTrends()
+        self.load(channel_readers)
+
+    def _keyword(self, keyword):
+        if keyword not in self.keywords:
+            self.keywords[keyword] = {
+                'mentions': 0,
+                'likes': 0,
+                'near_duplicates_collapsed': 0,
+                'sentiment': {},
+                'channels': {}
+            }
+            self._heaps[keyword] = []
+            self._clusters[keyword] = set()
+        return self.keywords[keyword]
+
+    def load(self, channel_readers=None):
+        """Load the aggregates, rebuilding them from the archives if none were saved yet."""
+        try:
+            data = None
+            if self.aggregates_file.exists():
+                with open(self.aggregates_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Stale counters are never reused: rebuild them, or start empty without archives to rebuild from
+                if data.get('version') != AGGREGATES_VERSION:
+                    print("Keyword aggregates are from an older version.")
+                    data = None
+                elif not KeywordCooccurrence.layout_matches(data.get('cooccurrence', {})):
+                    print("Keyword aggregates were saved with different keyword bits.")
+                    data = None
+
+            if data is not None:
+                self.cooccurrence = KeywordCooccurrence.from_dict(data.get('cooccurrence', {}))
+                self.trends = KeywordTrends.from_dict(data.get('trends', {}))
+                self.comments_aggregated = data.get('comments_aggregated', 0)
+                self.updated = data.get('updated')
+                for keyword, stats in data.get('keywords', {}).items():
+                    top_comments = stats.pop('top_comments', [])
+                    clusters = stats.pop('clusters', [])
+                    self.keywords[keyword] = stats
+                    self._heaps[keyword] = [(entry['likes'], entry['comment_id'], entry) for entry in top_comments]
+                    heapq.heapify(self._heaps[keyword])
+                    self._clusters[keyword] = set(clusters)
+            elif channel_readers is not None:
+                print("No current keyword aggregates found. Rebuilding from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading keyword aggregates: {e}")
+
+    def rebuild(self, channel_readers, collapse_near_duplicates=True):
+        """Aggregate every archived comment once (first run only); channel_readers yields (source, reader)."""
+        seen_comment_ids = set()
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        comment_id = comment.get('comment_id')
+                        if comment_id in seen_comment_ids:
+                            continue
+                        seen_comment_ids.add(comment_id)
+                        self.add_comment(comment, video_id, source_name, collapse_near_duplicates)
+            except Exception as e:
+                print(f"Error aggregating {source_name}: {e}")
+
+        print(f"Rebuilt keyword aggregates from {len(seen_comment_ids):,} archived comments")
+        self.save()
+
+    def add_comment(self, comment, video_id=None, archive=None, collapse_near_duplicates=True):
+        """Fold one comment into the counters and the bounded top-comment heaps."""
+        detected_keywords = comment.get('detected_keywords') or {}
+        channel_name = comment.get('source_channel', 'Unknown')
+
+        # Every comment (with or without keywords) feeds the co-occurrence histograms
+        self.cooccurrence.add(keyword_mask(detected_keywords), channel_name, (comment.get('publish_date') or '')[:7])
+        if not detected_keywords:
+            return
+
+        video_id = comment.get('video_id') or video_id
+        sentiment = comment.get('sentiment_category', 'neutral')
+        likes = comment.get('likes', 0)
+        publish_date = comment.get('publish_date')
+        cluster_id = comment.get('duplicate_cluster_id')
+        self.comments_aggregated += 1
+
+        for keyword, variations in detected_keywords.items():
+            stats = self._keyword(keyword)
+
+            # Each near-duplicate cluster counts once per keyword
+            if collapse_near_duplicates and cluster_id is not None:
+                if cluster_id in self._clusters[keyword]:
+                    stats['near_duplicates_collapsed'] += 1
+                    continue
+                self._clusters[keyword].add(cluster_id)
+
+            stats['mentions'] += 1
+            stats['likes'] += likes
+            stats['sentiment'][sentiment] = stats['sentiment'].get(sentiment, 0) + 1
+
+            channel = stats['channels'].setdefault(channel_name, {'mentions': 0, 'likes': 0, 'videos': {}})
+            channel['mentions'] += 1
+            channel['likes'] += likes
+            video = channel['videos'].setdefault(video_id, [0, 0])  # [mentions, likes]
+            video[0] += 1
+            video[1] += likes
+            self.trends.add(keyword, channel_name, publish_date, likes, sentiment)
+            self._offer_top_comment(keyword, comment, video_id, archive, variations, likes)
+
+    def _offer_top_comment(self, keyword, comment, video_id, archive, variations, likes):
+        """Push a comment onto a keyword's bounded min-heap if it beats the least-liked entry."""
+        heap = self._heaps[keyword]
+        if len(heap) < self.heap_capacity or likes > heap[0][0]:
+            cleaned_text = comment.get('cleaned_text', '')
+            entry = {
+                'comment_id': comment.get('comment_id'),
+                'video_id': video_id,
+                'archive': archive,
+                'text_preview': cleaned_text[:100] + '...' if len(cleaned_text) > 100 else cleaned_text,
+                'likes': likes,
+                'author': comment.get('author', 'Unknown'),
+                'variations_found': list(variations),
+                'sentiment': comment.get('sentiment_category', 'neutral'),
+                'channel': comment.get('source_channel', 'Unknown'),
+                'duplicate_cluster_id': comment.get('duplicate_cluster_id')
+            }
+            item = (likes, entry['comment_id'] or '', entry)
+            if len(heap) < self.heap_capacity:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heapreplace(heap, item)
+
+    def add_new_comments(self, new_comments_only, channel_references=None, collapse_near_duplicates=True):
+        """Fold in a run's new comments (channel_id -> video_id -> {comments})."""
+        added = 0
+        for channel_id, channel_data in (new_comments_only or {}).items():
+            archive = (channel_references or {}).get(channel_id, {}).get('archive')
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    self.add_comment(comment, video_id, archive, collapse_near_duplicates)
+                    added += 1
+
+        self.updated = datetime.now().strftime("%Y%m%d_%H%M%S")
+        print(f"📈 Keyword aggregates: +{added:,} new comments "
+              f"({self.comments_aggregated:,} keyword comments in corpus)")
+        return added
+
+    def refresh_top_comments(self, comments_data, channel_references=None, collapse_near_duplicates=True):
+        """Re-offer a run's crawled comments (new and re-fetched alike) to the top-comment heaps.
+
+        Counters only take new comments, but likes change on every re-fetch; this updates heap members
+        and lets comments that gained likes in, as CommentLeaderboards.update_from_run does. Returns
+        how many heap entries changed.
+        """
+        refreshed = 0
+        for channel_id, channel_data in (comments_data or {}).items():
+            archive = (channel_references or {}).get(channel_id, {}).get('archive')
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    detected_keywords = comment.get('detected_keywords') or {}
+                    if not detected_keywords:
+                        continue
+                    comment_id = comment.get('comment_id') or ''
+                    cluster_id = comment.get('duplicate_cluster_id')
+                    likes = comment.get('likes', 0) or 0
+                    for keyword, variations in detected_keywords.items():
+                        heap = self._heaps.get(keyword)
+                        if heap is None:
+                            continue
+                        position = next((i for i, item in enumerate(heap) if item[1] == comment_id), None)
+                        if position is not None:
+                            if heap[position][0] != likes:
+                                entry = {**heap[position][2], 'likes': likes}
+                                heap[position] = (likes, comment_id, entry)
+                                heapq.heapify(heap)
+                                refreshed += 1
+                            continue
+                        # A near-duplicate cluster already listed for this keyword is not listed twice
+                        if (collapse_near_duplicates and cluster_id is not None
+                                and any(item[2].get('duplicate_cluster_id') == cluster_id for item in heap)):
+                            continue
+                        if len(heap) < self.heap_capacity or likes > heap[0][0]:
+                            self._offer_top_comment(keyword, comment, comment.get('video_id') or video_id,
+                                                    archive, variations, likes)
+                            refreshed += 1
+        return refreshed
+
+    def top_comment_entries(self, keyword):
+        """Top comments of a keyword, most liked first."""
+        ranked = sorted(self._heaps.get(keyword, []), key=lambda item: item[:2], reverse=True)
+        return [entry for _, _, entry in ranked[:self.top_comments]]
+
+    def cross_channel_data(self, target_keywords=None):
+        """Whole-corpus data in the shape of analyze_keyword_distribution, built from the counters."""
+        cross_channel_analysis = {}
+        for keyword in (target_keywords or list(ALL_KEYWORDS)):
+            stats = self.keywords.get(keyword)
+            if stats is None:
+                stats = {'mentions': 0, 'likes': 0, 'near_duplicates_collapsed': 0, 'sentiment': {}, 'channels': {}}
+
+            channel_stats = {
+                channel_name: {
+                    'mentions': channel['mentions'],
+                    'likes': channel['likes'],
+                    'videos_count': len(channel['videos'])
+                }
+                for channel_name, channel in stats['channels'].items()
+            }
+
+            cross_channel_analysis[keyword] = {
+                'total_mentions': stats['mentions'],
+                'total_likes': stats['likes'],
+                'channel_stats': channel_stats,
+                'top_channels': sorted(channel_stats.items(), key=lambda x: x[1]['mentions'], reverse=True),
+                'sentiment_breakdown': dict(stats['sentiment']),
+                'sample_comments': self.top_comment_entries(keyword),
+                'near_duplicates_collapsed': stats['near_duplicates_collapsed']
+            }
+
+        return cross_channel_analysis
+
+    def video_stats(self, keyword, channel_name):
+        """video_id -> {mentions, likes} for one keyword on one channel."""
+        channel = self.keywords.get(keyword, {}).get('channels', {}).get(channel_name, {})
+        return {
+            video_id: {'mentions': mentions, 'likes': likes}
+            for video_id, (mentions, likes) in channel.get('videos', {}).items()
+        }
+
+    def save(self):
+        """Persist the counters, top-comment heaps and counted clusters."""
+        try:
+            keywords = {
+                keyword: {
+                    **stats,
+                    'top_comments': [entry for _, _, entry in self._heaps.get(keyword, [])],
+                    'clusters': sorted(self._clusters.get(keyword, set()))
+                }
+                for keyword, stats in self.keywords.items()
+            }
+            data = {
+                'version': AGGREGATES_VERSION,
+                'comments_aggregated': self.comments_aggregated,
+                'updated': self.updated,
+                'keywords': keywords,
+                'cooccurrence': self.cooccurrence.to_dict(),
+                'trends': self.trends.to_dict()
+            }
+
+            tmp_path = self.aggregates_file.with_name(self.aggregates_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.aggregates_file)
+        except Exception as e:
+            print(f"Error saving keyword aggregates: {e}")
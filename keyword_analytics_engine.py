@@ -0,0 +1,215 @@
+import numpy as np
+from comment_record import CommentRecord, keyword_comment_preview
+from settings import ALL_KEYWORDS, KEYWORD_BITS, SENTIMENT_CODES
+
+SAMPLES_PER_VIDEO = 2
+SAMPLE_COMMENTS = 10
+LIKES_PERCENTILES = [50, 90, 99]
+
+
+class CommentTable:
+    # Keyword-bearing comments flattened once into typed columns (one row per comment, in
+    # channel/video order); comments without keywords cannot contribute and are skipped.
+    # group is the comments' source_channel (as in KeywordAggregates), keyword_mask uses KEYWORD_BITS.
+    def __init__(self, comments, group, video, likes, sentiment, keyword_mask, cluster,
+                 group_names, video_ids, sentiment_names):
+        self.comments = comments
+        self.group = group
+        self.video = video
+        self.likes = likes
+        self.sentiment = sentiment
+        self.keyword_mask = keyword_mask
+        self.cluster = cluster
+        self.group_names = group_names
+        self.video_ids = video_ids
+        self.video_group = np.zeros(len(video_ids), dtype=np.int32)
+        self.sentiment_names = sentiment_names
+
+    def __len__(self):
+        return len(self.comments)
+
+    @classmethod
+    def from_comments_data(cls, comments_data):
+        """Flatten channel_id -> video_id -> {video_info, comments} into columns."""
+        comments, group, video, likes, sentiment, masks, cluster = [], [], [], [], [], [], []
+        group_codes, video_ids, video_groups = {}, [], []
+        sentiment_codes = dict(SENTIMENT_CODES)
+        mask_cache = {}
+
+        for channel_id, channel_data in comments_data.items():
+            for video_id, video_data in channel_data.items():
+                video_comments = video_data.get('comments', [])
+                if not video_comments:
+                    continue
+
+                # A video's comments all come from one channel, the same source_channel the corpus aggregates use
+                first_comment = video_comments[0]
+                if type(first_comment) is CommentRecord:
+                    group_name = first_comment.channel
+                else:
+                    group_name = first_comment.get('source_channel', 'Unknown')
+                group_code = group_codes.setdefault(group_name, len(group_codes))
+                video_code = len(video_ids)
+                video_ids.append(video_id)
+                video_groups.append(group_code)
+
+                for comment in video_comments:
+                    if type(comment) is CommentRecord:
+                        keywords = comment.keywords  # hashable tuple of (keyword, variations)
+                        if not keywords:
+                            continue
+                        mask_key = keywords
+                        sentiment_name = comment.sentiment_category
+                        cluster_id = comment.extra.get('duplicate_cluster_id') if comment.extra else None
+                        comment_likes = comment.likes
+                    else:
+                        keywords = comment.get('detected_keywords')
+                        if not keywords:
+                            continue
+                        mask_key = tuple(keywords)
+                        sentiment_name = comment.get('sentiment_category', 'neutral')
+                        cluster_id = comment.get('duplicate_cluster_id')
+                        comment_likes = comment.get('likes', 0)
+
+                    mask = mask_cache.get(mask_key)
+                    if mask is None:
+                        mask = 0
+                        names = [name for name, _ in keywords] if type(comment) is CommentRecord else keywords
+                        for keyword in names:
+                            if keyword in KEYWORD_BITS:
+                                mask |= 1 << KEYWORD_BITS[keyword]
+                        mask_cache[mask_key] = mask
+
+                    comments.append(comment)
+                    masks.append(mask)
+                    likes.append(comment_likes)
+                    sentiment.append(sentiment_codes.setdefault(sentiment_name, len(sentiment_codes)))
+                    cluster.append(-1 if cluster_id is None else cluster_id)
+                    group.append(group_code)
+                    video.append(video_code)
+
+        table = cls(
+            comments,
+            np.array(group, dtype=np.int32),
+            np.array(video, dtype=np.int32),
+            np.array(likes, dtype=np.int64),
+            np.array(sentiment, dtype=np.int8),
+            np.array(masks, dtype=np.uint64),
+            np.array(cluster, dtype=np.int64),
+            list(group_codes),
+            video_ids,
+            list(sentiment_codes)
+        )
+        table.video_group = np.array(video_groups, dtype=np.int32)
+        return table
+
+    def keyword_rows(self, keyword):
+        """Boolean column: rows mentioning a keyword."""
+        return (self.keyword_mask & np.uint64(1 << KEYWORD_BITS[keyword])) != 0
+
+
+class KeywordAnalyticsEngine:
+    # Same report structure as CrossChannelKeywordAnalyzer.analyze_keyword_distribution, computed
+    # with bincount/unique/sort over a CommentTable instead of per-comment dict accumulation.
+    def __init__(self, collapse_near_duplicates=True):
+        self.target_keywords = [keyword for keyword in ALL_KEYWORDS if keyword in KEYWORD_BITS]
+        self.collapse_near_duplicates = collapse_near_duplicates
+
+    def _near_duplicate_rows(self, table, mentions):
+        """Rows repeating a near-duplicate cluster already counted for this keyword (first row counts)."""
+        duplicates = np.zeros(len(table), dtype=bool)
+        if not self.collapse_near_duplicates:
+            return duplicates
+
+        clustered = np.flatnonzero(mentions & (table.cluster >= 0))
+        if len(clustered):
+            _, first = np.unique(table.cluster[clustered], return_index=True)
+            duplicates[clustered] = True
+            duplicates[clustered[first]] = False
+        return duplicates
+
+    def _sample_rows(self, table, mention_rows):
+        """Top SAMPLES_PER_VIDEO rows by likes per video, then the SAMPLE_COMMENTS most liked of those.
+
+        Ties keep comment order, matching the stable sorts of the per-video segmentation.
+        """
+        if not len(mention_rows):
+            return mention_rows
+
+        order = mention_rows[np.lexsort((mention_rows, -table.likes[mention_rows], table.video[mention_rows]))]
+        videos = table.video[order]
+        positions = np.arange(len(order))
+        video_starts = np.maximum.accumulate(np.where(np.r_[True, videos[1:] != videos[:-1]], positions, 0))
+        candidates = order[positions - video_starts < SAMPLES_PER_VIDEO]
+
+        best = np.argsort(-table.likes[candidates], kind='stable')[:SAMPLE_COMMENTS]
+        return candidates[best]
+
+    def _sample_comment(self, table, row, keyword):
+        comment = table.comments[row]
+        if isinstance(comment, CommentRecord):
+            variations = [list(variations) for name, variations in comment.keywords if name == keyword][0]
+            channel_name = comment.channel
+        else:
+            variations = comment['detected_keywords'][keyword]
+            channel_name = comment.get('source_channel', 'Unknown')
+        return keyword_comment_preview(comment, variations, table.sentiment_names[table.sentiment[row]], channel_name)
+
+    def analyze_table(self, table):
+        """Keyword distribution over a CommentTable, plus likes percentiles of each keyword's mentions."""
+        group_count = len(table.group_names)
+        cross_channel_analysis = {}
+
+        for keyword in self.target_keywords:
+            mentions = table.keyword_rows(keyword)
+            duplicates = self._near_duplicate_rows(table, mentions)
+            counted = mentions & ~duplicates
+
+            counted_groups = table.group[counted]
+            counted_likes = table.likes[counted]
+            group_mentions = np.bincount(counted_groups, minlength=group_count)
+            group_likes = np.bincount(counted_groups, weights=counted_likes, minlength=group_count)
+
+            # A video counts towards videos_count if it mentions the keyword at all
+            mention_rows = np.flatnonzero(mentions)
+            mention_videos = np.unique(table.video[mention_rows])
+            group_videos = np.bincount(table.video_group[mention_videos], minlength=group_count)
+
+            # Channels listed in first-mention order, as the loop version inserts them
+            mention_groups, first_rows = np.unique(table.group[mention_rows], return_index=True)
+            channel_stats = {
+                table.group_names[group_code]: {
+                    'mentions': int(group_mentions[group_code]),
+                    'likes': int(group_likes[group_code]),
+                    'videos_count': int(group_videos[group_code])
+                }
+                for group_code in mention_groups[np.argsort(first_rows)]
+            }
+
+            sentiment_counts = np.bincount(table.sentiment[counted], minlength=len(table.sentiment_names))
+            cross_channel_analysis[keyword] = {
+                'total_mentions': int(counted.sum()),
+                'total_likes': int(counted_likes.sum()),
+                'channel_stats': channel_stats,
+                'top_channels': sorted(channel_stats.items(), key=lambda x: x[1]['mentions'], reverse=True),
+                'sentiment_breakdown': {
+                    table.sentiment_names[code]: int(count)
+                    for code, count in enumerate(sentiment_counts) if count > 0
+                },
+                'sample_comments': [
+                    self._sample_comment(table, row, keyword) for row in self._sample_rows(table, mention_rows)
+                ],
+                'near_duplicates_collapsed': int(duplicates.sum())
+            }
+
+            if len(counted_likes):
+                cross_channel_analysis[keyword]['likes_percentiles'] = dict(zip(
+                    [f"p{p}" for p in LIKES_PERCENTILES],
+                    np.percentile(counted_likes, LIKES_PERCENTILES).tolist()
+                ))
+
+        return cross_channel_analysis
+
+    def analyze_keyword_distribution(self, comments_data):
+        """Flatten once, then compute the cross-channel keyword distribution."""
+        return self.analyze_table(CommentTable.from_comments_data(comments_data))
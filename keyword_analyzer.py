@@ -1,88 +1,45 @@
-from collections import defaultdict, Counter
+from keyword_analytics_engine import KeywordAnalyticsEngine
+from keyword_cooccurrence import correlation_insights
 from settings import ALL_KEYWORDS, TARGET_KEYWORDS
 
 
 class CrossChannelKeywordAnalyzer:
-    def __init__(self):
+    def __init__(self, collapse_near_duplicates=True, aggregates=None):
         self.target_keywords = list(ALL_KEYWORDS.keys())
+        self.collapse_near_duplicates = collapse_near_duplicates
+        self.aggregates = aggregates  # KeywordAggregates for whole-corpus reports
+        self.engine = KeywordAnalyticsEngine(collapse_near_duplicates)
+
+    def update_corpus_aggregates(self, new_comments_only, channel_references=None, comments_data=None):
+        """Add a run's new comments to the persistent whole-corpus aggregates.
+
+        comments_data (every crawled comment) refreshes the like counts of the per-keyword top comments.
+        """
+        self.aggregates.add_new_comments(new_comments_only, channel_references, self.collapse_near_duplicates)
+        if comments_data is not None:
+            self.aggregates.refresh_top_comments(comments_data, channel_references, self.collapse_near_duplicates)
+        self.aggregates.save()
+
+    def corpus_keyword_distribution(self):
+        """Whole-corpus keyword distribution from the aggregates, without rescanning any comments."""
+        return self.aggregates.cross_channel_data(self.target_keywords)
 
     def analyze_keyword_distribution(self, comments_data):
         """Analyze keyword distribution across all channels."""
-        cross_channel_analysis = {}
-
-        # Initialize structure for each target keyword
-        for keyword in self.target_keywords:
-            cross_channel_analysis[keyword] = {
-                'total_mentions': 0,
-                'total_likes': 0,
-                'channel_stats': {},
-                'top_channels': [],
-                'sentiment_breakdown': defaultdict(int),
-                'sample_comments': []
-            }
-
-        # Process each channel's data
-        for channel_id, channel_data in comments_data.items():
-            for video_id, video_data in channel_data.items():
-                if video_data.get('keyword_segmentation'):
-                    channel_name = video_data['video_info'].get('title', 'Unknown')
-
-                    for keyword, keyword_data in video_data['keyword_segmentation'].items():
-                        if keyword in cross_channel_analysis:
-                            # Update cross-channel stats
-                            cross_channel_analysis[keyword]['total_mentions'] += keyword_data['total_mentions']
-                            cross_channel_analysis[keyword]['total_likes'] += keyword_data['total_likes']
-
-                            # Channel-specific stats
-                            if channel_name not in cross_channel_analysis[keyword]['channel_stats']:
-                                cross_channel_analysis[keyword]['channel_stats'][channel_name] = {
-                                    'mentions': 0,
-                                    'likes': 0,
-                                    'videos_count': 0
-                                }
-
-                            cross_channel_analysis[keyword]['channel_stats'][channel_name]['mentions'] += keyword_data[
-                                'total_mentions']
-                            cross_channel_analysis[keyword]['channel_stats'][channel_name]['likes'] += keyword_data[
-                                'total_likes']
-                            cross_channel_analysis[keyword]['channel_stats'][channel_name]['videos_count'] += 1
-
-                            # Sentiment breakdown
-                            for sentiment, count in keyword_data['sentiment_distribution'].items():
-                                cross_channel_analysis[keyword]['sentiment_breakdown'][sentiment] += count
-
-                            # Collect sample comments
-                            cross_channel_analysis[keyword]['sample_comments'].extend(
-                                keyword_data['top_comments'][:2]  # Top 2 comments per video
-                            )
-
-        # Post-process: rank channels and sort sample comments
-        for keyword, data in cross_channel_analysis.items():
-            # Rank channels by mentions
-            channel_rankings = sorted(
-                data['channel_stats'].items(),
-                key=lambda x: x[1]['mentions'],
-                reverse=True
-            )
-            data['top_channels'] = channel_rankings
-
-            # Sort sample comments by likes and limit
-            data['sample_comments'].sort(key=lambda x: x['likes'], reverse=True)
-            data['sample_comments'] = data['sample_comments'][:10]
-
-            # Convert sentiment breakdown to regular dict
-            data['sentiment_breakdown'] = dict(data['sentiment_breakdown'])
-
-        return cross_channel_analysis
-
-    def generate_keyword_insights(self, cross_channel_data):
-        """Generate insights from cross-channel keyword analysis."""
+        return self.engine.analyze_keyword_distribution(comments_data)
+
+    def generate_keyword_insights(self, cross_channel_data, cooccurrence=None, trends=None):
+        """Generate insights from cross-channel keyword analysis.
+
+        Correlations need a KeywordCooccurrence and week-over-week trends a KeywordTrends.
+        """
         insights = {
             'most_popular_keywords': [],
             'channel_specializations': {},
             'sentiment_patterns': {},
             'engagement_analysis': {},
-            'keyword_correlations': []
+            'keyword_correlations': [],
+            'keyword_trends': {}
         }
 
         # Most popular keywords
@@ -122,6 +79,16 @@ class CrossChannelKeywordAnalyzer:
                     'average_likes_per_mention': data['total_likes'] / data['total_mentions'],
                     'total_engagement': data['total_likes']
                 }
+                if 'likes_percentiles' in data:
+                    insights['engagement_analysis'][keyword]['likes_percentiles'] = data['likes_percentiles']
+
+        # Keyword pairs mentioned together more often than chance (lift > 1)
+        if cooccurrence is not None:
+            insights['keyword_correlations'] = correlation_insights(cooccurrence)
+
+        # Latest week against the week before, from the pre-aggregated buckets
+        if trends is not None:
+            insights['keyword_trends'] = trends.trend_insights(list(cross_channel_data))
 
         return insights
 
@@ -175,6 +142,12 @@ class CrossChannelKeywordAnalyzer:
                     recommendations.append(
                         f"{channel} dominates '{top_specialization['keyword']}' with {top_specialization['dominance_percentage']:.1f}% of mentions")
 
+        # Trend recommendations
+        for keyword, week in insights.get('keyword_trends', {}).items():
+            if week['mentions_change_pct'] is not None and week['mentions_change_pct'] >= 50:
+                recommendations.append(
+                    f"'{keyword}' mentions rose {week['mentions_change_pct']:.0f}% in the week of {week['bucket']}")
+
         # Sentiment recommendations
         for keyword, sentiment_data in insights['sentiment_patterns'].items():
             if sentiment_data['dominant_sentiment'] == 'negative':
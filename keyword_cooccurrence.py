@@ -0,0 +1,128 @@
+from collections import Counter
+import numpy as np
+from settings import KEYWORD_BITS
+
+
+def keyword_mask(keywords):
+    """Bitmask of the target keywords in an iterable of keyword names (KEYWORD_BITS positions)."""
+    mask = 0
+    for keyword in keywords:
+        bit = KEYWORD_BITS.get(keyword)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+class KeywordCooccurrence:
+    # Histograms of per-comment keyword bitmasks (mask -> comments), overall, per channel and per
+    # month. Every comment lands in exactly one mask bucket, so updates are O(1) per comment and
+    # the co-occurrence matrix is bits^T @ (bits * counts) over the distinct masks only.
+    def __init__(self):
+        self.keywords = sorted(KEYWORD_BITS, key=KEYWORD_BITS.get)
+        self.overall = Counter()
+        self.channels = {}
+        self.months = {}
+
+    def add(self, mask, channel_name=None, month=None, count=1):
+        """Count comments with a keyword mask (mask 0 = no keyword; still needed for lift/PMI)."""
+        self.overall[mask] += count
+        if channel_name is not None:
+            self.channels.setdefault(channel_name, Counter())[mask] += count
+        if month:
+            self.months.setdefault(month, Counter())[mask] += count
+
+    def _histogram(self, channel_name=None, month=None):
+        if channel_name is not None and month is not None:
+            raise ValueError("Slice by channel or by month, not both")
+        if channel_name is not None:
+            return self.channels.get(channel_name, Counter())
+        if month is not None:
+            return self.months.get(month, Counter())
+        return self.overall
+
+    def matrix(self, channel_name=None, month=None):
+        """Co-occurrence counts, lift and PMI (log2 lift) as keyword x keyword numpy arrays.
+
+        The diagonal of counts holds each keyword's mentions; lift/PMI are 0 where undefined.
+        """
+        histogram = self._histogram(channel_name, month)
+        keyword_count = len(self.keywords)
+        if not histogram:
+            zeros = np.zeros((keyword_count, keyword_count))
+            return {'keywords': self.keywords, 'total_comments': 0, 'counts': zeros.astype(np.int64),
+                    'lift': zeros, 'pmi': zeros}
+
+        masks = np.fromiter(histogram.keys(), dtype=np.uint64, count=len(histogram))
+        counts = np.fromiter(histogram.values(), dtype=np.int64, count=len(histogram))
+        # Keyword bits may have gaps (removed keywords keep theirs), so shift by each keyword's own bit
+        positions = np.array([KEYWORD_BITS[keyword] for keyword in self.keywords], dtype=np.uint64)
+        bits = ((masks[:, None] >> positions) & np.uint64(1)).astype(np.int64)
+
+        cooccurrence = bits.T @ (bits * counts[:, None])
+        total_comments = int(counts.sum())
+        mentions = np.diag(cooccurrence).astype(np.float64)
+
+        expected = np.outer(mentions, mentions)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lift = np.where((expected > 0) & (cooccurrence > 0), cooccurrence * total_comments / expected, 0.0)
+            pmi = np.where(lift > 0, np.log2(lift), 0.0)
+
+        return {'keywords': self.keywords, 'total_comments': total_comments,
+                'counts': cooccurrence, 'lift': lift, 'pmi': pmi}
+
+    def pairs(self, channel_name=None, month=None, min_count=1):
+        """Keyword pairs that appear in the same comment, most frequent first."""
+        matrix = self.matrix(channel_name, month)
+        first, second = np.triu_indices(len(self.keywords), k=1)
+        pair_counts = matrix['counts'][first, second]
+
+        pairs = [
+            {
+                'keywords': [self.keywords[a], self.keywords[b]],
+                'count': int(count),
+                'lift': float(matrix['lift'][a, b]),
+                'pmi': float(matrix['pmi'][a, b])
+            }
+            for a, b, count in zip(first, second, pair_counts) if count >= min_count
+        ]
+        return sorted(pairs, key=lambda pair: (pair['count'], pair['lift']), reverse=True)
+
+    def to_dict(self):
+        def encode(histogram):
+            return {str(mask): count for mask, count in histogram.items()}
+
+        return {
+            'keywords': self.keywords,
+            'keyword_bits': {keyword: KEYWORD_BITS[keyword] for keyword in self.keywords},
+            'overall': encode(self.overall),
+            'channels': {name: encode(histogram) for name, histogram in self.channels.items()},
+            'months': {month: encode(histogram) for month, histogram in self.months.items()}
+        }
+
+    @staticmethod
+    def layout_matches(data):
+        """Whether saved histograms use the current KEYWORD_BITS (files without keyword_bits used enumeration order)."""
+        if not data:
+            return True
+        saved_bits = data.get('keyword_bits') or {keyword: bit for bit, keyword in enumerate(data.get('keywords', []))}
+        return saved_bits == KEYWORD_BITS
+
+    @classmethod
+    def from_dict(cls, data):
+        def decode(histogram):
+            return Counter({int(mask): count for mask, count in histogram.items()})
+
+        if not cls.layout_matches(data):
+            raise ValueError("Co-occurrence histograms were saved with a different keyword bit layout")
+        cooccurrence = cls()
+        cooccurrence.overall = decode(data.get('overall', {}))
+        cooccurrence.channels = {name: decode(h) for name, h in data.get('channels', {}).items()}
+        cooccurrence.months = {month: decode(h) for month, h in data.get('months', {}).items()}
+        return cooccurrence
+
+
+def correlation_insights(cooccurrence, min_count=5, limit=10):
+    """Entries for insights['keyword_correlations']: frequent pairs with lift > 1, strongest first."""
+    pairs = [pair for pair in cooccurrence.pairs(min_count=min_count) if pair['lift'] > 1]
+    return sorted(pairs, key=lambda pair: pair['lift'], reverse=True)[:limit]
+
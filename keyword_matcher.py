@@ -0,0 +1,69 @@
+import re
+from settings import ALL_KEYWORDS, KEYWORD_WORD_BOUNDARIES
+
+
+class KeywordMatcher:
+    # All keyword variations compiled once into a single trie-shaped regex, so a comment is scanned
+    # in one left-to-right pass whatever the size of the dictionary. At each position the regex
+    # reports the longest variation starting there; shorter variations that are prefixes of it are
+    # known from the trie, so no match is lost. With word_boundaries, variations only match whole
+    # tokens ('pw' no longer matches inside 'upward', 'neet' inside 'neetprep').
+    def __init__(self, keywords=ALL_KEYWORDS, word_boundaries=KEYWORD_WORD_BOUNDARIES):
+        self.word_boundaries = word_boundaries
+        self._targets = {}  # lowercased variation -> [(keyword order, variation order, keyword, variation)]
+        for keyword_order, (keyword, variations) in enumerate(keywords.items()):
+            for variation_order, variation in enumerate(variations):
+                if variation:
+                    self._targets.setdefault(variation.lower(), []).append(
+                        (keyword_order, variation_order, keyword, variation))
+
+        trie = {}
+        for pattern in self._targets:
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[''] = pattern
+
+        self._prefixes = {}  # pattern -> shorter patterns matched whenever it matches
+        self._collect_prefixes(trie, [])
+        start = r'(?<!\w)' if word_boundaries else ''
+        self.pattern = re.compile(f"{start}(?=({self._trie_regex(trie)}))") if trie else None
+
+    def _collect_prefixes(self, node, prefixes):
+        if '' in node:
+            self._prefixes[node['']] = list(prefixes)
+        for char, child in node.items():
+            if char == '':
+                continue
+            # A shorter variation ending here is only a separate token if the next character is not a word character
+            if '' in node and (not self.word_boundaries or not re.match(r'\w', char)):
+                self._collect_prefixes(child, prefixes + [node['']])
+            else:
+                self._collect_prefixes(child, prefixes)
+
+    def _trie_regex(self, node):
+        alternatives = [re.escape(char) + self._trie_regex(child)
+                        for char, child in sorted(node.items()) if char != '']
+        # Longer variations are tried first, so the regex returns the longest match at each position
+        if '' in node:
+            alternatives.append(r'(?!\w)' if self.word_boundaries else '')
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:' + '|'.join(alternatives) + ')'
+
+    def match(self, text):
+        """Return {main_keyword: [variations]} in ALL_KEYWORDS order, like the substring scan did."""
+        if not text or self.pattern is None:
+            return {}
+
+        found = set()
+        for match in self.pattern.finditer(text.lower()):
+            pattern = match.group(1)
+            if pattern not in found:
+                found.add(pattern)
+                found.update(self._prefixes[pattern])
+
+        detected_keywords = {}
+        for _, _, keyword, variation in sorted(target for pattern in found for target in self._targets[pattern]):
+            detected_keywords.setdefault(keyword, []).append(variation)
+        return detected_keywords
@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+
+GRANULARITIES = ('day', 'week')
+
+
+def _empty_bucket():
+    return {'mentions': 0, 'likes': 0, 'sentiment': {}}
+
+
+class KeywordTrends:
+    # Daily and weekly keyword x channel buckets of mentions, likes and sentiment, keyed by the
+    # comment's publish date (weeks by their Monday). Comments are added to the bucket they were
+    # published in, so late-arriving old comments update history instead of the current week.
+    def __init__(self):
+        self.buckets = {granularity: {} for granularity in GRANULARITIES}  # granularity -> keyword -> channel -> bucket -> stats
+        self._week_starts = {}  # day -> Monday of its week
+
+    def _week_start(self, day):
+        week = self._week_starts.get(day)
+        if week is None:
+            parsed = date.fromisoformat(day)
+            week = (parsed - timedelta(days=parsed.weekday())).isoformat()
+            self._week_starts[day] = week
+        return week
+
+    def add(self, keyword, channel_name, publish_date, likes=0, sentiment='neutral'):
+        """Count one keyword mention in its day and week buckets (undated comments are skipped)."""
+        day = (publish_date or '')[:10]
+        try:
+            week = self._week_start(day)
+        except ValueError:
+            return
+
+        for granularity, bucket_key in (('day', day), ('week', week)):
+            channels = self.buckets[granularity].setdefault(keyword, {})
+            bucket = channels.setdefault(channel_name, {}).get(bucket_key)
+            if bucket is None:
+                bucket = channels[channel_name][bucket_key] = _empty_bucket()
+            bucket['mentions'] += 1
+            bucket['likes'] += likes
+            bucket['sentiment'][sentiment] = bucket['sentiment'].get(sentiment, 0) + 1
+
+    def _merged(self, keyword, channel_name, granularity):
+        """bucket -> stats for one channel, or summed over all channels when channel_name is None."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}' (expected one of {GRANULARITIES})")
+
+        channels = self.buckets[granularity].get(keyword, {})
+        if channel_name is not None:
+            return channels.get(channel_name, {})
+
+        merged = {}
+        for channel_buckets in channels.values():
+            for bucket_key, stats in channel_buckets.items():
+                total = merged.setdefault(bucket_key, _empty_bucket())
+                total['mentions'] += stats['mentions']
+                total['likes'] += stats['likes']
+                for sentiment, count in stats['sentiment'].items():
+                    total['sentiment'][sentiment] = total['sentiment'].get(sentiment, 0) + count
+        return merged
+
+    def series(self, keyword, channel_name=None, granularity='day', start=None, end=None):
+        """Time series [{bucket, mentions, likes, sentiment}, ...] in date order.
+
+        Buckets between the first and last one (or start/end, as ISO dates) with no mentions are
+        included as zeros so consecutive entries are consecutive days or weeks.
+        """
+        buckets = self._merged(keyword, channel_name, granularity)
+        if granularity == 'week':
+            start = self._week_start(start) if start else None
+            end = self._week_start(end) if end else None
+        start = start or min(buckets, default=None)
+        end = end or max(buckets, default=None)
+        if start is None or end is None:
+            return []
+
+        step = timedelta(days=7 if granularity == 'week' else 1)
+        current, last = date.fromisoformat(start), date.fromisoformat(end)
+        series = []
+        while current <= last:
+            bucket_key = current.isoformat()
+            stats = buckets.get(bucket_key) or _empty_bucket()
+            series.append({
+                'bucket': bucket_key,
+                'mentions': stats['mentions'],
+                'likes': stats['likes'],
+                'sentiment': dict(stats['sentiment'])
+            })
+            current += step
+        return series
+
+    def week_over_week(self, keyword, channel_name=None, start=None, end=None):
+        """Weekly series with mentions/likes deltas and percentage change against the previous week."""
+        weeks = self.series(keyword, channel_name, 'week', start, end)
+        previous = None
+        for week in weeks:
+            for field in ('mentions', 'likes'):
+                before = previous[field] if previous else 0
+                week[f'{field}_delta'] = week[field] - before
+                week[f'{field}_change_pct'] = ((week[field] - before) / before * 100) if before else None
+            previous = week
+        return weeks
+
+    def latest_week(self):
+        """Most recent week with any mention (None when empty)."""
+        return max((week for channels in self.buckets['week'].values()
+                    for channel_buckets in channels.values() for week in channel_buckets), default=None)
+
+    def trend_insights(self, keywords=None, week=None):
+        """keyword -> latest week-over-week entry, for insights['keyword_trends']."""
+        week = week or self.latest_week()
+        if week is None:
+            return {}
+
+        previous_week = (date.fromisoformat(self._week_start(week)) - timedelta(days=7)).isoformat()
+        trends = {}
+        for keyword in (keywords or list(self.buckets['week'])):
+            weeks = self.week_over_week(keyword, start=previous_week, end=week)
+            if weeks and (weeks[-1]['mentions'] or weeks[-1]['mentions_delta']):
+                trends[keyword] = weeks[-1]
+        return trends
+
+    def to_dict(self):
+        return self.buckets
+
+    @classmethod
+    def from_dict(cls, data):
+        trends = cls()
+        for granularity in GRANULARITIES:
+            trends.buckets[granularity] = data.get(granularity, {})
+        return trends
@@ -14,6 +14,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from comment_deduplicator import CommentDeduplicator
+from near_duplicate_detector import NearDuplicateDetector
 from auth import YouTubeAuthenticator
 from quota_manager import QuotaManager
 from channel_resolver import ChannelIDResolver
@@ -21,75 +22,70 @@ from video_fetcher import MultiChannelVideoFetcher
 from comment_processor import CommentThreadProcessor
 from data_saver import DataSaver
 from keyword_analyzer import CrossChannelKeywordAnalyzer
+from keyword_aggregates import KeywordAggregates
+from comment_warehouse import CommentWarehouse
+from comment_ordinals import CommentOrdinals
+from comment_search_index import CommentSearchIndex
+from comment_bitmaps import CommentBitmapIndex
+from comment_leaderboards import CommentLeaderboards
+from emerging_terms import EmergingTerms
+from sketch_analytics import SketchAnalytics
+from audience_overlap import AudienceOverlap
+from author_index import AuthorIndex
+from run_references import build_channel_references, reference_keyword_report
+from retag_archives import changed_keywords, keyword_config, load_tagged_config, save_tagged_config
 from settings import TARGET_CHANNELS, ALL_KEYWORDS, QUOTA_LIMIT_PER_DAY
 
 
-def create_complete_csv_database():
+def create_complete_csv_database(data_saver=None):
     """Create a single CSV file with all comments and YouTube tracking links."""
     from pathlib import Path
     import pandas as pd
-    import json
-    import gzip
     from datetime import datetime  # Add this import
 
     print("\n📊 Creating complete CSV database...")
 
     raw_data_dir = Path('/Users/sugamnema/Desktop/Python/PythonProject2/youtube/data/raw')
-
-    # Find all channel files
-    json_files = list(raw_data_dir.glob('comments_*.json'))
-    gz_files = list(raw_data_dir.glob('comments_*.json.gz'))
-    all_files = json_files + gz_files
+    data_saver = data_saver or DataSaver()
 
     all_comments = []
 
-    for file_path in all_files:
+    # Segmented archives and any remaining legacy channel files, streamed one comment at a time
+    for source_name, reader in data_saver.open_channel_readers():
         try:
-            # Load file
-            if file_path.suffix == '.gz':
-                with gzip.open(file_path, 'rt', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
             # Extract channel info
-            channel_info = data.get('channel_info', {})
-            channel_name = channel_info.get('channel_name', 'Unknown')
+            channel_name = reader.channel_info.get('channel_name', 'Unknown')
 
             # Process all videos and comments
-            videos = data.get('videos', {})
-            for video_id, video_data in videos.items():
-                video_info = video_data.get('video_info', {})
-                comments = video_data.get('comments', [])
-
-                for comment in comments:
-                    # Create enhanced comment record
-                    enhanced_comment = {
-                        'comment_id': comment.get('comment_id', ''),
-                        'video_id': comment.get('video_id', ''),
-                        'channel_name': channel_name,
-                        'video_title': video_info.get('title', 'Unknown'),
-                        'author': comment.get('author', 'Unknown'),
-                        'raw_text': comment.get('raw_text', ''),
-                        'likes': comment.get('likes', 0),
-                        'is_reply': comment.get('is_reply', False),
-                        'publish_date': comment.get('publish_date', ''),
-                        'sentiment_category': comment.get('sentiment_category', 'neutral'),
-                        'detected_keywords': str(comment.get('detected_keywords', {})),
-
-                        # YouTube tracking URLs
-                        'youtube_video_url': f'https://www.youtube.com/watch?v={comment.get("video_id", "")}',
-                        'youtube_comment_url': f'https://www.youtube.com/watch?v={comment.get("video_id", "")}&lc={comment.get("comment_id", "")}',
-
-                        # Metadata
-                        'source_file': file_path.name
-                    }
-                    all_comments.append(enhanced_comment)
+            for video_id, video_info, comment in reader.iter_comments():
+                # Create enhanced comment record
+                enhanced_comment = {
+                    'comment_id': comment.get('comment_id', ''),
+                    'video_id': comment.get('video_id', ''),
+                    'channel_name': channel_name,
+                    'video_title': video_info.get('title', 'Unknown'),
+                    'author': comment.get('author', 'Unknown'),
+                    'raw_text': comment.get('raw_text', ''),
+                    'likes': comment.get('likes', 0),
+                    'is_reply': comment.get('is_reply', False),
+                    'publish_date': comment.get('publish_date', ''),
+                    'sentiment_category': comment.get('sentiment_category', 'neutral'),
+                    'detected_keywords': str(comment.get('detected_keywords', {})),
+
+                    # YouTube tracking URLs
+                    'youtube_video_url': f'https://www.youtube.com/watch?v={comment.get("video_id", "")}',
+                    'youtube_comment_url': f'https://www.youtube.com/watch?v={comment.get("video_id", "")}&lc={comment.get("comment_id", "")}',
+
+                    # Metadata
+                    'source_file': source_name
+                }
+                all_comments.append(enhanced_comment)
 
         except Exception as e:
-            print(f"Error processing {file_path}: {e}")
+            print(f"Error processing {source_name}: {e}")
             continue
+        finally:
+            reader.close()
 
     # Create DataFrame and save CSV
     if all_comments:
@@ -158,6 +154,8 @@ def main():
         print("\n🔍 Initializing comment deduplication...")
         deduplicator = CommentDeduplicator()
         print(f"✔ Comment history loaded: {len(deduplicator.previous_comments):,} known comments")
+        near_duplicate_detector = NearDuplicateDetector()
+        print(f"✔ Near-duplicate index loaded: {len(near_duplicate_detector.cluster_sizes):,} clusters")
 
         # Resolve channels
         print("\n🔍 Resolving NEET channel IDs...")
@@ -173,7 +171,28 @@ def main():
         # Initialize processors
         video_fetcher = MultiChannelVideoFetcher(youtube_service, quota_manager)
         comment_processor = CommentThreadProcessor(youtube_service, quota_manager)
-        keyword_analyzer = CrossChannelKeywordAnalyzer()
+        # Archived tags keep the keyword settings they were collected with until re-tagged
+        tagged_config = load_tagged_config()
+        if tagged_config is None:
+            # Nothing recorded yet: this run's comments are tagged with the current settings
+            save_tagged_config(keyword_config())
+            stale_keywords = set()
+        else:
+            stale_keywords = changed_keywords(tagged_config)
+        if stale_keywords:
+            print(f"⚠️ Archive tags predate the current settings for {len(stale_keywords)} keyword(s) - "
+                  f"run `python retag_archives.py` to re-tag them")
+
+        # Whole-corpus keyword aggregates (rebuilt from the archives on the first run)
+        keyword_aggregates = KeywordAggregates(channel_readers=data_saver.open_channel_readers)
+        keyword_analyzer = CrossChannelKeywordAnalyzer(aggregates=keyword_aggregates)
+        comment_search_index = CommentSearchIndex(channel_readers=data_saver.open_channel_readers)
+        comment_bitmaps = CommentBitmapIndex(channel_readers=data_saver.open_channel_readers)
+        comment_leaderboards = CommentLeaderboards(channel_readers=data_saver.open_channel_readers)
+        emerging_terms = EmergingTerms(channel_readers=data_saver.open_channel_readers)
+        sketch_analytics = SketchAnalytics(channel_readers=data_saver.open_channel_readers)
+        audience_overlap = AudienceOverlap(channel_readers=data_saver.open_channel_readers)
+        author_index = AuthorIndex(channel_readers=data_saver.open_channel_readers)
 
         # Fetch videos
         print("\n📹 Fetching videos from NEET channels...")
@@ -194,6 +213,11 @@ def main():
         print("\n🔍 Filtering for new comments only...")
         new_comments_only, filtering_stats = deduplicator.filter_new_comments_only(comments_data)
 
+        # Tag copypasta / spam chains so keyword stats count each cluster once
+        print("\n🧬 Detecting near-duplicate comments...")
+        near_duplicate_detector.assign_clusters(comments_data)
+        near_duplicate_detector.save_index()
+
         # Save ONLY new comments using new logic
         print("\n💾 Saving new comments only...")
         try:
@@ -209,6 +233,16 @@ def main():
             except:
                 print("Failed to create emergency backup")
 
+        # Append new comments to the columnar analytics warehouse
+        try:
+            channel_names = {
+                channel_id: channel_data['channel_info'].get('title', 'Unknown')
+                for channel_id, channel_data in videos_data.items()
+            }
+            CommentWarehouse().write_run(new_comments_only, data_saver.timestamp, channel_names)
+        except Exception as warehouse_error:
+            print(f"❌ Error updating comment warehouse: {warehouse_error}")
+
         # Save updated comment history
         deduplicator.save_comment_history()
 
@@ -223,14 +257,57 @@ def main():
         print(f"  Efficiency: {collection_report['efficiency']:.1f}%")
         print(f"  History source: {collection_report['history_source']}")
 
-        # Perform cross-channel keyword analysis using ALL comments (for comprehensive analysis)
+        # Perform cross-channel keyword analysis using ALL comments of this crawl
         print("\n🔍 Performing cross-channel keyword analysis...")
         cross_channel_keyword_data = keyword_analyzer.analyze_keyword_distribution(comments_data)
-        keyword_insights = keyword_analyzer.generate_keyword_insights(cross_channel_keyword_data)
-        keyword_report = keyword_analyzer.create_keyword_report(cross_channel_keyword_data, keyword_insights)
+
+        # Comments and sample texts stay in the archives; outputs refer to them (see RunReferenceResolver)
+        channel_references = build_channel_references(data_saver, comments_data, new_comments_only, videos_data)
+
+        # Whole-corpus report: fold in only the new comments (every crawled comment refreshes the
+        # top-comment likes), then report from the aggregates
+        keyword_analyzer.update_corpus_aggregates(new_comments_only, channel_references, comments_data)
+
+        # Make this run's comments searchable (one new index segment) and filterable by facet; like counts
+        # of every re-fetched comment are refreshed first so min_likes filters see current values
+        CommentOrdinals.shared().refresh_likes(comments_data)
+        comment_search_index.add_new_comments(new_comments_only, channel_references)
+        comment_search_index.save()
+        comment_bitmaps.add_new_comments(new_comments_only, channel_references)
+        comment_bitmaps.save()
+
+        # Leaderboards see every crawled comment so re-fetched like counts move them too
+        comment_leaderboards.update_from_run(comments_data, channel_references)
+        comment_leaderboards.save()
+
+        # Terms rising outside the curated keyword list
+        emerging_terms.add_new_comments(new_comments_only)
+        emerging_terms.save()
+        emerging_terms_report = emerging_terms.report()
+        for suggestion in emerging_terms_report['suggested_keywords'][:5]:
+            print(f"🌱 Rising term '{suggestion['term']}' ({suggestion['recent_mentions']} recent comments, "
+                  f"{suggestion['lift']}x) - candidate for TARGET_KEYWORDS")
+
+        # Approximate dashboards (distinct commenters, mention counts, like percentiles) from sketches
+        sketch_analytics.add_new_comments(new_comments_only)
+        sketch_analytics.save()
+
+        # Commenter overlap between channels from MinHash signatures of author IDs
+        audience_overlap.add_new_comments(new_comments_only)
+        audience_overlap.save()
+
+        # Per-author activity across channels (most active commenters, posting-rate bot flags)
+        author_index.add_new_comments(new_comments_only, channel_references)
+        author_index.save()
+        corpus_keyword_data = keyword_analyzer.corpus_keyword_distribution()
+        keyword_insights = keyword_analyzer.generate_keyword_insights(
+            corpus_keyword_data, keyword_aggregates.cooccurrence, keyword_aggregates.trends)
+        keyword_report = keyword_analyzer.create_keyword_report(corpus_keyword_data, keyword_insights)
 
         # Save all processed data
         print("\n💾 Saving analysis results...")
+        referenced_report = reference_keyword_report(keyword_report, channel_references)
+        keyword_analysis_file = data_saver.save_analysis_data(referenced_report)
 
         # Enhanced structured data with new comments tracking
         processed_data = {
@@ -248,8 +325,17 @@ def main():
                 }
             },
             'channels': resolved_channels if resolved_channels else [],
-            'videos': videos_data if videos_data else {},
-            'comments': comments_data if comments_data else {},
+            'videos': {
+                'file': videos_file.name if videos_file else None,
+                'videos_by_channel': {
+                    channel_id: len(channel_data.get('videos', []))
+                    for channel_id, channel_data in (videos_data or {}).items()
+                }
+            },
+            'comments': channel_references,
+            'approximate_dashboard': sketch_analytics.dashboard(),
+            'audience_overlap': audience_overlap.top_channel_overlaps(),
+            'authors': author_index.report(),
             'new_comments_summary': {
                 'new_comments_by_channel': {
                     channel_id: sum(len(video_data.get('comments', [])) for video_data in channel_data.values())
@@ -258,17 +344,20 @@ def main():
                 'filtering_stats': filtering_stats if filtering_stats else {}
             },
             'keyword_analysis': {
-                'cross_channel_data': cross_channel_keyword_data,
+                'cross_channel_data': referenced_report['detailed_analysis'],
+                'run_cross_channel_data': reference_keyword_report(
+                    {'detailed_analysis': cross_channel_keyword_data}, channel_references
+                )['detailed_analysis'],
                 'insights': keyword_insights,
-                'full_report': keyword_report
+                'emerging_terms': emerging_terms_report,
+                'full_report': keyword_analysis_file.name
             }
         }
 
         # Save files
         processed_file = data_saver.save_processed_data(processed_data)
-        keyword_analysis_file = data_saver.save_analysis_data(keyword_report)
         if comments_files:
-            csv_database = create_complete_csv_database()
+            csv_database = create_complete_csv_database(data_saver)
             if csv_database:
                 print(f"📊 Complete CSV database: {csv_database}")
 
@@ -303,6 +392,15 @@ def main():
         if quota_manager:
             print(f"📊 Quota used: {quota_manager.quota_used}/{QUOTA_LIMIT_PER_DAY}")
 
+        # Archive reads are done (indexes, references, CSV), so segments can now be compacted; let it
+        # finish before the catalog records segment sizes
+        data_saver.compact_saved_channels()
+        data_saver.segment_archive.wait_for_compaction()
+
+        # Persist archive sizes/mtimes/hashes and report how much was decoded this run
+        data_saver.catalog.save()
+        data_saver.catalog.print_summary()
+
         # New comments summary
         if new_comments_only:
             new_comments_count = sum(
@@ -326,6 +424,11 @@ def main():
         # Try to save partial data - now all variables are safely accessible
         save_partial_data(data_saver, new_comments_only if new_comments_only else comments_data, "error_recovery")
 
+    finally:
+        # Never exit while a compaction thread is still rewriting segments and the manifest
+        if data_saver is not None:
+            data_saver.segment_archive.wait_for_compaction()
+
 
 def save_partial_data(data_saver, comments_data, backup_type):
     """Safely save partial data if available."""
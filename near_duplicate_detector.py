@@ -0,0 +1,288 @@
+import json
+import os
+import random
+import re
+import zlib
+from array import array
+from settings import (
+    NEAR_DUPLICATE_INDEX_FILE,
+    NEAR_DUPLICATE_SIGNATURES_FILE,
+    NEAR_DUPLICATE_ASSIGNMENTS_FILE,
+    NEAR_DUPLICATE_SHINGLE_SIZE,
+    NEAR_DUPLICATE_NUM_PERM,
+    NEAR_DUPLICATE_BANDS,
+    NEAR_DUPLICATE_THRESHOLD,
+    NEAR_DUPLICATE_MIN_CHARS
+)
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+class MinHasher:
+    def __init__(self, num_perm=NEAR_DUPLICATE_NUM_PERM, seed=1):
+        # Fixed seed so signatures stay comparable across runs
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randint(1, MERSENNE_PRIME - 1), rng.randint(0, MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, tokens):
+        """Compute a MinHash signature (list of 32-bit ints) for a set of string tokens."""
+        hashes = {zlib.crc32(token.encode('utf-8')) for token in tokens}
+        if not hashes:
+            return None
+
+        return [
+            min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        ]
+
+    @staticmethod
+    def estimate_similarity(signature_a, signature_b):
+        """Estimate Jaccard similarity from two MinHash signatures."""
+        matches = sum(1 for x, y in zip(signature_a, signature_b) if x == y)
+        return matches / len(signature_a) if signature_a else 0.0
+
+
+class NearDuplicateDetector:
+    def __init__(self, index_file=NEAR_DUPLICATE_INDEX_FILE, signatures_file=NEAR_DUPLICATE_SIGNATURES_FILE,
+                 assignments_file=NEAR_DUPLICATE_ASSIGNMENTS_FILE):
+        self.index_file = index_file
+        self.signatures_file = signatures_file
+        self.assignments_file = assignments_file
+        self.minhasher = MinHasher()
+        self.rows_per_band = NEAR_DUPLICATE_NUM_PERM // NEAR_DUPLICATE_BANDS
+        self.normalize_pattern = re.compile(r'[\W_]+')
+
+        self._reset_state()
+        self.load_index()
+
+    def load_index(self):
+        """Load cluster assignments and LSH buckets from previous runs."""
+        try:
+            if not self.index_file.exists():
+                return
+
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            params = data.get('params', {})
+            if params != self._index_params():
+                print("⚠️ Near-duplicate settings changed - starting a fresh index")
+                return
+
+            cluster_count = len(data.get('cluster_sizes', []))
+            signatures = array('I')
+            if cluster_count:
+                with open(self.signatures_file, 'rb') as f:
+                    signatures.fromfile(f, cluster_count * NEAR_DUPLICATE_NUM_PERM)
+
+            assignments_bytes = data.get('assignments_bytes', 0)
+            comment_clusters = {}
+            if assignments_bytes:
+                with open(self.assignments_file, 'rb') as f:
+                    for line in f.read(assignments_bytes).decode('utf-8').splitlines():
+                        comment_id, cluster_id = line.split('\t')
+                        comment_clusters[comment_id] = int(cluster_id)
+            # Older indexes kept the assignments inline; they move to the append-only file on the next save
+            pending_assignments = list(data.get('comment_clusters', {}).items())
+            comment_clusters.update(pending_assignments)
+
+            self.comment_clusters = comment_clusters
+            self.cluster_sizes = data['cluster_sizes']
+            self.cluster_representatives = data['cluster_representatives']
+            self.band_buckets = [
+                {int(band_hash): cluster_id for band_hash, cluster_id in buckets.items()}
+                for buckets in data['band_buckets']
+            ]
+            self.signatures = signatures
+            self.saved_cluster_count = cluster_count
+            self.assignments_bytes = assignments_bytes
+            self._pending_assignments = pending_assignments
+
+        except Exception as e:
+            print(f"Error loading near-duplicate index: {e}")
+            self._reset_state()
+
+    def _reset_state(self):
+        self.comment_clusters = {}  # comment_id -> cluster_id
+        self.cluster_sizes = []  # cluster_id -> number of member comments
+        self.cluster_representatives = []  # cluster_id -> first comment_id seen
+        self.band_buckets = [{} for _ in range(NEAR_DUPLICATE_BANDS)]  # band hash -> cluster_id
+        self.signatures = array('I')  # Flat representative signatures, NUM_PERM per cluster
+        self.saved_cluster_count = 0
+        self.assignments_bytes = 0  # Committed length of the assignments file
+        self._pending_assignments = []  # (comment_id, cluster_id) not yet appended
+
+    def save_index(self):
+        """Persist new signatures and cluster assignments (both append-only), then the cluster index."""
+        try:
+            # Drop signatures and assignments written by an interrupted save so appends stay aligned
+            expected_bytes = self.saved_cluster_count * NEAR_DUPLICATE_NUM_PERM * self.signatures.itemsize
+            for path, size in ((self.signatures_file, expected_bytes), (self.assignments_file, self.assignments_bytes)):
+                if path.exists() and path.stat().st_size > size:
+                    os.truncate(path, size)
+
+            # Signatures and assignments first: the index only ever references bytes already on disk
+            mode = 'ab' if self.saved_cluster_count else 'wb'
+            start = self.saved_cluster_count * NEAR_DUPLICATE_NUM_PERM
+            with open(self.signatures_file, mode) as f:
+                self.signatures[start:].tofile(f)
+
+            new_assignments = ''.join(f"{comment_id}\t{cluster_id}\n"
+                                      for comment_id, cluster_id in self._pending_assignments).encode('utf-8')
+            with open(self.assignments_file, 'ab' if self.assignments_bytes else 'wb') as f:
+                f.write(new_assignments)
+
+            data = {
+                'params': self._index_params(),
+                'assignments_bytes': self.assignments_bytes + len(new_assignments),
+                'cluster_sizes': self.cluster_sizes,
+                'cluster_representatives': self.cluster_representatives,
+                'band_buckets': self.band_buckets
+            }
+            tmp_path = self.index_file.with_name(self.index_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+
+            self.saved_cluster_count = len(self.cluster_sizes)
+            self.assignments_bytes = data['assignments_bytes']
+            self._pending_assignments = []
+            print(f"✓ Near-duplicate index saved: {len(self.comment_clusters):,} comments in "
+                  f"{len(self.cluster_sizes):,} clusters")
+        except Exception as e:
+            print(f"Error saving near-duplicate index: {e}")
+
+    def _index_params(self):
+        return {
+            'shingle_size': NEAR_DUPLICATE_SHINGLE_SIZE,
+            'num_perm': NEAR_DUPLICATE_NUM_PERM,
+            'bands': NEAR_DUPLICATE_BANDS,
+            'min_chars': NEAR_DUPLICATE_MIN_CHARS
+        }
+
+    def normalize_text(self, text):
+        """Normalize text so trivial punctuation/case edits do not hide copypasta."""
+        return self.normalize_pattern.sub(' ', (text or '').lower()).strip()
+
+    def shingle(self, normalized_text):
+        """Split normalized text into overlapping character shingles."""
+        k = NEAR_DUPLICATE_SHINGLE_SIZE
+        if len(normalized_text) <= k:
+            return {normalized_text}
+        return {normalized_text[i:i + k] for i in range(len(normalized_text) - k + 1)}
+
+    def _band_hashes(self, signature):
+        """Hash each LSH band of a signature into a bucket key."""
+        rows = self.rows_per_band
+        return [
+            zlib.crc32(array('I', signature[band * rows:(band + 1) * rows]).tobytes())
+            for band in range(NEAR_DUPLICATE_BANDS)
+        ]
+
+    def _cluster_signature(self, cluster_id):
+        start = cluster_id * NEAR_DUPLICATE_NUM_PERM
+        return self.signatures[start:start + NEAR_DUPLICATE_NUM_PERM]
+
+    def find_or_create_cluster(self, comment_id, text):
+        """Return the cluster ID for a comment, creating a new cluster if nothing similar exists."""
+        if comment_id in self.comment_clusters:
+            return self.comment_clusters[comment_id], False
+
+        normalized_text = self.normalize_text(text)
+        if len(normalized_text) < NEAR_DUPLICATE_MIN_CHARS:
+            return None, False
+
+        signature = self.minhasher.signature(self.shingle(normalized_text))
+        band_hashes = self._band_hashes(signature)
+
+        # Only clusters sharing at least one LSH band are compared - no pairwise scan
+        best_cluster, best_similarity = None, 0.0
+        checked = set()
+        for band, band_hash in enumerate(band_hashes):
+            candidate = self.band_buckets[band].get(band_hash)
+            if candidate is None or candidate in checked:
+                continue
+            checked.add(candidate)
+
+            similarity = MinHasher.estimate_similarity(signature, self._cluster_signature(candidate))
+            if similarity > best_similarity:
+                best_cluster, best_similarity = candidate, similarity
+
+        is_near_duplicate = best_cluster is not None and best_similarity >= NEAR_DUPLICATE_THRESHOLD
+        if is_near_duplicate:
+            cluster_id = best_cluster
+        else:
+            cluster_id = len(self.cluster_sizes)
+            self.cluster_sizes.append(0)
+            self.cluster_representatives.append(comment_id)
+            self.signatures.extend(signature)
+            for band, band_hash in enumerate(band_hashes):
+                self.band_buckets[band].setdefault(band_hash, cluster_id)
+
+        self.cluster_sizes[cluster_id] += 1
+        self.comment_clusters[comment_id] = cluster_id
+        self._pending_assignments.append((comment_id, cluster_id))
+        return cluster_id, is_near_duplicate
+
+    def assign_clusters(self, comments_data):
+        """Tag every comment in channel -> video -> comments data with its duplicate_cluster_id."""
+        stats = {
+            'comments_clustered': 0,
+            'near_duplicates': 0,
+            'too_short': 0
+        }
+        clusters_before = len(self.cluster_sizes)
+
+        for channel_id, channel_data in comments_data.items():
+            for video_id, video_data in channel_data.items():
+                for comment in video_data.get('comments', []):
+                    comment_id = comment.get('comment_id')
+                    if not comment_id:
+                        continue
+
+                    cluster_id, is_near_duplicate = self.find_or_create_cluster(
+                        comment_id, comment.get('cleaned_text', '')
+                    )
+                    if cluster_id is None:
+                        stats['too_short'] += 1
+                        continue
+
+                    comment['duplicate_cluster_id'] = cluster_id
+                    stats['comments_clustered'] += 1
+                    if is_near_duplicate:
+                        stats['near_duplicates'] += 1
+
+        stats['new_clusters'] = len(self.cluster_sizes) - clusters_before
+
+        print("🧬 Near-duplicate clustering:")
+        print(f"   Comments clustered: {stats['comments_clustered']:,}")
+        print(f"   New near-duplicates: {stats['near_duplicates']:,}")
+        print(f"   New clusters: {stats['new_clusters']:,}")
+        print(f"   Too short to cluster: {stats['too_short']:,}")
+
+        return stats
+
+    def get_cluster_id(self, comment_id):
+        """Look up the cluster a comment was assigned to."""
+        return self.comment_clusters.get(comment_id)
+
+    def get_top_clusters(self, limit=20):
+        """Return the largest clusters (likely spam chains / copypasta)."""
+        ranked = sorted(
+            (cluster_id for cluster_id, size in enumerate(self.cluster_sizes) if size > 1),
+            key=lambda cluster_id: self.cluster_sizes[cluster_id],
+            reverse=True
+        )
+        return [
+            {
+                'cluster_id': cluster_id,
+                'size': self.cluster_sizes[cluster_id],
+                'representative_comment_id': self.cluster_representatives[cluster_id]
+            }
+            for cluster_id in ranked[:limit]
+        ]
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+from comment_bitmaps import CommentBitmapIndex
+from comment_leaderboards import CommentLeaderboards
+from compression_codecs import codec_for_path
+from data_saver import DataSaver
+from keyword_aggregates import KeywordAggregates
+from keyword_cooccurrence import keyword_mask
+from keyword_matcher import KeywordMatcher
+from rolling_channel_files import RollingChannelFiles
+from segmented_archive import SegmentedChannelArchive
+from sketch_analytics import SketchAnalytics
+from streaming_json import StreamingJSONWriter
+from text_cleaner import TextCleaner
+from settings import (
+    ALL_KEYWORDS,
+    KEYWORD_BITS,
+    KEYWORD_WORD_BOUNDARIES,
+    KEYWORD_CONFIG_FILE,
+    BITMAP_INDEX_FILE,
+    KEYWORD_AGGREGATES_FILE,
+    LEADERBOARD_FILE,
+    SKETCH_ANALYTICS_FILE,
+    RETAG_WORKERS,
+    WAREHOUSE_DIR,
+    WAREHOUSE_COMPRESSION
+)
+
+
+def keyword_config():
+    """Current keyword settings: matching mode, keyword_mask bits and a hash of each keyword's variations."""
+    return {
+        'word_boundaries': KEYWORD_WORD_BOUNDARIES,
+        'bits': dict(KEYWORD_BITS),
+        'keywords': {
+            keyword: hashlib.blake2b(json.dumps(variations).encode('utf-8'), digest_size=8).hexdigest()
+            for keyword, variations in ALL_KEYWORDS.items()
+        }
+    }
+
+
+def load_tagged_config():
+    """Keyword settings the archives were last tagged with (None if never recorded)."""
+    try:
+        if KEYWORD_CONFIG_FILE.exists():
+            with open(KEYWORD_CONFIG_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading keyword config: {e}")
+    return None
+
+
+def save_tagged_config(config):
+    tmp_path = KEYWORD_CONFIG_FILE.with_name(KEYWORD_CONFIG_FILE.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, KEYWORD_CONFIG_FILE)
+
+
+def changed_keywords(previous, current=None):
+    """Keywords added, removed or with different variations.
+
+    All of them if nothing was recorded, the matching mode changed, or a keyword's bit moved (stored
+    keyword_mask values can then only be recomputed from the text, not patched bit by bit).
+    """
+    current = current or keyword_config()
+    previous_bits = (previous or {}).get('bits')
+    if (previous is None or previous.get('word_boundaries') != current['word_boundaries'] or previous_bits is None
+            or any(previous_bits.get(keyword, bit) != bit for keyword, bit in current['bits'].items())):
+        return set(current['keywords']) | set((previous or {}).get('keywords', {}))
+
+    keywords = set(previous.get('keywords', {})) | set(current['keywords'])
+    return {keyword for keyword in keywords
+            if previous['keywords'].get(keyword) != current['keywords'].get(keyword)}
+
+
+class CommentRetagger:
+    # Re-evaluates only the changed keywords against the stored cleaned_text; tags of unchanged
+    # keywords (and their variations) are kept as they are.
+    def __init__(self, changed):
+        self.changed = set(changed)
+        self.matcher = KeywordMatcher({keyword: variations for keyword, variations in ALL_KEYWORDS.items()
+                                       if keyword in self.changed})
+        self.keyword_order = {keyword: position for position, keyword in enumerate(ALL_KEYWORDS)}
+        self.text_cleaner = TextCleaner()
+
+    def detect(self, cleaned_text, detected_keywords):
+        keywords = {keyword: variations for keyword, variations in (detected_keywords or {}).items()
+                    if keyword not in self.changed and keyword in self.keyword_order}
+        keywords.update(self.matcher.match(cleaned_text))
+        return dict(sorted(keywords.items(), key=lambda item: self.keyword_order[item[0]]))
+
+    def retag(self, comment):
+        """Update a comment's detected_keywords/sentiment_category in place; True if they changed."""
+        detected_keywords = self.detect(comment.get('cleaned_text', ''), comment.get('detected_keywords'))
+        sentiment_category = self.text_cleaner.categorize_comment_sentiment(detected_keywords)
+        if (detected_keywords == comment.get('detected_keywords')
+                and sentiment_category == comment.get('sentiment_category')):
+            return False
+
+        comment['detected_keywords'] = detected_keywords
+        comment['sentiment_category'] = sentiment_category
+        return True
+
+    def retag_mask(self, mask, cleaned_text):
+        """(keyword_mask, sentiment_code) of a warehouse row after re-evaluating the changed keywords.
+
+        The mask is re-encoded from its current keywords, so bits of removed keywords are dropped.
+        """
+        keywords = {keyword: [] for keyword in self.text_cleaner.keywords_from_bitmask(mask)
+                    if keyword not in self.changed}
+        keywords.update(self.matcher.match(cleaned_text))
+        return (keyword_mask(keywords),
+                self.text_cleaner.sentiment_code(self.text_cleaner.categorize_comment_sentiment(keywords)))
+
+
+# One retagger and one pair of archive stores per worker process, reused across the files it is handed
+_worker_retagger = {}
+_worker_stores = {}
+
+
+def _retagger(changed):
+    key = tuple(sorted(changed))
+    if key not in _worker_retagger:
+        _worker_retagger.clear()
+        _worker_retagger[key] = CommentRetagger(changed)
+    return _worker_retagger[key]
+
+
+def _store(kind):
+    if kind not in _worker_stores:
+        _worker_stores[kind] = SegmentedChannelArchive() if kind == 'segment' else RollingChannelFiles()
+    return _worker_stores[kind]
+
+
+def retag_segment(path, changed):
+    """Re-tag one JSON Lines segment; rewritten only if a comment changed."""
+    path = Path(path)
+    retagger = _retagger(changed)
+    codec = codec_for_path(path)
+    records = [json.loads(line) for line in codec.decompress(path.read_bytes()).splitlines() if line.strip()]
+
+    retagged = sum(retagger.retag(record['comment']) for record in records if record['type'] == 'comment')
+    result = {'kind': 'segment', 'path': str(path), 'retagged': retagged,
+              'comments': sum(record['type'] == 'comment' for record in records)}
+    if retagged:
+        result.update(_store('segment').rewrite_segment(path, records))
+    return result
+
+
+def retag_part(path, changed):
+    """Re-tag one part of a parted channel file; rewritten only if a comment changed."""
+    path = Path(path)
+    retagger = _retagger(changed)
+    codec = codec_for_path(path)
+    videos = json.loads(codec.decompress(path.read_bytes()))['videos']
+
+    comments = [comment for video_data in videos.values() for comment in video_data.get('comments', [])]
+    retagged = sum(retagger.retag(comment) for comment in comments)
+    result = {'kind': 'part', 'path': str(path), 'retagged': retagged, 'comments': len(comments)}
+    if retagged:
+        result.update(_store('part').rewrite_part(path, videos))
+    return result
+
+
+def retag_monolith(path, changed):
+    """Re-tag one legacy monolithic channel file; rewritten only if a comment changed."""
+    path = Path(path)
+    retagger = _retagger(changed)
+    codec = codec_for_path(path)
+    data = json.loads(codec.decompress(path.read_bytes()))
+
+    comments = [comment for video_data in data.get('videos', data).values()
+                for comment in video_data.get('comments', [])]
+    retagged = sum(retagger.retag(comment) for comment in comments)
+    if retagged:
+        # Same file, same codec: compress from the first byte when the file was compressed
+        StreamingJSONWriter(codec=codec).write(path, data, compress_over_mb=0 if codec.extension else None)
+    return {'kind': 'monolith', 'path': str(path), 'retagged': retagged, 'comments': len(comments)}
+
+
+def retag_warehouse_file(path, changed):
+    """Recompute keyword_mask/sentiment_code of one warehouse Parquet file from its cleaned_text."""
+    path = Path(path)
+    retagger = _retagger(changed)
+    table = pq.read_table(path)
+
+    masks = table.column('keyword_mask').to_pylist()
+    codes = table.column('sentiment_code').to_pylist()
+    retagged_columns = [retagger.retag_mask(mask or 0, text or '')
+                        for mask, text in zip(masks, table.column('cleaned_text').to_pylist())]
+    new_masks = [mask for mask, _ in retagged_columns]
+    new_codes = [code for _, code in retagged_columns]
+    retagged = sum(1 for old, new, old_code, new_code in zip(masks, new_masks, codes, new_codes)
+                   if old != new or old_code != new_code)
+
+    if retagged:
+        table = table.set_column(table.schema.get_field_index('keyword_mask'), 'keyword_mask',
+                                 pa.array(new_masks, pa.uint64()))
+        table = table.set_column(table.schema.get_field_index('sentiment_code'), 'sentiment_code',
+                                 pa.array(new_codes, pa.int8()))
+        tmp_path = path.with_name(path.name + '.tmp')
+        pq.write_table(table, tmp_path, compression=WAREHOUSE_COMPRESSION)
+        os.replace(tmp_path, path)
+    return {'kind': 'warehouse', 'path': str(path), 'retagged': retagged, 'comments': table.num_rows}
+
+
+RETAG_FUNCTIONS = {
+    'segment': retag_segment,
+    'part': retag_part,
+    'monolith': retag_monolith,
+    'warehouse': retag_warehouse_file
+}
+
+
+def _run_task(kind, path, changed):
+    try:
+        return RETAG_FUNCTIONS[kind](path, changed)
+    except Exception as e:
+        return {'kind': kind, 'path': str(path), 'retagged': 0, 'comments': 0, 'error': str(e)}
+
+
+def list_retag_tasks(data_saver):
+    """(kind, path) for every archive file: segments, parts, legacy monoliths and warehouse files."""
+    tasks = []
+    segment_archive = data_saver.segment_archive
+    for safe_channel_name in segment_archive.list_channels():
+        manifest = segment_archive.load_manifest(safe_channel_name)
+        for segment in manifest['segments']:
+            tasks.append(('segment', segment_archive.channel_dir(safe_channel_name) / segment['file']))
+
+    for file_path in data_saver.list_legacy_channel_files():
+        if data_saver.rolling_files.is_index_file(file_path):
+            tasks.extend(('part', part_path) for part_path in data_saver.rolling_files.part_files(file_path))
+        else:
+            tasks.append(('monolith', file_path))
+
+    tasks.extend(('warehouse', path) for path in sorted(WAREHOUSE_DIR.glob('channel_id=*/month=*/*.parquet')))
+    return tasks
+
+
+def _update_indexes(data_saver, results):
+    """Point manifests and part indexes at the rewritten files' new frames and offsets."""
+    rewritten = {result['path']: result for result in results if result['retagged']}
+    segment_archive = data_saver.segment_archive
+
+    for safe_channel_name in segment_archive.list_channels():
+        channel_dir = segment_archive.channel_dir(safe_channel_name)
+        segment_archive.update_segments(safe_channel_name, {
+            Path(path).name: result for path, result in rewritten.items()
+            if result['kind'] == 'segment' and Path(path).parent == channel_dir
+        })
+
+    rolling_files = data_saver.rolling_files
+    for file_path in data_saver.list_legacy_channel_files():
+        if rolling_files.is_index_file(file_path):
+            rolling_files.update_parts(file_path, {
+                Path(path).name: result for path, result in rewritten.items()
+                if result['kind'] == 'part' and Path(path).parent == rolling_files.raw_data_dir
+            })
+
+    for path in rewritten:
+        if rewritten[path]['kind'] != 'warehouse':
+            data_saver.catalog.record_write(Path(path))
+    data_saver.catalog.save()
+
+
+def retag_archives(force_all=False, workers=RETAG_WORKERS):
+    """Re-apply changed keyword settings to every archived comment, then rebuild the keyword aggregates.
+
+    Run it between crawls: archive files are rewritten in place.
+    """
+    current = keyword_config()
+    changed = set(current['keywords']) if force_all else changed_keywords(load_tagged_config(), current)
+    if not changed:
+        print("✅ Archive keyword tags already match settings.py - nothing to re-tag")
+        return []
+
+    data_saver = DataSaver()
+    tasks = list_retag_tasks(data_saver)
+    changed = sorted(changed)
+    print(f"🏷️ Re-tagging {len(tasks):,} archive file(s) for {len(changed)} changed keyword(s): {', '.join(changed)}")
+
+    start = time.perf_counter()
+    workers = max(1, min(workers, len(tasks)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_task, kind, str(path), changed) for kind, path in tasks]
+            results = [future.result() for future in futures]
+    else:
+        results = [_run_task(kind, str(path), changed) for kind, path in tasks]
+
+    errors = [result for result in results if 'error' in result]
+    for result in errors:
+        print(f"❌ Error re-tagging {result['path']}: {result['error']}")
+
+    _update_indexes(data_saver, results)
+    retagged = sum(result['retagged'] for result in results)
+    scanned = sum(result['comments'] for result in results)
+    files_rewritten = sum(1 for result in results if result['retagged'])
+    print(f"🏷️ Re-tagged {retagged:,} of {scanned:,} comments, rewrote {files_rewritten:,} file(s) "
+          f"in {time.perf_counter() - start:.1f}s with {workers} worker(s)")
+
+    if errors:
+        print("⚠️ Keyword config not updated - fix the errors above and re-run")
+        return results
+
+    # Aggregates, keyword bitmaps, keyword leaderboards and keyword sketches are derived from the tags;
+    # rebuild them from the re-tagged archives. This is deliberately a full rebuild: co-occurrence
+    # histograms and sentiment counts mix changed and unchanged keywords, and refreshing only the
+    # changed keywords' entries would still take one pass over every archived comment
+    if retagged:
+        KEYWORD_AGGREGATES_FILE.unlink(missing_ok=True)
+        KeywordAggregates(channel_readers=data_saver.open_channel_readers)
+        BITMAP_INDEX_FILE.unlink(missing_ok=True)
+        CommentBitmapIndex(channel_readers=data_saver.open_channel_readers)
+        LEADERBOARD_FILE.unlink(missing_ok=True)
+        CommentLeaderboards(channel_readers=data_saver.open_channel_readers)
+        SKETCH_ANALYTICS_FILE.unlink(missing_ok=True)
+        SketchAnalytics(channel_readers=data_saver.open_channel_readers)
+
+    save_tagged_config(current)
+    return results
+
+
+if __name__ == "__main__":
+    # Optional argument 'all': re-evaluate every keyword, not just the changed ones
+    retag_archives(force_all=len(sys.argv) > 1 and sys.argv[1] == 'all')
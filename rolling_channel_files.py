@@ -0,0 +1,269 @@
+import json
+import os
+import re
+from archive_catalog import ArchiveCatalog
+from comment_record import json_default
+from compression_codecs import CompressionCodec, codec_for_path, get_codec, iter_blocks
+from video_metadata_store import VideoMetadataStore
+from settings import (
+    RAW_DATA_DIR,
+    MAX_FILE_SIZE_MB,
+    COMPRESS_LARGE_FILES,
+    CHANNEL_FILE_CODEC,
+    CHANNEL_FILE_CODEC_LEVEL
+)
+
+PART_FILE_PATTERN = re.compile(r'\.part\d{4,}\.json')
+INDEX_SUFFIX = '.index.json'
+
+
+class RollingChannelFiles:
+    def __init__(self, raw_data_dir=RAW_DATA_DIR, max_part_mb=MAX_FILE_SIZE_MB, codec=None, catalog=None,
+                 video_store=None):
+        self.raw_data_dir = raw_data_dir
+        self.catalog = catalog or ArchiveCatalog.shared()
+        self.video_store = video_store or VideoMetadataStore.shared()
+        self.max_part_bytes = int(max_part_mb * 1024 * 1024)
+        if codec is None:
+            codec = get_codec(CHANNEL_FILE_CODEC, CHANNEL_FILE_CODEC_LEVEL) if COMPRESS_LARGE_FILES else CompressionCodec()
+        self.codec = codec
+
+    def index_path(self, safe_channel_name):
+        """Path of a channel's part index."""
+        return self.raw_data_dir / f"comments_{safe_channel_name}{INDEX_SUFFIX}"
+
+    def part_path(self, safe_channel_name, part_number):
+        return self.codec.path_for(self.raw_data_dir / f"comments_{safe_channel_name}.part{part_number:04d}.json")
+
+    @staticmethod
+    def is_part_file(file_path):
+        return bool(PART_FILE_PATTERN.search(file_path.name))
+
+    @staticmethod
+    def is_index_file(file_path):
+        return file_path.name.endswith(INDEX_SUFFIX)
+
+    def load_index(self, index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_index(self, index_path, index):
+        """Atomically replace the index; parts are always written before the index that lists them."""
+        tmp_path = index_path.with_name(index_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+
+    def part_files(self, index_path, index=None):
+        """Paths of every part listed in an index."""
+        index = index or self.load_index(index_path)
+        return [self.raw_data_dir / part['file'] for part in index['parts']]
+
+    def _encode_videos(self, videos):
+        """Encode each video as a '"video_id":{...}' fragment so parts can be sized before writing."""
+        for video_id, video_data in videos.items():
+            if video_data.get('video_info'):
+                video_data = {**video_data, 'video_info': self.video_store.compact(video_data['video_info'])}
+            key = (json.dumps(video_id) + ':').encode('utf-8')
+            value = json.dumps(video_data, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+            yield video_id, len(video_data.get('comments', [])), key + value, len(key)
+
+    def _write_part(self, part_path, fragments, codec=None):
+        """Write one part ({"videos": {...}}) through the codec; the rename makes it visible atomically.
+
+        Returns the frame table and each video's uncompressed byte range (its JSON object) for ArchiveReader.
+        """
+        codec = codec or self.codec
+        chunks = [b'{"videos":{']
+        offset = len(chunks[0])
+        video_offsets = {}
+        for position, (video_id, fragment, key_length) in enumerate(fragments):
+            if position:
+                chunks.append(b',')
+                offset += 1
+            chunks.append(fragment)
+            video_offsets[video_id] = [offset + key_length, offset + len(fragment)]
+            offset += len(fragment)
+        chunks.append(b'}}')
+
+        tmp_path = part_path.with_name(part_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            frames = codec.write_frames(f, iter_blocks(chunks))
+        os.replace(tmp_path, part_path)
+        self.catalog.record_write(part_path)
+        return frames, video_offsets
+
+    def rewrite_part(self, part_path, videos):
+        """Rewrite an existing part in place (same name and codec), e.g. after re-tagging its comments.
+
+        The index still holds the old frames and offsets until update_parts is called with the result.
+        """
+        fragments = [(video_id, fragment, key_length)
+                     for video_id, _, fragment, key_length in self._encode_videos(videos)]
+        frames, video_offsets = self._write_part(part_path, fragments, codec_for_path(part_path))
+        return {'frames': frames, 'video_offsets': video_offsets}
+
+    def update_parts(self, index_path, rewritten):
+        """Point index entries at rewritten parts ({file name: rewrite_part result}); returns how many."""
+        index = self.load_index(index_path)
+        updated = 0
+        for part in index['parts']:
+            result = rewritten.get(part['file'])
+            if result:
+                part.update(stored_bytes=(self.raw_data_dir / part['file']).stat().st_size,
+                            frames=result['frames'], video_offsets=result['video_offsets'])
+                updated += 1
+        if updated:
+            self._write_index(index_path, index)
+        return updated
+
+    def _write_rolling(self, safe_channel_name, videos, part_numbers):
+        """Pack videos into parts of at most max_part_bytes (uncompressed), never splitting a video.
+
+        part_numbers yields the part number to use for each part written. A single video larger
+        than the limit gets a part of its own.
+        """
+        parts = []
+        video_parts = {}
+        current = None
+
+        def close_part(part):
+            part_path = self.part_path(safe_channel_name, part['part'])
+            part['frames'], part['video_offsets'] = self._write_part(part_path, part.pop('fragments'))
+            part['file'] = part_path.name
+            part['stored_bytes'] = part_path.stat().st_size
+            parts.append(part)
+
+        for video_id, comment_count, fragment, key_length in self._encode_videos(videos):
+            if current and current['videos'] and current['bytes'] + len(fragment) + 1 > self.max_part_bytes:
+                close_part(current)
+                current = None
+            if current is None:
+                current = {'part': next(part_numbers), 'videos': 0, 'comments': 0, 'bytes': 13, 'fragments': []}
+
+            current['fragments'].append((video_id, fragment, key_length))
+            current['videos'] += 1
+            current['comments'] += comment_count
+            current['bytes'] += len(fragment) + 1
+            video_parts[video_id] = current['part']
+
+        if current:
+            close_part(current)
+
+        return parts, video_parts
+
+    def _part_number_sequence(self, index):
+        """Allocate new part numbers from index['next_part']."""
+        while True:
+            part_number = index['next_part']
+            index['next_part'] += 1
+            yield part_number
+
+    def write_channel(self, safe_channel_name, channel_file_data):
+        """Write a whole channel ({channel_info, videos, comments_summary}) as fresh parts plus index."""
+        index_path = self.index_path(safe_channel_name)
+        old_index = self.load_index(index_path) if index_path.exists() else None
+        stale_files = self.part_files(index_path, old_index) if old_index else []
+
+        index = {
+            'channel_info': channel_file_data.get('channel_info', {}),
+            'comments_summary': channel_file_data.get('comments_summary', {}),
+            'max_part_bytes': self.max_part_bytes,
+            # Numbers past the old parts, so they are not overwritten before the new index replaces the old one
+            'next_part': old_index['next_part'] if old_index else 1,
+            'parts': [],
+            'video_parts': {}
+        }
+        parts, video_parts = self._write_rolling(
+            safe_channel_name, channel_file_data.get('videos', {}), self._part_number_sequence(index)
+        )
+        index['parts'] = parts
+        index['video_parts'] = video_parts
+        self._write_index(index_path, index)
+        self._remove_parts(stale_files)
+
+        return index_path, index
+
+    def _remove_parts(self, part_files):
+        """Delete parts no longer listed in the index (only after the new index is in place)."""
+        for part_file in part_files:
+            part_file.unlink(missing_ok=True)
+            self.catalog.forget(part_file)
+
+    def load_parts(self, index_path, part_numbers=None, index=None):
+        """Load video_id -> video data from the selected parts (all parts if part_numbers is None)."""
+        index = index or self.load_index(index_path)
+        videos = {}
+        for part in index['parts']:
+            if part_numbers is not None and part['part'] not in part_numbers:
+                continue
+            videos.update(self.catalog.load_json(self.raw_data_dir / part['file'])['videos'])
+        return videos
+
+    def load_videos(self, index_path, video_ids):
+        """Load only the parts holding the requested videos."""
+        index = self.load_index(index_path)
+        part_numbers = {index['video_parts'][video_id] for video_id in video_ids if video_id in index['video_parts']}
+        videos = self.load_parts(index_path, part_numbers, index) if part_numbers else {}
+        return {video_id: videos[video_id] for video_id in video_ids if video_id in videos}
+
+    def load_channel_data(self, index_path):
+        """Rebuild the legacy {channel_info, videos, comments_summary} structure from all parts."""
+        index = self.load_index(index_path)
+        videos = {}
+        for video_id, video_data in self.load_parts(index_path, index=index).items():
+            if video_data.get('video_info'):
+                video_data = {**video_data, 'video_info': self.video_store.expand(video_data['video_info'])}
+            videos[video_id] = video_data
+        return {
+            'channel_info': index['channel_info'],
+            'videos': videos,
+            'comments_summary': index['comments_summary']
+        }
+
+    def update_channel(self, index_path, new_channel_data, timestamp):
+        """Merge new comments into a parted channel, rewriting only the parts they touch."""
+        index = self.load_index(index_path)
+        safe_channel_name = index_path.name[len('comments_'):-len(INDEX_SUFFIX)]
+
+        # Parts holding videos that gained comments, plus the last part for brand-new videos
+        touched_parts = {index['video_parts'][video_id] for video_id in new_channel_data
+                         if video_id in index['video_parts']}
+        if index['parts'] and any(video_id not in index['video_parts'] for video_id in new_channel_data):
+            touched_parts.add(index['parts'][-1]['part'])
+
+        videos = self.load_parts(index_path, touched_parts, index) if touched_parts else {}
+        # The merge below modifies the cached part objects
+        for part in index['parts']:
+            if part['part'] in touched_parts:
+                self.catalog.invalidate(self.raw_data_dir / part['file'])
+        new_comment_count = 0
+        for video_id, new_video_data in new_channel_data.items():
+            new_comments = new_video_data.get('comments', [])
+            new_comment_count += len(new_comments)
+            if video_id in videos:
+                videos[video_id]['comments'] = videos[video_id].get('comments', []) + new_comments
+            else:
+                videos[video_id] = new_video_data
+
+        # Merged videos go to fresh part numbers: the live parts stay intact until the new index replaces
+        # the old one, so a crash at any point leaves an index whose parts all exist and match it
+        stale_files = [self.raw_data_dir / part['file'] for part in index['parts'] if part['part'] in touched_parts]
+        parts, video_parts = self._write_rolling(safe_channel_name, videos, self._part_number_sequence(index))
+
+        added_videos = len(set(video_parts) - set(index['video_parts']))
+
+        index['parts'] = sorted(
+            [part for part in index['parts'] if part['part'] not in touched_parts] + parts,
+            key=lambda part: part['part']
+        )
+        index['video_parts'].update(video_parts)
+        index['channel_info']['total_videos'] = len(index['video_parts'])
+        index['channel_info']['total_comments'] = index['channel_info'].get('total_comments', 0) + new_comment_count
+        index['comments_summary']['total_comments'] = index['channel_info']['total_comments']
+        index['comments_summary']['videos_with_comments'] = index['comments_summary'].get('videos_with_comments', 0) + added_videos
+        index['comments_summary']['collection_timestamp'] = timestamp
+        self._write_index(index_path, index)
+        self._remove_parts(stale_files)
+
+        return index, len(touched_parts)
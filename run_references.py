@@ -0,0 +1,161 @@
+from collections import OrderedDict
+
+# Fields kept on a sample comment reference; the text itself stays in the archive
+SAMPLE_REFERENCE_FIELDS = ['likes', 'author', 'sentiment', 'channel', 'variations_found']
+RESOLVED_VIDEO_CACHE_SIZE = 32
+
+
+def comment_reference(comment, archive):
+    """Compact pointer to an archived comment: its ID, video and archive source name."""
+    reference = {
+        'comment_id': comment.get('comment_id'),
+        'video_id': comment.get('video_id'),
+        'archive': archive
+    }
+    for field in SAMPLE_REFERENCE_FIELDS:
+        if field in comment:
+            reference[field] = comment[field]
+    return reference
+
+
+def build_channel_references(data_saver, comments_data, new_comments_only=None, videos_data=None):
+    """Describe a run's comments per channel by archive, segment and per-video counts instead of copying them."""
+    existing_files = data_saver.find_existing_channel_files()
+    references = {}
+
+    for channel_id, channel_data in (comments_data or {}).items():
+        new_channel_data = (new_comments_only or {}).get(channel_id) or {}
+        references[channel_id] = {
+            'archive': data_saver.channel_archive_source(channel_id, channel_data, videos_data, existing_files),
+            'segment': data_saver.run_segments.get(channel_id),
+            'videos': {
+                video_id: len(video_data.get('comments', []))
+                for video_id, video_data in channel_data.items()
+            },
+            # New comments are appended after a video's archived ones, so a count locates them
+            'new_videos': {
+                video_id: len(video_data.get('comments', []))
+                for video_id, video_data in new_channel_data.items() if video_data.get('comments')
+            }
+        }
+
+    return references
+
+
+def reference_keyword_report(keyword_report, channel_references):
+    """Copy of a keyword report whose sample comments are references instead of full texts."""
+    video_archives = {
+        video_id: reference['archive']
+        for reference in channel_references.values()
+        for video_id in reference['videos']
+    }
+
+    detailed_analysis = {}
+    for keyword, data in keyword_report.get('detailed_analysis', {}).items():
+        detailed_analysis[keyword] = {
+            **data,
+            'sample_comments': [
+                comment_reference(comment, video_archives.get(comment.get('video_id'), comment.get('archive')))
+                for comment in data.get('sample_comments', [])
+            ]
+        }
+
+    return {**keyword_report, 'detailed_analysis': detailed_analysis}
+
+
+class RunReferenceResolver:
+    # Resolves references in processed_/analysis_ outputs against the archives on demand.
+    # Only the videos asked for are read; archives stay open until close().
+    def __init__(self, data_saver):
+        self.data_saver = data_saver
+        self._readers = {}
+        self._videos = OrderedDict()  # (archive, video_id) -> {video_info, comments, by_id}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for reader in self._readers.values():
+            if reader:
+                reader.close()
+        self._readers = {}
+        self._videos = OrderedDict()
+
+    def load_output(self, path):
+        """Parse a processed_/analysis_ file (shared through the archive catalog - do not modify)."""
+        return self.data_saver.catalog.load_json(path)
+
+    def reader(self, archive):
+        if archive not in self._readers:
+            self._readers[archive] = self.data_saver.open_archive(archive) if archive else None
+        return self._readers[archive]
+
+    def resolve_video(self, archive, video_id):
+        """Return {video_info, comments} for one archived video, or None."""
+        key = (archive, video_id)
+        if key in self._videos:
+            self._videos.move_to_end(key)
+            return self._videos[key]
+
+        reader = self.reader(archive)
+        video = reader.get_video(video_id) if reader else None
+        if video is not None:
+            video['by_id'] = {comment.get('comment_id'): comment for comment in video['comments']}
+
+        self._videos[key] = video
+        if len(self._videos) > RESOLVED_VIDEO_CACHE_SIZE:
+            self._videos.popitem(last=False)
+        return video
+
+    def resolve_comment(self, reference):
+        """Return the full archived comment a reference points to, or None if it is gone."""
+        video = self.resolve_video(reference.get('archive'), reference.get('video_id'))
+        return video['by_id'].get(reference.get('comment_id')) if video else None
+
+    def resolve_sample_comments(self, analysis, keyword):
+        """Full comments behind a keyword's sample comment references."""
+        samples = analysis['detailed_analysis'].get(keyword, {}).get('sample_comments', [])
+        return [comment for comment in map(self.resolve_comment, samples) if comment is not None]
+
+    def iter_channel_comments(self, channel_reference):
+        """Yield (video_id, comment) for every archived comment of the videos a run saw."""
+        for video_id in channel_reference['videos']:
+            video = self.resolve_video(channel_reference['archive'], video_id)
+            for comment in (video['comments'] if video else []):
+                yield video_id, comment
+
+    def iter_new_comments(self, channel_reference):
+        """Yield (video_id, comment) for the comments a run added to the archive.
+
+        Read straight from the run's segment while it exists; otherwise (parts, or a compacted
+        segment) they are the last comments of each video, exact until a later run appends to it.
+        """
+        entry = self.segment_entry(channel_reference)
+        if entry and entry['file'] == channel_reference['segment']:
+            segment_archive = self.data_saver.segment_archive
+            segment_path = segment_archive.channel_dir(channel_reference['archive'].split('/', 1)[1]) / entry['file']
+            for record in self.data_saver.catalog.load_records(segment_path):
+                if record['type'] == 'comment':
+                    yield record['video_id'], record['comment']
+            return
+
+        for video_id, count in channel_reference.get('new_videos', {}).items():
+            video = self.resolve_video(channel_reference['archive'], video_id)
+            for comment in (video['comments'][-count:] if video else []):
+                yield video_id, comment
+
+    def segment_entry(self, channel_reference):
+        """Manifest entry of the segment a run appended, followed through later compactions."""
+        archive = channel_reference.get('archive') or ''
+        segment = channel_reference.get('segment')
+        if not segment or not archive.startswith('segments/'):
+            return None
+
+        manifest = self.data_saver.segment_archive.load_manifest(archive.split('/', 1)[1])
+        for entry in (manifest or {}).get('segments', []):
+            if entry['file'] == segment or segment in entry.get('compacted_files', []):
+                return entry
+        return None
@@ -0,0 +1,362 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from archive_catalog import ArchiveCatalog
+from comment_record import json_default
+from compression_codecs import codec_for_path, get_codec, iter_blocks
+from video_metadata_store import VideoMetadataStore
+from settings import (
+    SEGMENTS_DIR,
+    MIGRATED_DATA_DIR,
+    SEGMENT_COMPACTION_THRESHOLD,
+    SEGMENT_CODEC,
+    SEGMENT_CODEC_LEVEL
+)
+
+
+class SegmentedChannelArchive:
+    # One lock per channel shared by all instances (appends vs background compaction)
+    _channel_locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, segments_dir=SEGMENTS_DIR, codec=None, catalog=None, video_store=None):
+        self.segments_dir = segments_dir
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self.codec = codec or get_codec(SEGMENT_CODEC, SEGMENT_CODEC_LEVEL)
+        self.catalog = catalog or ArchiveCatalog.shared()
+        self.video_store = video_store or VideoMetadataStore.shared()
+        self.compaction_threads = []
+
+    def _channel_lock(self, safe_channel_name):
+        with self._locks_guard:
+            if safe_channel_name not in self._channel_locks:
+                self._channel_locks[safe_channel_name] = threading.Lock()
+            return self._channel_locks[safe_channel_name]
+
+    def channel_dir(self, safe_channel_name):
+        """Directory holding a channel's manifest and segments."""
+        return self.segments_dir / safe_channel_name
+
+    def list_channels(self):
+        """List channels that have a segmented archive."""
+        return sorted(
+            path.name for path in self.segments_dir.iterdir()
+            if path.is_dir() and (path / 'manifest.json').exists()
+        )
+
+    def load_manifest(self, safe_channel_name):
+        """Load a channel manifest, or None if the channel has no segmented archive yet."""
+        manifest_path = self.channel_dir(safe_channel_name) / 'manifest.json'
+        if not manifest_path.exists():
+            return None
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, safe_channel_name, manifest):
+        """Atomically replace the channel manifest."""
+        manifest_path = self.channel_dir(safe_channel_name) / 'manifest.json'
+        tmp_path = manifest_path.with_suffix('.json.tmp')
+
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+    def _new_manifest(self, channel_id, channel_name):
+        return {
+            'channel_info': {
+                'channel_id': channel_id,
+                'channel_name': channel_name,
+                'total_videos': 0,
+                'total_comments': 0
+            },
+            'video_ids': [],
+            'segments': [],
+            'next_segment': 1,
+            'comments_summary': {
+                'total_comments': 0,
+                'collection_timestamp': None
+            }
+        }
+
+    def _segment_name(self, segment_number, timestamp, suffix=''):
+        return f"segment_{segment_number:05d}_{timestamp}{suffix}.jsonl{self.codec.extension}"
+
+    def _write_segment(self, segment_path, records, codec=None):
+        """Write records to a new segment file; the rename makes it visible atomically.
+
+        Also returns each video's uncompressed byte range and the frame table, so ArchiveReader
+        can fetch one video without reading the whole segment.
+        """
+        codec = codec or self.codec
+        tmp_path = segment_path.with_name(segment_path.name + '.tmp')
+        counts = {'videos': set(), 'comments': 0, 'video_offsets': {}}
+        written_records = []
+
+        def encoded_lines():
+            offset = 0
+            for record in records:
+                written_records.append(record)
+                line = (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=json_default) + '\n').encode('utf-8')
+                video_range = counts['video_offsets'].setdefault(record['video_id'], [offset, offset])
+                video_range[1] = offset + len(line)
+                offset += len(line)
+
+                counts['videos'].add(record['video_id'])
+                if record['type'] == 'comment':
+                    counts['comments'] += 1
+                yield line
+
+        # Blocks end on line boundaries, so every compressed frame holds whole records
+        with open(tmp_path, 'wb') as f:
+            counts['frames'] = codec.write_frames(f, iter_blocks(encoded_lines()))
+
+        os.replace(tmp_path, segment_path)
+        # Seed the catalog with the records just written so they are never decoded back this run
+        decoded_bytes = max((end for start, end in counts['video_offsets'].values()), default=0)
+        self.catalog.record_write(segment_path, written_records, decoded_bytes)
+        return counts
+
+    def rewrite_segment(self, segment_path, records):
+        """Rewrite an existing segment in place (same name and codec), e.g. after re-tagging its comments.
+
+        The manifest still holds the old frames and offsets until update_segments is called with the result.
+        """
+        counts = self._write_segment(segment_path, records, codec_for_path(segment_path))
+        return {'frames': counts['frames'], 'video_offsets': counts['video_offsets']}
+
+    def update_segments(self, safe_channel_name, rewritten):
+        """Point manifest entries at rewritten segments ({file name: rewrite_segment result}); returns how many."""
+        with self._channel_lock(safe_channel_name):
+            manifest = self.load_manifest(safe_channel_name)
+            updated = 0
+            for segment in manifest['segments'] if manifest else []:
+                result = rewritten.get(segment['file'])
+                if result:
+                    segment_path = self.channel_dir(safe_channel_name) / segment['file']
+                    segment.update(bytes=segment_path.stat().st_size, frames=result['frames'],
+                                   video_offsets=result['video_offsets'])
+                    updated += 1
+            if updated:
+                self._write_manifest(safe_channel_name, manifest)
+        return updated
+
+    def _channel_records(self, channel_data):
+        """Flatten video_id -> {video_info, comments} into segment records."""
+        for video_id, video_data in channel_data.items():
+            # Static metadata lives in the video metadata store; the record keeps its hash and stats
+            yield {'type': 'video', 'video_id': video_id, 'video_info': self.video_store.compact(video_data.get('video_info'))}
+            for comment in video_data.get('comments', []):
+                yield {'type': 'comment', 'video_id': video_id, 'comment': comment}
+
+    def append_segment(self, safe_channel_name, channel_id, channel_name, channel_data, timestamp):
+        """Append one run's new comments for a channel as a new immutable segment."""
+        with self._channel_lock(safe_channel_name):
+            self.channel_dir(safe_channel_name).mkdir(parents=True, exist_ok=True)
+            manifest = self.load_manifest(safe_channel_name) or self._new_manifest(channel_id, channel_name)
+
+            segment_number = manifest['next_segment']
+            segment_name = self._segment_name(segment_number, timestamp)
+            segment_path = self.channel_dir(safe_channel_name) / segment_name
+
+            counts = self._write_segment(segment_path, self._channel_records(channel_data))
+
+            manifest['segments'].append({
+                'file': segment_name,
+                'created': timestamp,
+                'videos': len(counts['videos']),
+                'comments': counts['comments'],
+                'bytes': segment_path.stat().st_size,
+                'frames': counts['frames'],
+                'video_offsets': counts['video_offsets']
+            })
+            manifest['next_segment'] = segment_number + 1
+
+            known_videos = set(manifest['video_ids'])
+            manifest['video_ids'].extend(sorted(counts['videos'] - known_videos))
+            manifest['channel_info']['channel_name'] = channel_name
+            manifest['channel_info']['total_videos'] = len(manifest['video_ids'])
+            manifest['channel_info']['total_comments'] += counts['comments']
+            manifest['comments_summary']['total_comments'] = manifest['channel_info']['total_comments']
+            manifest['comments_summary']['collection_timestamp'] = timestamp
+
+            self._write_manifest(safe_channel_name, manifest)
+
+        return segment_path, manifest
+
+    def import_legacy_files(self, safe_channel_name, channel_id, channel_name, legacy_files, load_function, timestamp,
+                            companion_files=None):
+        """One-time migration: turn legacy monolithic (or parted) channel files into segments."""
+        imported = []
+        for file_path in legacy_files:
+            legacy_data = load_function(file_path)
+            if not legacy_data:
+                continue
+
+            videos = legacy_data.get('videos', legacy_data)
+            legacy_info = legacy_data.get('channel_info', {})
+            self.append_segment(
+                safe_channel_name,
+                legacy_info.get('channel_id', channel_id),
+                legacy_info.get('channel_name', channel_name),
+                videos,
+                timestamp
+            )
+
+            # Move the monolith (and any parts) aside so it is not read twice
+            MIGRATED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+            for path in [file_path] + (companion_files(file_path) if companion_files else []):
+                shutil.move(str(path), str(MIGRATED_DATA_DIR / path.name))
+                self.catalog.forget(path)
+            imported.append(file_path)
+
+        if imported:
+            print(f"      📦 Imported {len(imported)} legacy file(s) into segments")
+        return imported
+
+    def iter_records(self, safe_channel_name, segments=None):
+        """Yield segment records in append order; segments are immutable, so their parses are shared via the catalog."""
+        if segments is None:
+            manifest = self.load_manifest(safe_channel_name)
+            segments = manifest['segments'] if manifest else []
+
+        for segment in segments:
+            segment_path = self.channel_dir(safe_channel_name) / segment['file']
+            yield from self.catalog.load_records(segment_path)
+
+    def load_channel_data(self, safe_channel_name):
+        """Rebuild the legacy {channel_info, videos, comments_summary} structure from segments."""
+        manifest = self.load_manifest(safe_channel_name)
+        if not manifest:
+            return None
+
+        videos = self._merge_records(self.iter_records(safe_channel_name, manifest['segments']))
+        for video in videos.values():
+            video['video_info'] = self.video_store.expand(video['video_info'])
+        return {
+            'channel_info': manifest['channel_info'],
+            'videos': videos,
+            'comments_summary': {
+                'total_comments': manifest['comments_summary']['total_comments'],
+                'videos_with_comments': len([v for v in videos.values() if v.get('comments')]),
+                'collection_timestamp': manifest['comments_summary']['collection_timestamp']
+            }
+        }
+
+    def _merge_records(self, records, deduplicate=False):
+        """Fold records into video_id -> {video_info, comments}; later video_info wins."""
+        videos = {}
+        seen_comment_ids = {}
+
+        for record in records:
+            video = videos.setdefault(record['video_id'], {'video_info': {}, 'comments': []})
+            if record['type'] == 'video':
+                if record.get('video_info'):
+                    video['video_info'] = record['video_info']
+                continue
+
+            comment = record['comment']
+            comment_id = comment.get('comment_id')
+            if deduplicate and comment_id:
+                previous = seen_comment_ids.get(comment_id)
+                if previous is not None:
+                    # Keep the newest copy in place of the old one
+                    previous_video_id, position = previous
+                    videos[previous_video_id]['comments'][position] = comment
+                    continue
+                seen_comment_ids[comment_id] = (record['video_id'], len(video['comments']))
+
+            video['comments'].append(comment)
+
+        return videos
+
+    def compact_channel(self, safe_channel_name, timestamp=None):
+        """Merge all current segments of a channel into one, dropping duplicate comments."""
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        lock = self._channel_lock(safe_channel_name)
+
+        # Snapshot the segment list; appends during the merge land in new segments
+        with lock:
+            manifest = self.load_manifest(safe_channel_name)
+            if not manifest or len(manifest['segments']) < 2:
+                return None
+            snapshot = list(manifest['segments'])
+            segment_number = manifest['next_segment']
+            manifest['next_segment'] = segment_number + 1
+            self._write_manifest(safe_channel_name, manifest)
+
+        videos = self._merge_records(self.iter_records(safe_channel_name, snapshot), deduplicate=True)
+        segment_name = self._segment_name(segment_number, timestamp, '_compacted')
+        segment_path = self.channel_dir(safe_channel_name) / segment_name
+        counts = self._write_segment(segment_path, self._channel_records(videos))
+
+        with lock:
+            manifest = self.load_manifest(safe_channel_name)
+            snapshot_files = {segment['file'] for segment in snapshot}
+            newer_segments = [s for s in manifest['segments'] if s['file'] not in snapshot_files]
+
+            compacted_entry = {
+                'file': segment_name,
+                'created': timestamp,
+                'videos': len(counts['videos']),
+                'comments': counts['comments'],
+                'bytes': segment_path.stat().st_size,
+                'compacted_from': len(snapshot),
+                # Earlier segment names stay resolvable for references written by past runs
+                'compacted_files': [
+                    name for segment in snapshot for name in [segment['file']] + segment.get('compacted_files', [])
+                ],
+                'frames': counts['frames'],
+                'video_offsets': counts['video_offsets']
+            }
+            manifest['segments'] = [compacted_entry] + newer_segments
+
+            total_comments = sum(segment['comments'] for segment in manifest['segments'])
+            manifest['channel_info']['total_comments'] = total_comments
+            manifest['comments_summary']['total_comments'] = total_comments
+            self._write_manifest(safe_channel_name, manifest)
+
+            for segment in snapshot:
+                segment_path = self.channel_dir(safe_channel_name) / segment['file']
+                if segment_path.exists():
+                    segment_path.unlink()
+                self.catalog.forget(segment_path)
+
+        print(f"🗜️ Compacted {safe_channel_name}: {len(snapshot)} segments → 1 "
+              f"({counts['comments']:,} comments)")
+        return segment_name
+
+    def needs_compaction(self, safe_channel_name):
+        """Check whether a channel has accumulated enough segments to compact."""
+        manifest = self.load_manifest(safe_channel_name)
+        return bool(manifest) and len(manifest['segments']) >= SEGMENT_COMPACTION_THRESHOLD
+
+    def start_background_compaction(self, safe_channel_names=None):
+        """Compact channels over the segment threshold in a background thread."""
+        if safe_channel_names is None:
+            safe_channel_names = self.list_channels()
+
+        pending = [name for name in safe_channel_names if self.needs_compaction(name)]
+        if not pending:
+            return None
+
+        def compact_all():
+            for name in pending:
+                try:
+                    self.compact_channel(name)
+                except Exception as e:
+                    print(f"Error compacting {name}: {e}")
+
+        print(f"🗜️ Background compaction started for {len(pending)} channel(s)")
+        thread = threading.Thread(target=compact_all, name='segment-compactor')
+        thread.start()
+        self.compaction_threads.append(thread)
+        return thread
+
+    def wait_for_compaction(self):
+        """Block until background compaction finishes."""
+        for thread in self.compaction_threads:
+            thread.join()
+        self.compaction_threads = []
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -72,6 +73,48 @@ for category, keywords in TARGET_KEYWORDS.items():
     for main_keyword, variations in keywords.items():
         ALL_KEYWORDS[main_keyword] = variations
 
+# Match keyword variations as whole tokens only ('pw' not inside 'upward', 'neet' not inside 'neetprep').
+# Off by default (plain substring matching, as archived tags were made); after switching it on, run
+# `python retag_archives.py` so archived comments are re-tagged the same way as new ones
+KEYWORD_WORD_BOUNDARIES = False
+TEXT_CACHE_SIZE = 50000  # Distinct comment texts memoised by TextCleaner.process_text
+TEXT_CACHE_MAX_LENGTH = 40  # Only short texts ("Nice", "Thank you sir") repeat often enough to cache
+
+# Compact encodings for columnar/indexed storage. Keyword bits come from an append-only registry in
+# KEYWORD_BITS_FILE: a keyword keeps its bit for good and new keywords take the next free one (bits of
+# removed keywords are never reused), so reordering TARGET_KEYWORDS leaves stored keyword masks valid
+KEYWORD_BITS_FILE = RAW_DATA_DIR / 'keyword_bits.json'
+MAX_KEYWORD_BITS = 64  # keyword_mask columns are uint64
+
+
+def _keyword_bit_registry():
+    registry = {}
+    if KEYWORD_BITS_FILE.exists():
+        with open(KEYWORD_BITS_FILE, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+    new_keywords = [main_keyword for main_keyword in ALL_KEYWORDS if main_keyword not in registry]
+    if new_keywords:
+        for main_keyword in new_keywords:
+            registry[main_keyword] = max(registry.values(), default=-1) + 1
+        tmp_path = KEYWORD_BITS_FILE.with_name(KEYWORD_BITS_FILE.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp_path, KEYWORD_BITS_FILE)
+    if max(registry.values(), default=-1) >= MAX_KEYWORD_BITS:
+        raise ValueError(f"Keyword bit registry {KEYWORD_BITS_FILE} needs more than {MAX_KEYWORD_BITS} bits")
+    return registry
+
+
+KEYWORD_BIT_REGISTRY = _keyword_bit_registry()  # Every keyword ever registered, including removed ones
+KEYWORD_BITS = {main_keyword: KEYWORD_BIT_REGISTRY[main_keyword] for main_keyword in ALL_KEYWORDS}
+SENTIMENT_CODES = {
+    'neutral': 0,
+    'positive': 1,
+    'negative': 2,
+    'educational': 3,
+    'brand_mention': 4
+}
+
 # OPTIMIZED Rate limiting and quota - AGGRESSIVE SETTINGS
 MAX_VIDEOS_PER_CHANNEL = 150
 MAX_COMMENTS_PER_REQUEST = 100
@@ -97,6 +140,95 @@ ENCODING = 'utf-8'
 SPLIT_FILES_BY_CHANNEL = True  # Enable channel-specific files
 MAX_FILE_SIZE_MB = 5  # Split if file exceeds 5MB
 COMPRESS_LARGE_FILES = True  # Enable compression for large files
+JSON_PRETTY_PRINT = False  # indent=2 output for debugging; compact in production
+STREAMING_WRITE_BUFFER_CHARS = 64 * 1024  # JSON characters buffered per write() while streaming
+
+# COMPRESSION CODEC SETTINGS - one codec per store: 'none', 'gzip', 'zstd' or 'lz4'
+# (zstd/lz4 need the zstandard / lz4 packages; a store falls back to gzip without them)
+CHANNEL_FILE_CODEC = 'gzip'  # Monolithic channel files past MAX_FILE_SIZE_MB
+CHANNEL_FILE_CODEC_LEVEL = 6
+SEGMENT_CODEC = 'gzip'  # Append-only channel segments
+SEGMENT_CODEC_LEVEL = 6
+COMPRESSION_WORKERS = 4  # Threads compressing channel files / blocks in parallel
+COMPRESSION_BLOCK_BYTES = 1024 * 1024  # Uncompressed bytes per independently compressed frame
+
+# NEAR-DUPLICATE DETECTION SETTINGS (MinHash/LSH over cleaned_text)
+NEAR_DUPLICATE_INDEX_FILE = RAW_DATA_DIR / 'near_duplicate_index.json'
+NEAR_DUPLICATE_SIGNATURES_FILE = RAW_DATA_DIR / 'near_duplicate_signatures.bin'
+NEAR_DUPLICATE_ASSIGNMENTS_FILE = RAW_DATA_DIR / 'near_duplicate_assignments.tsv'  # Append-only comment_id -> cluster_id
+NEAR_DUPLICATE_SHINGLE_SIZE = 5  # Character shingles
+NEAR_DUPLICATE_NUM_PERM = 64  # MinHash signature length
+NEAR_DUPLICATE_BANDS = 16  # LSH bands (rows per band = NUM_PERM / BANDS)
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard needed to join a cluster
+NEAR_DUPLICATE_MIN_CHARS = 20  # Shorter texts ("Nice", "Thank you sir") are never clustered
+
+# SEGMENTED ARCHIVE SETTINGS - append-only JSON Lines segments per channel
+ARCHIVE_FORMAT = 'segmented'  # 'segmented' (append-only) or 'monolithic' (legacy load-merge-rewrite)
+SEGMENTS_DIR = RAW_DATA_DIR / 'segments'
+MIGRATED_DATA_DIR = RAW_DATA_DIR / 'migrated'  # Legacy channel files after import into segments
+SEGMENT_COMPACTION_THRESHOLD = 8  # Compact a channel in the background once it has this many segments
+
+# ARCHIVE CATALOG SETTINGS - size/mtime/hash manifest plus a per-run cache of parsed archives
+ARCHIVE_CATALOG_FILE = RAW_DATA_DIR / 'archive_catalog.json'
+ARCHIVE_CACHE_MAX_MB = 256  # Decoded JSON bytes kept parsed (Python objects take several times more)
+
+# VIDEO METADATA STORE SETTINGS - content-addressed static metadata plus delta-encoded statistics history
+VIDEO_METADATA_DIR = RAW_DATA_DIR / 'video_metadata'
+VIDEO_VOLATILE_FIELDS = ['view_count', 'comment_count', 'like_count']  # Kept inline, tracked per run
+
+# KEYWORD AGGREGATE SETTINGS - whole-corpus keyword x channel x video stats, updated with new comments only
+KEYWORD_AGGREGATES_FILE = ANALYSIS_DATA_DIR / 'keyword_aggregates.json'
+KEYWORD_TOP_COMMENTS = 10  # Highest-liked comments kept per keyword
+KEYWORD_TOP_COMMENTS_SLACK = 10  # Extra runners-up kept so top comments whose likes drop can be replaced
+
+# COLUMNAR WAREHOUSE SETTINGS - one Parquet row per comment, partitioned by channel and month
+WAREHOUSE_DIR = DATA_DIR / 'warehouse'
+WAREHOUSE_COMPRESSION = 'zstd'
+
+# RE-TAGGING SETTINGS - re-apply changed TARGET_KEYWORDS to archived comments (python retag_archives.py)
+KEYWORD_CONFIG_FILE = RAW_DATA_DIR / 'keyword_config.json'  # Keyword settings the archives are tagged with
+RETAG_WORKERS = os.cpu_count() or 1  # Processes re-tagging archive files in parallel
+
+# LEADERBOARD SETTINGS - persistent top comments by likes and weighted score (global, per keyword, per channel)
+LEADERBOARD_FILE = ANALYSIS_DATA_DIR / 'comment_leaderboards.json'
+LEADERBOARD_SIZE = 100  # Comments readable per leaderboard
+LEADERBOARD_SLACK = 100  # Extra runners-up kept so members whose likes drop can be replaced
+
+# EMERGING TERMS SETTINGS - streaming n-gram sketches (Count-Min baseline + Space-Saving recent weeks)
+EMERGING_TERMS_FILE = ANALYSIS_DATA_DIR / 'emerging_terms.json'
+EMERGING_TERMS_MAX_NGRAM = 3  # Unigrams, bigrams and trigrams
+EMERGING_TERMS_CAPACITY = 2000  # Heavy-hitter counters per channel per week
+EMERGING_TERMS_WEEKS = 4  # Publish weeks kept as heavy-hitter windows
+EMERGING_TERMS_RECENT_WEEKS = 1  # Latest weeks compared against everything before them
+EMERGING_TERMS_MIN_COUNT = 5  # Recent comments a term needs before it can be reported
+EMERGING_TERMS_MIN_LIFT = 3.0  # Recent share of comments / earlier share
+COUNT_MIN_WIDTH = 2 ** 14
+COUNT_MIN_DEPTH = 4
+
+# SKETCH ANALYTICS SETTINGS - approximate dashboards (HyperLogLog authors, Count-Min mentions, t-digest likes)
+SKETCH_ANALYTICS_FILE = ANALYSIS_DATA_DIR / 'sketch_analytics.json'
+SKETCH_COUNT_MIN_WIDTH = 2 ** 16  # keyword x channel x day counters per row
+HYPERLOGLOG_PRECISION = 14  # 16 KB per sketch, ~0.8% standard error
+TDIGEST_COMPRESSION = 200  # Scale of the like distributions (~120 centroids; p99 within a few %)
+
+# AUDIENCE OVERLAP SETTINGS - MinHash signatures of commenter IDs per channel and video
+AUDIENCE_OVERLAP_FILE = ANALYSIS_DATA_DIR / 'audience_signatures.npz'
+AUDIENCE_NUM_PERM = 256  # Signature length (Jaccard standard error ~ 0.03 at 256)
+AUDIENCE_EXACT_MAX_AUTHORS = 500  # Audiences up to this size also keep exact author hashes
+
+# SEARCH INDEX SETTINGS - dense comment ordinals plus a positional inverted index over cleaned_text
+INDEX_DIR = DATA_DIR / 'index'
+COMMENT_ORDINALS_DIR = INDEX_DIR / 'ordinals'  # comment_id -> ordinal with channel/video/day/likes columns
+SEARCH_INDEX_DIR = INDEX_DIR / 'text'
+SEARCH_INDEX_COMPACTION_THRESHOLD = 8  # Merge the per-run segments once there are this many
+BITMAP_INDEX_FILE = INDEX_DIR / 'bitmaps.npz'  # Roaring bitmaps per keyword, channel, sentiment and month
+
+# AUTHOR INDEX SETTINGS - per-author activity keyed by author_channel_id, plus posting-rate bot flags
+AUTHOR_INDEX_FILE = INDEX_DIR / 'authors.npz'
+BOT_MIN_COMMENTS = 10  # Authors with fewer indexed comments are never flagged
+BOT_BURST_COMMENTS = 10  # Flag this many comments ...
+BOT_BURST_SECONDS = 600  # ... inside any window of this length
+BOT_DAILY_RATE = 30  # Or an average of this many comments per active day (UTC days with a comment)
 
 # Quota costs
 QUOTA_COSTS = {
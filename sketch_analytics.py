@@ -0,0 +1,203 @@
+import json
+import os
+import time
+from collections import Counter
+from streaming_sketches import CountMinSketch, HyperLogLog, TDigest
+from settings import SKETCH_ANALYTICS_FILE, SKETCH_COUNT_MIN_WIDTH
+
+ALL = '*'
+
+
+class SketchAnalytics:
+    # Approximate dashboards fed by each run's new comments (the filter_new_comments_only output):
+    # HyperLogLog distinct commenters per channel, t-digest like distributions per channel and keyword,
+    # and one conservative-update Count-Min sketch of keyword x channel x day mentions (with '*'
+    # roll-ups for all channels / all days). Every sketch merges, so runs or workers can be combined.
+    def __init__(self, sketch_file=SKETCH_ANALYTICS_FILE, channel_readers=None):
+        self.sketch_file = sketch_file
+        self.authors = {}  # channel name or ALL -> HyperLogLog of author_channel_id
+        self.likes = {}  # ALL, 'channel:<name>' or 'keyword:<keyword>' -> TDigest
+        self.mentions = CountMinSketch(SKETCH_COUNT_MIN_WIDTH)
+        self.comments = Counter()  # channel name -> comments sketched
+        self.days = set()
+        self.keywords = set()
+        self._pending_authors = {}  # channel name or ALL -> [author IDs]
+        self._pending_mentions = Counter()
+        self.load(channel_readers)
+
+    def load(self, channel_readers=None):
+        """Load the saved sketches, building them from the archives if there are none yet."""
+        try:
+            if self.sketch_file.exists():
+                with open(self.sketch_file, 'r', encoding='utf-8') as f:
+                    self._restore(json.load(f))
+            elif channel_readers is not None:
+                print("No analytics sketches found. Building from archives...")
+                self.rebuild(channel_readers)
+        except Exception as e:
+            print(f"Error loading analytics sketches: {e}")
+
+    def rebuild(self, channel_readers):
+        """Sketch every archived comment once; channel_readers yields (source_name, reader)."""
+        start = time.perf_counter()
+        seen_comment_ids = set()
+        for source_name, reader in channel_readers():
+            try:
+                with reader:
+                    for video_id, video_info, comment in reader.iter_comments():
+                        comment_id = comment.get('comment_id')
+                        if comment_id in seen_comment_ids:
+                            continue
+                        seen_comment_ids.add(comment_id)
+                        self.add_comment(comment)
+                        if len(seen_comment_ids) % 10000 == 0:
+                            self.flush()
+            except Exception as e:
+                print(f"Error sketching {source_name}: {e}")
+
+        self.save()
+        print(f"Sketched {len(seen_comment_ids):,} archived comments in {time.perf_counter() - start:.1f}s")
+
+    def _digest(self, scope):
+        digest = self.likes.get(scope)
+        if digest is None:
+            digest = self.likes[scope] = TDigest()
+        return digest
+
+    def add_comment(self, comment):
+        """Queue a comment's author and mentions and add its likes to the distributions."""
+        channel_name = comment.get('source_channel', 'Unknown')
+        likes = comment.get('likes', 0) or 0
+        day = (comment.get('publish_date') or '')[:10] or ALL
+        self.comments[channel_name] += 1
+        self.days.add(day)
+
+        author = comment.get('author_channel_id')
+        if author:
+            for scope in (ALL, channel_name):
+                self._pending_authors.setdefault(scope, []).append(author)
+
+        self._digest(ALL).add(likes)
+        self._digest(f"channel:{channel_name}").add(likes)
+        for keyword in comment.get('detected_keywords') or {}:
+            self.keywords.add(keyword)
+            self._digest(f"keyword:{keyword}").add(likes)
+            for channel in (channel_name, ALL):
+                self._pending_mentions[f"{keyword}\t{channel}\t{day}"] += 1
+                if day != ALL:
+                    self._pending_mentions[f"{keyword}\t{channel}\t{ALL}"] += 1
+
+    def add_new_comments(self, new_comments_only):
+        """Sketch a run's new comments (channel_id -> video_id -> {comments})."""
+        added = 0
+        for channel_data in (new_comments_only or {}).values():
+            for video_data in channel_data.values():
+                for comment in video_data.get('comments', []):
+                    self.add_comment(comment)
+                    added += 1
+        self.flush()
+        print(f"📐 Analytics sketches: +{added:,} comments ({sum(self.comments.values()):,} sketched)")
+        return added
+
+    def flush(self):
+        """Hash queued authors and mentions into the sketches."""
+        for scope, authors in self._pending_authors.items():
+            sketch = self.authors.get(scope)
+            if sketch is None:
+                sketch = self.authors[scope] = HyperLogLog()
+            sketch.add(authors)
+        self._pending_authors = {}
+
+        if self._pending_mentions:
+            self.mentions.add(list(self._pending_mentions), list(self._pending_mentions.values()), conservative=True)
+            self._pending_mentions = Counter()
+
+    def unique_commenters(self, channel=None):
+        """Estimated distinct author_channel_id values, for one channel or all of them."""
+        self.flush()
+        sketch = self.authors.get(channel or ALL)
+        return sketch.estimate() if sketch else 0
+
+    def keyword_mentions(self, keyword, channel=None, since=None, until=None):
+        """Estimated comments mentioning a keyword, optionally for one channel and a day range ('YYYY-MM-DD')."""
+        self.flush()
+        channel = channel or ALL
+        if since is None and until is None:
+            return int(self.mentions.estimate([f"{keyword}\t{channel}\t{ALL}"])[0])
+        days = [day for day in self.days
+                if day != ALL and (since is None or day >= since) and (until is None or day <= until)]
+        return int(self.mentions.estimate([f"{keyword}\t{channel}\t{day}" for day in days]).sum())
+
+    def like_percentiles(self, channel=None, keyword=None, percentiles=(50, 90, 99)):
+        """Estimated like-count percentiles of all comments, a channel's or a keyword's."""
+        scope = f"keyword:{keyword}" if keyword else f"channel:{channel}" if channel else ALL
+        digest = self.likes.get(scope)
+        return digest.percentiles(percentiles) if digest else {}
+
+    def dashboard(self):
+        """Per-channel commenters, comments and like percentiles, plus per-keyword mentions and likes."""
+        return {
+            'unique_commenters': self.unique_commenters(),
+            'channels': {
+                channel: {
+                    'comments': comments,
+                    'unique_commenters': self.unique_commenters(channel),
+                    'likes': self.like_percentiles(channel=channel)
+                }
+                for channel, comments in sorted(self.comments.items())
+            },
+            'keywords': {
+                keyword: {
+                    'mentions': self.keyword_mentions(keyword),
+                    'likes': self.like_percentiles(keyword=keyword)
+                }
+                for keyword in sorted(self.keywords)
+            }
+        }
+
+    def merge(self, other):
+        """Fold another SketchAnalytics (another run or worker) into this one."""
+        self.flush()
+        other.flush()
+        for scope, sketch in other.authors.items():
+            if scope in self.authors:
+                self.authors[scope].merge(sketch)
+            else:
+                self.authors[scope] = HyperLogLog(sketch.precision, sketch.registers.copy())
+        for scope, digest in other.likes.items():
+            self._digest(scope).merge(digest)
+        self.mentions.merge(other.mentions)
+        self.comments.update(other.comments)
+        self.days |= other.days
+        self.keywords |= other.keywords
+        return self
+
+    def to_dict(self):
+        self.flush()
+        return {
+            'authors': {scope: sketch.to_dict() for scope, sketch in self.authors.items()},
+            'likes': {scope: digest.to_dict() for scope, digest in self.likes.items()},
+            'mentions': self.mentions.to_dict(),
+            'comments': dict(self.comments),
+            'days': sorted(self.days),
+            'keywords': sorted(self.keywords)
+        }
+
+    def _restore(self, data):
+        self.authors = {scope: HyperLogLog.from_dict(sketch) for scope, sketch in data['authors'].items()}
+        self.likes = {scope: TDigest.from_dict(digest) for scope, digest in data['likes'].items()}
+        self.mentions = CountMinSketch.from_dict(data['mentions'])
+        self.comments = Counter(data['comments'])
+        self.days = set(data['days'])
+        self.keywords = set(data['keywords'])
+
+    def save(self):
+        """Persist every sketch (register and counter tables are zlib-compressed)."""
+        try:
+            data = self.to_dict()
+            tmp_path = self.sketch_file.with_name(self.sketch_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.sketch_file)
+        except Exception as e:
+            print(f"Error saving analytics sketches: {e}")
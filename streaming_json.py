@@ -0,0 +1,141 @@
+import json
+import os
+from itertools import chain
+from comment_record import json_default
+from compression_codecs import get_codec, iter_blocks, strip_codec_suffix
+from settings import (
+    JSON_PRETTY_PRINT,
+    STREAMING_WRITE_BUFFER_CHARS,
+    CHANNEL_FILE_CODEC,
+    CHANNEL_FILE_CODEC_LEVEL,
+    COMPRESSION_BLOCK_BYTES
+)
+
+STREAM_DEPTH = 2  # Nesting levels streamed item by item; deeper values are encoded whole
+
+
+class StreamingJSONWriter:
+    def __init__(self, pretty=JSON_PRETTY_PRINT, buffer_size=STREAMING_WRITE_BUFFER_CHARS, codec=None):
+        self.pretty = pretty
+        self.buffer_size = buffer_size
+        self.codec = codec or get_codec(CHANNEL_FILE_CODEC, CHANNEL_FILE_CODEC_LEVEL)
+
+    def _dumps(self, value):
+        if self.pretty:
+            return json.dumps(value, indent=2, ensure_ascii=False, default=json_default)
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+    def _dumps_key(self, key):
+        # Non-string keys are converted like json.dumps does (1 -> "1", True -> "true", None -> "null")
+        return self._dumps(key if isinstance(key, str) else json.dumps(key))
+
+    def iter_chunks(self, value, depth=0):
+        """Yield the JSON text of value in pieces, byte-identical to json.dumps with the writer's options.
+
+        Containers down to STREAM_DEPTH (a channel file's videos) are streamed item by item; each item
+        below that is a single json.dumps call, so the C encoder does the work instead of iterencode.
+        """
+        if depth >= STREAM_DEPTH or not isinstance(value, (dict, list, tuple)) or not value:
+            text = self._dumps(value)
+            yield text.replace('\n', '\n' + '  ' * depth) if self.pretty and depth else text
+            return
+
+        is_dict = isinstance(value, dict)
+        opening, closing = ('{', '}') if is_dict else ('[', ']')
+        if self.pretty:
+            separator, key_separator = ',\n' + '  ' * (depth + 1), ': '
+            yield opening + '\n' + '  ' * (depth + 1)
+        else:
+            separator, key_separator = ',', ':'
+            yield opening
+
+        for position, item in enumerate(value.items() if is_dict else value):
+            if position:
+                yield separator
+            if is_dict:
+                key, item = item
+                yield self._dumps_key(key) + key_separator
+            yield from self.iter_chunks(item, depth + 1)
+
+        yield ('\n' + '  ' * depth + closing) if self.pretty else closing
+
+    def iter_encoded(self, data):
+        """Yield UTF-8 encoded blocks of the JSON document without building the full string."""
+        pending = []
+        pending_chars = 0
+
+        for chunk in self.iter_chunks(data):
+            pending.append(chunk)
+            pending_chars += len(chunk)
+            if pending_chars >= self.buffer_size:
+                yield ''.join(pending).encode('utf-8')
+                pending = []
+                pending_chars = 0
+
+        if pending:
+            yield ''.join(pending).encode('utf-8')
+
+    def write(self, filepath, data, compress_over_mb=None):
+        """Stream data to filepath, switching to the writer's codec once the running size passes compress_over_mb.
+
+        Returns the final path (.json or .json + codec extension), the uncompressed byte count and whether it was compressed.
+        """
+        plain_path = self._plain_path(filepath)
+        threshold = compress_over_mb * 1024 * 1024 if compress_over_mb is not None else None
+        if not self.codec.extension:
+            threshold = None
+
+        tmp_path = plain_path.with_name(plain_path.name + '.tmp')
+        encoded_blocks = self.iter_encoded(data)
+        counter = {'bytes': 0}
+        compressed = False
+
+        try:
+            with open(tmp_path, 'wb') as output:
+                for block in encoded_blocks:
+                    output.write(block)
+                    counter['bytes'] += len(block)
+                    if threshold is not None and counter['bytes'] > threshold:
+                        compressed = True
+                        break
+
+            final_path = plain_path
+            if compressed:
+                # Crossed the limit: compress what we have plus the rest of the stream, block-parallel
+                final_path = self.codec.path_for(plain_path)
+                plain_tmp_path, tmp_path = tmp_path, final_path.with_name(final_path.name + '.tmp')
+
+                try:
+                    with open(plain_tmp_path, 'rb') as written_so_far, open(tmp_path, 'wb') as output:
+                        remaining = chain(
+                            iter(lambda: written_so_far.read(COMPRESSION_BLOCK_BYTES), b''),
+                            self._count_bytes(encoded_blocks, counter)
+                        )
+                        for frame in self.codec.compress_blocks(iter_blocks(remaining)):
+                            output.write(frame)
+                finally:
+                    os.remove(plain_tmp_path)
+
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            # Leave no partial .tmp file behind when encoding, compressing or writing fails
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        return {
+            'path': final_path,
+            'bytes_written': counter['bytes'],
+            'compressed': compressed
+        }
+
+    def _count_bytes(self, blocks, counter):
+        for block in blocks:
+            counter['bytes'] += len(block)
+            yield block
+
+    def _plain_path(self, filepath):
+        """Normalise a .json / .json.<codec> / extensionless path to its .json form."""
+        filepath = filepath.with_name(strip_codec_suffix(filepath.name))
+        if not filepath.name.endswith('.json'):
+            return filepath.with_name(filepath.name + '.json')
+        return filepath
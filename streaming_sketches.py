@@ -0,0 +1,296 @@
+import base64
+import hashlib
+import heapq
+import zlib
+import numpy as np
+from settings import COUNT_MIN_WIDTH, COUNT_MIN_DEPTH, HYPERLOGLOG_PRECISION, TDIGEST_COMPRESSION
+
+
+def hash64(items):
+    """Stable 64-bit hashes of strings as a uint64 array (same values in every run and process)."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little') for item in items),
+        dtype=np.uint64, count=len(items)
+    )
+
+
+def _pack(array):
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes(), 6)).decode('ascii')
+
+
+def _unpack(data, dtype, shape):
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype).reshape(shape).copy()
+
+
+class CountMinSketch:
+    # Approximate counts for an unbounded set of strings in depth x width counters. Estimates never
+    # undercount and overcount by at most e/width of the total with probability 1 - exp(-depth).
+    # Sketches with the same shape merge by adding their tables.
+    def __init__(self, width=COUNT_MIN_WIDTH, depth=COUNT_MIN_DEPTH, table=None, total=0):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.uint32)
+        self.total = total
+
+    def _columns(self, items):
+        # Double hashing: row r uses h1 + r * h2, both halves of one 64-bit hash
+        hashes = hash64(items)
+        low, high = hashes & np.uint64(0xffffffff), (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low[None, :] + rows * high[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, items, counts=None, conservative=False):
+        """Count a list of distinct strings (once each, or by the matching counts).
+
+        conservative only raises each item's counters to its new estimate, which keeps collisions
+        from inflating other items' counts; the sketch still merges by addition.
+        """
+        if not items:
+            return
+        counts = np.ones(len(items), dtype=np.uint32) if counts is None else np.asarray(counts, dtype=np.uint32)
+        columns = self._columns(items)
+        rows = np.arange(self.depth)[:, None]
+        if conservative:
+            estimates = self.table[rows, columns].min(axis=0) + counts
+            np.maximum.at(self.table, (rows, columns), np.broadcast_to(estimates, columns.shape))
+        else:
+            np.add.at(self.table, (rows, columns), np.broadcast_to(counts, columns.shape))
+        self.total += int(counts.sum())
+
+    def estimate(self, items):
+        """Estimated counts of a list of strings as an int64 array."""
+        if not items:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(items)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0).astype(np.int64)
+
+    def merge(self, other):
+        """Add another sketch of the same shape into this one."""
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        return {'width': self.width, 'depth': self.depth, 'total': self.total, 'table': _pack(self.table)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['width'], data['depth'],
+                   _unpack(data['table'], np.uint32, (data['depth'], data['width'])), data['total'])
+
+
+class SpaceSaving:
+    # Top-k heavy hitters in bounded memory: `capacity` (item, count, error) counters; a new item
+    # replaces the smallest counter and inherits its count as error. Any item with true count above
+    # total / capacity is guaranteed to be kept, and count - error is a lower bound on its true count.
+    def __init__(self, capacity, counts=None):
+        self.capacity = capacity
+        self.counts = {item: [count, error] for item, count, error in counts or []}
+        self._heap = [(count, item) for item, (count, _) in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def min_count(self):
+        """Smallest tracked count once full (the error bound of any untracked item), else 0."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counts.values())
+
+    def add(self, item, count=1):
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+            return
+
+        # Heap entries only lag behind increments; refresh them until the true minimum is on top
+        while self._heap[0][0] != self.counts[self._heap[0][1]][0]:
+            heapq.heapreplace(self._heap, (self.counts[self._heap[0][1]][0], self._heap[0][1]))
+        minimum, victim = self._heap[0]
+        del self.counts[victim]
+        self.counts[item] = [minimum + count, minimum]
+        heapq.heapreplace(self._heap, (minimum + count, item))
+
+    def add_counts(self, counter):
+        """Add a {item: count} mapping, larger counts first."""
+        for item, count in sorted(counter.items(), key=lambda pair: pair[1], reverse=True):
+            self.add(item, count)
+
+    def top(self, limit=None):
+        """(item, count, error) triples, highest count first."""
+        ranked = sorted(((item, count, error) for item, (count, error) in self.counts.items()),
+                        key=lambda entry: (entry[1], entry[0]), reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def merge(self, other):
+        """A new summary of both streams; items missing from a full summary get its minimum as error."""
+        own_floor, other_floor = self.min_count(), other.min_count()
+        merged = {}
+        for item in set(self.counts) | set(other.counts):
+            own = self.counts.get(item, [own_floor, own_floor])
+            theirs = other.counts.get(item, [other_floor, other_floor])
+            merged[item] = (own[0] + theirs[0], own[1] + theirs[1])
+        ranked = sorted(merged.items(), key=lambda pair: (pair[1][0], pair[0]), reverse=True)[:self.capacity]
+        return SpaceSaving(self.capacity, [(item, count, error) for item, (count, error) in ranked])
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'counts': [list(entry) for entry in self.top()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['capacity'], data['counts'])
+
+
+def _bit_length(values):
+    """Bit length of each uint64 (0 for 0), exact via frexp on the 32-bit halves."""
+    high, low = (values >> np.uint64(32)).astype(np.float64), (values & np.uint64(0xffffffff)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1]).astype(np.int64)
+
+
+class HyperLogLog:
+    # Distinct-count estimate from 2**precision one-byte registers (16 KB at precision 14, about
+    # 0.8% standard error). Each register keeps the longest run of leading zeros seen among the
+    # hashes routed to it; sketches merge by taking the register-wise maximum.
+    def __init__(self, precision=HYPERLOGLOG_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, items):
+        """Add a list of strings (repeats do not change the estimate)."""
+        if not items:
+            return
+        hashes = hash64(items)
+        remaining_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << remaining_bits) - 1)
+        ranks = (remaining_bits - _bit_length(remainder) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def __len__(self):
+        return self.estimate()
+
+    def estimate(self):
+        registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        raw = alpha * registers * registers / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are still empty
+        if raw <= 2.5 * registers and empty:
+            return int(round(registers * np.log(registers / empty)))
+        return int(round(raw))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': _pack(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['precision'], _unpack(data['registers'], np.uint8, (1 << data['precision'],)))
+
+
+class TDigest:
+    # Quantile sketch: values are buffered, then merged into at most ~compression centroids whose
+    # size limit follows the arcsine scale function, so the tails (p1, p99) stay precise while the
+    # middle is coarse. Digests merge by re-clustering each other's centroids.
+    def __init__(self, compression=TDIGEST_COMPRESSION, means=None, weights=None, minimum=None, maximum=None):
+        self.compression = compression
+        self.means = np.asarray(means if means is not None else [], dtype=np.float64)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=np.float64)
+        self.minimum = minimum
+        self.maximum = maximum
+        self._buffer = []  # (value, weight) pairs not yet clustered
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        if len(self._buffer) >= 20 * self.compression:
+            self._compress()
+
+    def add_many(self, values):
+        for value in values:
+            self.add(value)
+
+    def total(self):
+        self._compress()
+        return float(self.weights.sum())
+
+    def _scale(self, quantile):
+        return self.compression / (2 * np.pi) * np.arcsin(2 * quantile - 1)
+
+    def _scale_inverse(self, scale):
+        return (np.sin(min(scale * 2 * np.pi / self.compression, np.pi / 2)) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        values = np.array([value for value, _ in self._buffer], dtype=np.float64)
+        self.minimum = min(values.min(), self.minimum) if self.minimum is not None else values.min()
+        self.maximum = max(values.max(), self.maximum) if self.maximum is not None else values.max()
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, [weight for _, weight in self._buffer]])
+        self._buffer = []
+
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order].tolist(), weights[order].tolist()
+        total = sum(weights)
+        merged_means, merged_weights = [], []
+        current_mean, current_weight = means[0], weights[0]
+        done = 0.0
+        limit = self._scale_inverse(self._scale(0) + 1) * total
+        for mean, weight in zip(means[1:], weights[1:]):
+            if done + current_weight + weight <= limit:
+                current_mean += (mean - current_mean) * weight / (current_weight + weight)
+                current_weight += weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                done += current_weight
+                limit = self._scale_inverse(self._scale(done / total) + 1) * total
+                current_mean, current_weight = mean, weight
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+    def quantile(self, quantile):
+        """Estimated value at a quantile in [0, 1] (None while empty)."""
+        self._compress()
+        if not len(self.means):
+            return None
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(quantile * total, np.r_[0, centers, total],
+                               np.r_[self.minimum, self.means, self.maximum]))
+
+    def percentiles(self, percentiles=(50, 90, 99)):
+        return {f"p{percentile}": self.quantile(percentile / 100) for percentile in percentiles}
+
+    def merge(self, other):
+        other._compress()
+        if other.minimum is not None:
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+            self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self._buffer.extend(zip(other.means.tolist(), other.weights.tolist()))
+        self._compress()
+        return self
+
+    def to_dict(self):
+        self._compress()
+        return {
+            'compression': self.compression,
+            'means': [round(mean, 4) for mean in self.means.tolist()],
+            'weights': self.weights.tolist(),
+            'min': self.minimum,
+            'max': self.maximum
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['compression'], data['means'], data['weights'], data['min'], data['max'])
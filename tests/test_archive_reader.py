@@ -0,0 +1,65 @@
+import random
+import pytest
+from archive_catalog import ArchiveCatalog
+from archive_reader import ChannelArchiveReader, FramedFile
+from compression_codecs import available_codecs, get_codec, iter_blocks
+from segmented_archive import SegmentedChannelArchive
+from video_metadata_store import VideoMetadataStore
+
+
+@pytest.mark.parametrize('name', available_codecs())
+def test_framed_file_reads_any_byte_range(tmp_path, name):
+    codec = get_codec(name)
+    data = b''.join(f"record {i:05d} {'x' * (i % 37)}\n".encode('utf-8') for i in range(2000))
+    path = codec.path_for(tmp_path / 'records.jsonl')
+    with open(path, 'wb') as f:
+        frames = codec.write_frames(f, iter_blocks([data[i:i + 100] for i in range(0, len(data), 100)], block_bytes=4096))
+    assert len(frames) > 5
+
+    framed_file = FramedFile(path, frames)
+    rng = random.Random(7)
+    ranges = [(0, len(data)), (0, 1), (len(data) - 1, len(data))] + [
+        tuple(sorted(rng.sample(range(len(data) + 1), 2))) for _ in range(200)
+    ]
+    try:
+        for start, end in ranges:
+            assert framed_file.read_range(start, end) == data[start:end]
+    finally:
+        framed_file.close()
+
+
+@pytest.fixture
+def segment_archive(tmp_path):
+    return SegmentedChannelArchive(
+        tmp_path / 'segments',
+        codec=get_codec('gzip'),
+        catalog=ArchiveCatalog(tmp_path / 'catalog.json'),
+        video_store=VideoMetadataStore(tmp_path / 'video_metadata')
+    )
+
+
+def test_reader_fetches_each_video_from_segments(segment_archive, monkeypatch):
+    # Small blocks so videos straddle frame boundaries
+    monkeypatch.setattr('segmented_archive.iter_blocks', lambda chunks: iter_blocks(chunks, block_bytes=512))
+    for run in range(3):
+        channel_data = {
+            f"v{video}": {
+                'video_info': {'video_id': f"v{video}", 'title': f"Lecture {video}", 'view_count': run},
+                'comments': [{'comment_id': f"c{run}_{video}_{i}", 'text': 'well explained ' * (i + 1), 'likes': i}
+                             for i in range(video + 2)]
+            }
+            for video in range(run, run + 4)
+        }
+        segment_archive.append_segment('chan', 'UC1', 'Channel', channel_data, f"2024050{run + 1}_100000")
+
+    assert all(len(segment['frames']) > 1 for segment in segment_archive.load_manifest('chan')['segments'])
+
+    expected = segment_archive.load_channel_data('chan')['videos']
+    reader = ChannelArchiveReader.from_segments(segment_archive, 'chan')
+    reader.catalog, reader.video_store = segment_archive.catalog, segment_archive.video_store
+    with reader:
+        assert sorted(reader.video_ids()) == sorted(expected)
+        for video_id, video in expected.items():
+            assert reader.get_video(video_id) == video
+        assert reader.get_video('missing') is None
+        assert sum(1 for _ in reader.iter_comments()) == sum(len(video['comments']) for video in expected.values())
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from audience_overlap import AudienceOverlap, author_hash
+
+
+@pytest.fixture
+def overlap(tmp_path):
+    return AudienceOverlap(tmp_path / 'audience.npz', num_perm=128)
+
+
+def authors(start, stop):
+    return [f"UCauthor{i}" for i in range(start, stop)]
+
+
+def new_comments(channels):
+    """channel name -> list of author IDs, one comment each, in the add_new_comments layout."""
+    return {
+        f"UC{name}": {f"video_{name}": {'comments': [
+            {'comment_id': f"{name}_{i}", 'author_channel_id': author, 'source_channel': name}
+            for i, author in enumerate(author_ids)
+        ]}}
+        for name, author_ids in channels.items()
+    }
+
+
+def test_vectorized_signature_matches_minhasher(overlap):
+    author_ids = authors(0, 300)
+    hashes = {author_hash(author) for author in author_ids}
+    assert overlap.signature(hashes).tolist() == overlap.minhasher.signature(author_ids)
+
+
+def test_signature_of_a_union_is_the_element_wise_minimum(overlap):
+    first = {author_hash(author) for author in authors(0, 5000)}
+    second = {author_hash(author) for author in authors(3000, 20000)}
+    assert np.array_equal(overlap.signature(first | second),
+                          np.minimum(overlap.signature(first), overlap.signature(second)))
+
+
+def test_run_by_run_folding_equals_one_pass(tmp_path):
+    channels = {'A': authors(0, 400), 'B': authors(200, 900)}
+    one_pass = AudienceOverlap(tmp_path / 'one.npz', num_perm=128)
+    one_pass.add_new_comments(new_comments(channels))
+    folded = AudienceOverlap(tmp_path / 'folded.npz', num_perm=128)
+    folded.add_new_comments(new_comments({name: ids[:150] for name, ids in channels.items()}))
+    folded.add_new_comments(new_comments({name: ids[100:] for name, ids in channels.items()}))
+
+    for scope in ('channel:A', 'channel:B'):
+        assert np.array_equal(folded.signatures[folded.scopes[scope]], one_pass.signatures[one_pass.scopes[scope]])
+        assert folded.exact.get(scope) == one_pass.exact.get(scope)
+    assert 'channel:A' in folded.exact and 'channel:B' not in folded.exact  # B passed AUDIENCE_EXACT_MAX_AUTHORS
+
+
+@pytest.mark.parametrize('shared', [0, 1000, 3000, 6000])
+def test_estimated_jaccard_is_close_to_exact(tmp_path, monkeypatch, shared):
+    monkeypatch.setattr('audience_overlap.AUDIENCE_EXACT_MAX_AUTHORS', 100000)
+    overlap = AudienceOverlap(tmp_path / 'audience.npz', num_perm=256)
+    overlap.add_new_comments(new_comments({'A': authors(0, 6000), 'B': authors(6000 - shared, 12000 - shared)}))
+
+    exact = overlap.overlap('channel:A', 'channel:B', exact=True)
+    estimate = overlap.overlap('channel:A', 'channel:B')
+    assert exact['exact'] and not estimate['exact']
+    assert exact['jaccard'] == pytest.approx(shared / (12000 - shared))
+    # Standard error of a 256-slot estimate is at most 0.5 / sqrt(256) ~ 0.03
+    assert abs(estimate['jaccard'] - exact['jaccard']) < 0.1
+    assert abs(overlap.audience_size('channel:A') - 6000) / 6000 < 0.2 or 'channel:A' in overlap.exact
+
+
+def test_small_audiences_drop_exact_sets_past_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr('audience_overlap.AUDIENCE_EXACT_MAX_AUTHORS', 50)
+    overlap = AudienceOverlap(tmp_path / 'audience.npz', num_perm=128)
+    overlap.add_new_comments(new_comments({'Small': authors(0, 30), 'Large': authors(0, 80)}))
+    assert overlap.audience_size('channel:Small') == 30
+    assert 'channel:Large' not in overlap.exact
+    assert overlap.overlap('channel:Small', 'channel:Large', exact=True)['exact'] is False
+
+
+def test_save_and_load_round_trip(tmp_path):
+    overlap = AudienceOverlap(tmp_path / 'audience.npz', num_perm=128)
+    overlap.add_new_comments(new_comments({'A': authors(0, 300), 'B': authors(100, 450), 'C': authors(400, 1200)}))
+    overlap.save()
+
+    reloaded = AudienceOverlap(tmp_path / 'audience.npz', num_perm=128)
+    assert reloaded.scopes == overlap.scopes
+    assert np.array_equal(reloaded.signatures, overlap.signatures)
+    assert reloaded.exact == overlap.exact
+    assert reloaded.top_channel_overlaps() == overlap.top_channel_overlaps()
+    for exact in (False, True):
+        assert reloaded.overlap('channel:A', 'channel:B', exact=exact) == overlap.overlap('channel:A', 'channel:B', exact=exact)
+
+    # Later runs keep folding into the reloaded signatures
+    reloaded.add_new_comments(new_comments({'A': authors(350, 450)}))
+    assert reloaded.overlap('channel:A', 'channel:B', exact=True)['shared_authors'] == 200 + 100
+
+
+def test_changed_signature_length_starts_fresh(tmp_path):
+    overlap = AudienceOverlap(tmp_path / 'audience.npz', num_perm=128)
+    overlap.add_new_comments(new_comments({'A': authors(0, 10)}))
+    overlap.save()
+    reloaded = AudienceOverlap(tmp_path / 'audience.npz', num_perm=64)
+    assert reloaded.signatures.shape == (0, 64)
+    assert reloaded.overlap('channel:A', 'channel:A') is None
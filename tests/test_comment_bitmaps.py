@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from comment_bitmaps import ARRAY_LIMIT, CommentBitmapIndex, RoaringBitmap
+from comment_ordinals import CommentOrdinals
+
+
+def sample_sets():
+    """Value sets mixing empty, sparse (array) and dense (bitmap) chunks, including both sides of ARRAY_LIMIT."""
+    rng = np.random.default_rng(3)
+    return {
+        'empty': np.zeros(0, dtype=np.int64),
+        'sparse': rng.choice(1 << 20, 500, replace=False),
+        'at_limit': np.arange(ARRAY_LIMIT) * 3,
+        'over_limit': np.arange(ARRAY_LIMIT + 1) * 3,
+        'dense': np.r_[np.arange(40000), (1 << 16) + rng.choice(1 << 16, 30000, replace=False), [5 << 16]],
+        'mixed': np.r_[rng.choice(3 << 16, 20000, replace=False), np.arange(2 << 16, (2 << 16) + 9000)],
+    }
+
+
+SETS = sample_sets()
+
+
+@pytest.mark.parametrize('name', SETS)
+def test_array_and_serialization_round_trip(name):
+    values = np.unique(SETS[name])
+    bitmap = RoaringBitmap.from_array(values)
+    assert bitmap.to_array().tolist() == values.tolist()
+    assert len(bitmap) == len(values)
+
+    restored = RoaringBitmap.deserialize(*bitmap.serialize())
+    assert restored.to_array().tolist() == values.tolist()
+    for high, container in bitmap.containers.items():
+        assert restored.containers[high].dtype == container.dtype
+
+
+@pytest.mark.parametrize('left', SETS)
+@pytest.mark.parametrize('right', ['sparse', 'over_limit', 'dense', 'mixed'])
+def test_set_operations_match_numpy(left, right):
+    a, b = np.unique(SETS[left]), np.unique(SETS[right])
+    bitmap_a, bitmap_b = RoaringBitmap.from_array(a), RoaringBitmap.from_array(b)
+    assert (bitmap_a & bitmap_b).to_array().tolist() == np.intersect1d(a, b).tolist()
+    assert (bitmap_a | bitmap_b).to_array().tolist() == np.union1d(a, b).tolist()
+    assert (bitmap_a - bitmap_b).to_array().tolist() == np.setdiff1d(a, b).tolist()
+
+
+def test_membership():
+    values = np.unique(SETS['mixed'])
+    bitmap = RoaringBitmap.from_array(values)
+    members = set(values.tolist())
+    for value in values[:50].tolist() + [0, 1, (1 << 16) - 1, 3 << 16, (2 << 16) + 8999, 7 << 20]:
+        assert (value in bitmap) == (value in members)
+
+
+def make_comments():
+    comments = []
+    for i in range(60):
+        keywords = {}
+        if i % 2 == 0:
+            keywords['explanation'] = ['explain']
+        if i % 3 == 0:
+            keywords['boring'] = ['boring']
+        comments.append({
+            'comment_id': f"c{i}", 'likes': i, 'detected_keywords': keywords,
+            'source_channel': 'ALLEN' if i % 4 else 'Aakash',
+            'sentiment_category': 'negative' if i % 3 == 0 else 'positive',
+            'publish_date': f"2024-0{1 + i % 3}-10T10:00:00Z"
+        })
+    return comments
+
+
+def expected(predicate):
+    return [i for i, comment in enumerate(make_comments()) if predicate(comment)]
+
+
+def test_index_queries_survive_save_and_reload(tmp_path):
+    comments = make_comments()
+    index = CommentBitmapIndex(tmp_path / 'bitmaps.npz', ordinals=CommentOrdinals(tmp_path / 'ordinals'))
+    index.add_new_comments({'UC1': {'v1': {'comments': comments[:30]}}})
+    index.save()
+    index.add_new_comments({'UC1': {'v1': {'comments': comments[30:]}}})
+    index.save()
+
+    reloaded = CommentBitmapIndex(tmp_path / 'bitmaps.npz', ordinals=CommentOrdinals(tmp_path / 'ordinals'))
+    for bitmaps in (index, reloaded):
+        assert bitmaps.select(keyword='explanation', channel='ALLEN').to_array().tolist() == expected(
+            lambda c: 'explanation' in c['detected_keywords'] and c['source_channel'] == 'ALLEN')
+        assert bitmaps.select(keyword=['explanation', 'boring'], month='2024-02', min_likes=20).to_array().tolist() == expected(
+            lambda c: c['detected_keywords'] and c['publish_date'].startswith('2024-02') and c['likes'] >= 20)
+        assert bitmaps.select(exclude={'sentiment': 'negative'}).to_array().tolist() == expected(
+            lambda c: c['sentiment_category'] != 'negative')
+        assert bitmaps.count(keyword='boring') == len(expected(lambda c: 'boring' in c['detected_keywords']))
+        assert bitmaps.values('month') == ['2024-01', '2024-02', '2024-03']
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from comment_ordinals import CommentOrdinals
+from comment_search_index import (
+    CommentSearchIndex, decode_varints, delta_decode, delta_encode, encode_varints, tokenize
+)
+
+TEXTS = [
+    'sir please explain organic chemistry again',
+    'best explanation of organic chemistry ever',
+    'physics numericals please sir',
+    'chemistry explain karo sir please',
+    'thank you sir best teacher',
+    'please upload physics notes',
+    'organic reactions explained very well',
+    'sir organic chemistry please',
+]
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 21, 2 ** 35 + 5, 2 ** 52], dtype=np.int64)
+    data, lengths = encode_varints(values)
+    assert lengths.tolist() == [1, 1, 1, 2, 2, 2, 3, 4, 6, 8]
+    assert len(data) == lengths.sum()
+    assert decode_varints(data).tolist() == values.tolist()
+    assert decode_varints(b'').tolist() == []
+
+
+def test_delta_round_trip_with_empty_groups():
+    lengths = np.array([3, 0, 1, 4, 0], dtype=np.int64)
+    values = np.array([2, 5, 9, 7, 1, 1, 4, 20], dtype=np.int64)
+    deltas = delta_encode(values, lengths)
+    assert deltas.tolist() == [2, 3, 4, 7, 1, 0, 3, 16]
+    assert delta_decode(deltas, lengths).tolist() == values.tolist()
+
+
+def expected_ordinals(predicate):
+    return [ordinal for ordinal, text in enumerate(TEXTS) if predicate(tokenize(text))]
+
+
+def has_phrase(tokens, phrase):
+    words = phrase.split()
+    return any(tokens[i:i + len(words)] == words for i in range(len(tokens)))
+
+
+QUERIES = {
+    'chemistry': lambda tokens: 'chemistry' in tokens,
+    'organic chemistry': lambda tokens: 'organic' in tokens and 'chemistry' in tokens,
+    '"organic chemistry"': lambda tokens: has_phrase(tokens, 'organic chemistry'),
+    'physics OR organic': lambda tokens: 'physics' in tokens or 'organic' in tokens,
+    'sir -chemistry': lambda tokens: 'sir' in tokens and 'chemistry' not in tokens,
+    'please NOT sir': lambda tokens: 'please' in tokens and 'sir' not in tokens,
+    '(physics OR chemistry) please': lambda tokens: ('physics' in tokens or 'chemistry' in tokens) and 'please' in tokens,
+    '"sir please"': lambda tokens: has_phrase(tokens, 'sir please'),
+    'missingword': lambda tokens: False,
+}
+
+
+def build_index(tmp_path, runs=2):
+    ordinals = CommentOrdinals(tmp_path / 'ordinals')
+    index = CommentSearchIndex(tmp_path / 'search', ordinals=ordinals)
+    # Comments are registered in text order, so ordinal i is TEXTS[i]; each run becomes one segment
+    per_run = -(-len(TEXTS) // runs)
+    for run in range(runs):
+        comments = [{'comment_id': f"c{i}", 'cleaned_text': TEXTS[i], 'likes': i, 'source_channel': 'Chan',
+                     'publish_date': '2024-05-01T10:00:00Z'}
+                    for i in range(run * per_run, min((run + 1) * per_run, len(TEXTS)))]
+        index.add_new_comments({'UC1': {'v1': {'comments': comments}}})
+        index.save()
+    return index
+
+
+def assert_queries(index):
+    for query, predicate in QUERIES.items():
+        assert index.matching_ordinals(query).tolist() == expected_ordinals(predicate), query
+
+
+def test_queries_match_a_full_scan(tmp_path):
+    index = build_index(tmp_path)
+    assert len(index.segments) == 2
+    assert_queries(index)
+
+
+def test_saved_index_reloads_with_the_same_results(tmp_path):
+    build_index(tmp_path)
+    reloaded = CommentSearchIndex(tmp_path / 'search', ordinals=CommentOrdinals(tmp_path / 'ordinals'))
+    assert reloaded.indexed_comments == len(TEXTS)
+    assert_queries(reloaded)
+
+
+def test_compaction_preserves_every_posting(tmp_path, monkeypatch):
+    monkeypatch.setattr('comment_search_index.SEARCH_INDEX_COMPACTION_THRESHOLD', 3)
+    index = build_index(tmp_path, runs=4)
+    assert len(index.segments) == 2  # Three segments merged into one, then the fourth run
+    assert len(list((tmp_path / 'search').glob('segment_*.npz'))) == 2
+    assert_queries(index)
+    assert_queries(CommentSearchIndex(tmp_path / 'search', ordinals=CommentOrdinals(tmp_path / 'ordinals')))
+
+
+def test_known_comments_are_not_indexed_twice(tmp_path):
+    index = build_index(tmp_path)
+    assert index.add_new_comments({'UC1': {'v1': {'comments': [{'comment_id': 'c0', 'cleaned_text': TEXTS[0]}]}}}) == 0
+
+
+@pytest.mark.parametrize('min_likes', [0, 3, 7])
+def test_like_filter_uses_refreshed_likes(tmp_path, min_likes):
+    index = build_index(tmp_path)
+    index.ordinals.refresh_likes({'UC1': {'v1': {'comments': [{'comment_id': 'c0', 'likes': 50}]}}})
+    likes = {ordinal: (50 if ordinal == 0 else ordinal) for ordinal in range(len(TEXTS))}
+    expected = [ordinal for ordinal in expected_ordinals(QUERIES['chemistry']) if likes[ordinal] >= min_likes]
+    assert index.matching_ordinals('chemistry', min_likes=min_likes).tolist() == expected
@@ -0,0 +1,52 @@
+import io
+import pytest
+from compression_codecs import CODECS, available_codecs, codec_for_path, get_codec, iter_blocks, strip_codec_suffix
+
+CODEC_NAMES = available_codecs()
+
+
+def sample_chunks(count=400):
+    return [f'{{"comment_id":"c{i}","text":"line {i} of the sample"}}\n'.encode('utf-8') for i in range(count)]
+
+
+@pytest.mark.parametrize('name', CODEC_NAMES)
+def test_frames_round_trip_and_table_matches_blocks(name):
+    codec = get_codec(name)
+    blocks = list(iter_blocks(sample_chunks(), block_bytes=1000))
+    output = io.BytesIO()
+
+    frames = codec.write_frames(output, iter(blocks), workers=3)
+    data = output.getvalue()
+
+    assert codec.decompress(data) == b''.join(blocks)
+    assert len(frames) == len(blocks)
+    assert [uncompressed for _, uncompressed in frames] == [sum(map(len, blocks[:i])) for i in range(len(blocks))]
+    # Every frame decompresses on its own to exactly its block
+    ends = [compressed for compressed, _ in frames[1:]] + [len(data)]
+    for (start, _), end, block in zip(frames, ends, blocks):
+        assert codec.decompress(data[start:end]) == block
+
+
+def test_blocks_end_on_chunk_boundaries():
+    chunks = sample_chunks(50)
+    blocks = list(iter_blocks(chunks, block_bytes=300))
+    assert b''.join(blocks) == b''.join(chunks)
+    assert all(block.endswith(b'\n') for block in blocks)
+
+
+@pytest.mark.parametrize('name', [name for name in CODEC_NAMES if CODECS[name].extension])
+def test_codec_for_path_reads_its_own_files(tmp_path, name):
+    codec = get_codec(name)
+    path = codec.path_for(tmp_path / 'comments_x.json')
+    with open(path, 'wb') as f:
+        codec.write_frames(f, iter_blocks(sample_chunks(), block_bytes=500))
+
+    assert type(codec_for_path(path)) is type(codec)
+    assert strip_codec_suffix(path.name) == 'comments_x.json'
+    with codec_for_path(path).open_reader(path) as f:
+        assert f.read() == b''.join(sample_chunks())
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        get_codec('brotli')
@@ -0,0 +1,114 @@
+import pytest
+from archive_catalog import ArchiveCatalog
+from archive_reader import ChannelArchiveReader
+from compression_codecs import get_codec
+from rolling_channel_files import RollingChannelFiles
+from video_metadata_store import VideoMetadataStore
+
+
+def make_video(video_id, comment_ids):
+    return {
+        'video_info': {'video_id': video_id, 'title': f"Lecture {video_id}", 'view_count': 10},
+        'comments': [{'comment_id': comment_id, 'text': 'thank you sir ' * 10, 'likes': 1} for comment_id in comment_ids]
+    }
+
+
+def make_channel_file_data(videos):
+    total_comments = sum(len(video['comments']) for video in videos.values())
+    return {
+        'channel_info': {'channel_id': 'UC1', 'channel_name': 'Channel', 'total_videos': len(videos),
+                         'total_comments': total_comments},
+        'videos': videos,
+        'comments_summary': {'total_comments': total_comments, 'videos_with_comments': len(videos)}
+    }
+
+
+@pytest.fixture
+def rolling_files(tmp_path):
+    raw_dir = tmp_path / 'raw'
+    raw_dir.mkdir()
+    return RollingChannelFiles(
+        raw_dir,
+        max_part_mb=0.002,  # About 2 KB per part, so a few videos fill one
+        codec=get_codec('gzip'),
+        catalog=ArchiveCatalog(tmp_path / 'catalog.json'),
+        video_store=VideoMetadataStore(tmp_path / 'video_metadata')
+    )
+
+
+def comment_ids(videos):
+    return {video_id: [comment['comment_id'] for comment in video['comments']] for video_id, video in videos.items()}
+
+
+def initial_videos():
+    return {f"v{i}": make_video(f"v{i}", [f"c{i}_{j}" for j in range(3)]) for i in range(8)}
+
+
+def test_write_channel_round_trip(rolling_files):
+    videos = initial_videos()
+    index_path, index = rolling_files.write_channel('chan', make_channel_file_data(videos))
+
+    assert len(index['parts']) > 1
+    assert set(index['video_parts']) == set(videos)
+    loaded = rolling_files.load_channel_data(index_path)
+    assert comment_ids(loaded['videos']) == comment_ids(videos)
+    assert loaded['videos']['v3']['video_info']['title'] == 'Lecture v3'
+
+    with ChannelArchiveReader.from_channel_file(index_path) as reader:
+        reader.catalog, reader.video_store = rolling_files.catalog, rolling_files.video_store
+        for video_id, video in loaded['videos'].items():
+            assert reader.get_video(video_id) == video
+
+
+def test_update_channel_rewrites_touched_parts_under_fresh_numbers(rolling_files):
+    index_path, index = rolling_files.write_channel('chan', make_channel_file_data(initial_videos()))
+    old_files = {part['part']: rolling_files.raw_data_dir / part['file'] for part in index['parts']}
+    touched = index['video_parts']['v0']
+
+    new_index, touched_count = rolling_files.update_channel(
+        index_path, {'v0': make_video('v0', ['new_0']), 'v9': make_video('v9', ['new_9'])}, '20240502_100000'
+    )
+
+    assert touched_count == 2  # v0's part and the last part for the new video
+    assert min(part['part'] for part in new_index['parts'] if part['part'] not in old_files) > max(old_files)
+    assert not old_files[touched].exists()
+    assert all((rolling_files.raw_data_dir / part['file']).exists() for part in new_index['parts'])
+    assert new_index['channel_info']['total_comments'] == 8 * 3 + 2
+
+    expected = comment_ids(initial_videos())
+    expected['v0'].append('new_0')
+    expected['v9'] = ['new_9']
+    assert comment_ids(rolling_files.load_channel_data(index_path)['videos']) == expected
+
+
+def test_interrupted_update_keeps_the_previous_index_readable(rolling_files, monkeypatch):
+    index_path, _ = rolling_files.write_channel('chan', make_channel_file_data(initial_videos()))
+    before = comment_ids(rolling_files.load_channel_data(index_path)['videos'])
+
+    def crash(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(rolling_files, '_write_index', crash)
+    with pytest.raises(OSError):
+        rolling_files.update_channel(index_path, {'v0': make_video('v0', ['new_0'])}, '20240502_100000')
+    monkeypatch.undo()
+
+    assert comment_ids(rolling_files.load_channel_data(index_path)['videos']) == before
+
+
+def test_rewrite_part_and_update_parts(rolling_files):
+    index_path, index = rolling_files.write_channel('chan', make_channel_file_data(initial_videos()))
+    part = index['parts'][0]
+    part_path = rolling_files.raw_data_dir / part['file']
+    videos = rolling_files.load_parts(index_path, {part['part']})
+    for video in videos.values():
+        for comment in video['comments']:
+            comment['detected_keywords'] = {'explanation': ['explain']}
+
+    result = rolling_files.rewrite_part(part_path, videos)
+    assert rolling_files.update_parts(index_path, {part['file']: result}) == 1
+
+    with ChannelArchiveReader.from_channel_file(index_path) as reader:
+        reader.catalog, reader.video_store = rolling_files.catalog, rolling_files.video_store
+        for video_id in videos:
+            assert all(comment['detected_keywords'] for comment in reader.get_video(video_id)['comments'])
@@ -0,0 +1,107 @@
+import pytest
+from archive_catalog import ArchiveCatalog
+from compression_codecs import get_codec
+from segmented_archive import SegmentedChannelArchive
+from video_metadata_store import VideoMetadataStore
+
+
+def make_comment(comment_id, likes=0, text='nice explanation sir'):
+    return {'comment_id': comment_id, 'text': text, 'cleaned_text': text, 'likes': likes,
+            'author': 'student', 'publish_date': '2024-05-01T10:00:00Z'}
+
+
+def make_channel_data(video_comments):
+    """video_id -> [comments] as channel data with a small video_info per video."""
+    return {
+        video_id: {
+            'video_info': {'video_id': video_id, 'title': f"Lecture {video_id}", 'view_count': 100},
+            'comments': comments
+        }
+        for video_id, comments in video_comments.items()
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return SegmentedChannelArchive(
+        tmp_path / 'segments',
+        codec=get_codec('gzip'),
+        catalog=ArchiveCatalog(tmp_path / 'catalog.json'),
+        video_store=VideoMetadataStore(tmp_path / 'video_metadata')
+    )
+
+
+def comment_ids(channel_data):
+    return {video_id: [comment['comment_id'] for comment in video['comments']]
+            for video_id, video in channel_data['videos'].items()}
+
+
+def test_appended_segments_round_trip(archive):
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('a'), make_comment('b')]}),
+                           '20240501_100000')
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('c')],
+                                                                         'v2': [make_comment('d')]}),
+                           '20240502_100000')
+
+    loaded = archive.load_channel_data('chan')
+    assert comment_ids(loaded) == {'v1': ['a', 'b', 'c'], 'v2': ['d']}
+    assert loaded['videos']['v2']['video_info']['title'] == 'Lecture v2'
+    assert loaded['channel_info']['total_comments'] == 4
+    assert archive.load_manifest('chan')['video_ids'] == ['v1', 'v2']
+
+
+def test_compaction_keeps_newest_copy_of_each_comment(archive):
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('a', 1), make_comment('b')]}),
+                           '20240501_100000')
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('a', 9)],
+                                                                         'v2': [make_comment('c')]}),
+                           '20240502_100000')
+    old_files = [archive.channel_dir('chan') / segment['file'] for segment in archive.load_manifest('chan')['segments']]
+
+    archive.compact_channel('chan', '20240503_100000')
+
+    manifest = archive.load_manifest('chan')
+    assert len(manifest['segments']) == 1
+    assert manifest['segments'][0]['compacted_files'] == [path.name for path in old_files]
+    assert manifest['channel_info']['total_comments'] == 3
+    assert not any(path.exists() for path in old_files)
+
+    loaded = archive.load_channel_data('chan')
+    assert comment_ids(loaded) == {'v1': ['a', 'b'], 'v2': ['c']}
+    assert loaded['videos']['v1']['comments'][0]['likes'] == 9
+
+
+def test_interrupted_compaction_leaves_previous_segments_readable(archive, monkeypatch):
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('a')]}), '20240501_100000')
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('b')]}), '20240502_100000')
+    before = archive.load_channel_data('chan')
+    write_manifest = archive._write_manifest
+    calls = []
+
+    def crash_on_swap(safe_channel_name, manifest):
+        calls.append(manifest)
+        if len(calls) == 2:  # The first write only reserves the segment number
+            raise OSError('disk full')
+        write_manifest(safe_channel_name, manifest)
+
+    monkeypatch.setattr(archive, '_write_manifest', crash_on_swap)
+    with pytest.raises(OSError):
+        archive.compact_channel('chan', '20240503_100000')
+    monkeypatch.undo()
+
+    assert archive.load_channel_data('chan')['videos'] == before['videos']
+    # The next compaction takes a fresh segment number and completes
+    assert archive.compact_channel('chan', '20240504_100000')
+    assert comment_ids(archive.load_channel_data('chan')) == {'v1': ['a', 'b']}
+
+
+def test_segment_written_without_manifest_is_ignored(archive):
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('a')]}), '20240501_100000')
+    # A crash after the segment write but before the manifest: the stray file is not referenced
+    stray = archive.channel_dir('chan') / archive._segment_name(99, '20240502_100000')
+    archive._write_segment(stray, archive._channel_records(make_channel_data({'v1': [make_comment('lost')]})))
+    (archive.channel_dir('chan') / 'segment_00100_x.jsonl.gz.tmp').write_bytes(b'partial')
+
+    assert comment_ids(archive.load_channel_data('chan')) == {'v1': ['a']}
+    archive.append_segment('chan', 'UC1', 'Channel', make_channel_data({'v1': [make_comment('b')]}), '20240503_100000')
+    assert comment_ids(archive.load_channel_data('chan')) == {'v1': ['a', 'b']}
@@ -0,0 +1,171 @@
+import json
+from collections import Counter
+import numpy as np
+import pytest
+from streaming_sketches import CountMinSketch, HyperLogLog, SpaceSaving, TDigest
+
+
+def zipf_stream(count, distinct, seed):
+    """Skewed stream of 'term<N>' strings, as comment terms are."""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.3, count), distinct)
+    return [f"term{rank}" for rank in ranks.tolist()]
+
+
+def counts_of(stream):
+    counter = Counter(stream)
+    return list(counter), list(counter.values())
+
+
+def test_count_min_merge_equals_one_sketch_of_both_streams():
+    first, second = zipf_stream(5000, 2000, 1), zipf_stream(5000, 2000, 2)
+    left, right, whole = (CountMinSketch(width=512, depth=4) for _ in range(3))
+    left.add(*counts_of(first))
+    right.add(*counts_of(second))
+    whole.add(*counts_of(first))
+    whole.add(*counts_of(second))
+
+    merged = left.merge(right)
+    assert np.array_equal(merged.table, whole.table)
+    assert merged.total == whole.total == 10000
+
+
+@pytest.mark.parametrize('conservative', [False, True])
+def test_count_min_never_undercounts(conservative):
+    stream = zipf_stream(20000, 5000, 3)
+    sketch = CountMinSketch(width=1024, depth=4)
+    for start in range(0, len(stream), 1000):
+        sketch.add(*counts_of(stream[start:start + 1000]), conservative=conservative)
+
+    items, true_counts = counts_of(stream)
+    estimates = sketch.estimate(items)
+    assert (estimates >= np.array(true_counts)).all()
+    # Overcount bound e / width * total, allowing for the failure probability
+    assert np.mean(estimates - np.array(true_counts) <= np.e / 1024 * len(stream)) > 0.95
+
+
+def test_count_min_serialization_round_trip():
+    sketch = CountMinSketch(width=256, depth=3)
+    sketch.add(*counts_of(zipf_stream(3000, 500, 4)))
+    restored = CountMinSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert np.array_equal(restored.table, sketch.table)
+    assert (restored.width, restored.depth, restored.total) == (256, 3, 3000)
+
+
+def assert_space_saving_bounds(summary, stream):
+    true_counts = Counter(stream)
+    for item, count, error in summary.top():
+        assert count - error <= true_counts[item] <= count
+    # Every item above total / capacity is tracked
+    heavy = {item for item, count in true_counts.items() if count > len(stream) / summary.capacity}
+    assert heavy <= set(summary.counts)
+
+
+def test_space_saving_is_exact_below_capacity():
+    stream = zipf_stream(2000, 30, 5)
+    summary = SpaceSaving(50)
+    for item in stream:
+        summary.add(item)
+    assert {item: count for item, count, _ in summary.top()} == Counter(stream)
+    assert summary.min_count() == 0
+
+
+def test_space_saving_bounds_and_merge():
+    first, second = zipf_stream(20000, 3000, 6), zipf_stream(20000, 3000, 7)
+    left, right = SpaceSaving(100), SpaceSaving(100)
+    for item in first:
+        left.add(item)
+    right.add_counts(Counter(second))
+    assert_space_saving_bounds(left, first)
+    assert_space_saving_bounds(right, second)
+
+    merged = left.merge(right)
+    assert len(merged) == 100
+    assert_space_saving_bounds(merged, first + second)
+
+
+def test_space_saving_serialization_round_trip():
+    summary = SpaceSaving(20)
+    for item in zipf_stream(3000, 200, 8):
+        summary.add(item)
+    restored = SpaceSaving.from_dict(json.loads(json.dumps(summary.to_dict())))
+    assert restored.top() == summary.top()
+    restored.add('new_term', 1000)
+    assert restored.top(1)[0][0] == 'new_term'
+
+
+def test_hyperloglog_merge_equals_one_sketch_of_the_union():
+    first = [f"author{i}" for i in range(0, 30000)]
+    second = [f"author{i}" for i in range(20000, 60000)]
+    left, right, whole = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left.add(first)
+    right.add(second)
+    whole.add(first + second)
+
+    merged = left.merge(right)
+    assert np.array_equal(merged.registers, whole.registers)
+    assert abs(merged.estimate() - 60000) / 60000 < 0.03
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 100000])
+def test_hyperloglog_estimates_and_ignores_repeats(distinct):
+    sketch = HyperLogLog()
+    items = [f"author{i}" for i in range(distinct)]
+    sketch.add(items)
+    registers = sketch.registers.copy()
+    sketch.add(items[:distinct // 2])
+    assert np.array_equal(sketch.registers, registers)
+    assert abs(sketch.estimate() - distinct) / distinct < 0.03
+
+
+def test_hyperloglog_serialization_round_trip():
+    sketch = HyperLogLog(precision=10)
+    sketch.add([f"author{i}" for i in range(5000)])
+    restored = HyperLogLog.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert np.array_equal(restored.registers, sketch.registers)
+    assert restored.estimate() == sketch.estimate()
+
+
+def like_counts(count, seed):
+    """Heavy-tailed like counts, as comment likes are."""
+    return np.floor(np.random.default_rng(seed).pareto(1.5, count) * 3).tolist()
+
+
+def assert_quantiles_close(digest, values):
+    for quantile in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, quantile)
+        # Rank error: the estimate must fall between the exact values about 1% of ranks either side
+        low, high = np.quantile(values, [max(quantile - 0.01, 0), min(quantile + 0.01, 1)])
+        assert low - 1e-9 <= digest.quantile(quantile) <= high + 1e-9, (quantile, exact)
+    assert digest.quantile(0) == min(values)
+    assert digest.quantile(1) == max(values)
+
+
+def test_tdigest_quantiles_and_bounded_size():
+    values = like_counts(50000, 9)
+    digest = TDigest()
+    digest.add_many(values)
+    assert digest.total() == len(values)
+    assert len(digest.means) <= digest.compression
+    assert_quantiles_close(digest, values)
+
+
+def test_tdigest_merge_matches_the_combined_stream():
+    first, second = like_counts(30000, 10), like_counts(20000, 11)
+    left, right = TDigest(), TDigest()
+    left.add_many(first)
+    right.add_many(second)
+
+    merged = left.merge(right)
+    assert merged.total() == len(first) + len(second)
+    assert_quantiles_close(merged, first + second)
+
+
+def test_tdigest_serialization_round_trip():
+    digest = TDigest()
+    digest.add_many(like_counts(10000, 12))
+    restored = TDigest.from_dict(json.loads(json.dumps(digest.to_dict())))
+    assert restored.total() == digest.total()
+    for quantile in (0.01, 0.5, 0.9, 0.99):
+        assert restored.quantile(quantile) == pytest.approx(digest.quantile(quantile), abs=1e-3)
+    assert TDigest().quantile(0.5) is None
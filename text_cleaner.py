@@ -1,7 +1,9 @@
 import re
 import unicodedata
-from typing import List, Dict
-from settings import ALL_KEYWORDS  # ← REMOVED unused TARGET_KEYWORDS import
+from functools import lru_cache
+from typing import List, Dict, Iterable, Tuple
+from keyword_matcher import KeywordMatcher
+from settings import KEYWORD_BITS, SENTIMENT_CODES, TEXT_CACHE_SIZE, TEXT_CACHE_MAX_LENGTH  # ← REMOVED unused TARGET_KEYWORDS import
 
 class TextCleaner:
     def __init__(self):
@@ -20,6 +22,13 @@ class TextCleaner:
         self.url_pattern = re.compile(r'https?://[a-zA-Z0-9$\-_@.&+!*\\(),/%]+')
         self.mention_pattern = re.compile(r'@\w+')
         self.hashtag_pattern = re.compile(r'#\w+')
+        self.whitespace_pattern = re.compile(r'\s+')
+
+        # Compiled once from ALL_KEYWORDS; finds every variation in a single pass
+        self.keyword_matcher = KeywordMatcher()
+
+        # Short texts ("Nice", "Thank you sir") repeat across channels; memoise the whole pipeline
+        self._process_cached = lru_cache(maxsize=TEXT_CACHE_SIZE)(self._process_text_uncached)
 
     def clean_text(self, text: str, remove_emojis: bool = False, remove_urls: bool = True,
                    remove_mentions: bool = False, remove_hashtags: bool = False) -> str:
@@ -27,32 +36,71 @@ class TextCleaner:
         if not text:
             return ""
 
-        # Handle encoding issues
-        text = self._fix_encoding(text)
+        # Handle encoding issues (pure ASCII has no BOM and is already NFKD-normal)
+        if text.isascii():
+            if '\u0000' in text:
+                text = text.replace('\u0000', '')
+        else:
+            text = self._fix_encoding(text)
 
         # Remove URLs
-        if remove_urls:
+        if remove_urls and 'http' in text:
             text = self.url_pattern.sub('', text)
 
         # Remove mentions
-        if remove_mentions:
+        if remove_mentions and '@' in text:
             text = self.mention_pattern.sub('', text)
 
         # Remove hashtags
-        if remove_hashtags:
+        if remove_hashtags and '#' in text:
             text = self.hashtag_pattern.sub('', text)
 
         # Remove emojis
-        if remove_emojis:
+        if remove_emojis and not text.isascii():
             text = self.emoji_pattern.sub('', text)
 
-        # Remove extra whitespace and special characters
-        text = re.sub(r'\s+', ' ', text)  # Multiple spaces to single space
-        text = re.sub(r'\n+', ' ', text)  # Multiple newlines to space
+        # Collapse whitespace (spaces and newlines) to single spaces; printable ASCII without
+        # double spaces has nothing to collapse (every other ASCII whitespace is unprintable)
+        if not text.isascii() or '  ' in text or not text.isprintable():
+            text = self.whitespace_pattern.sub(' ', text)
         text = text.strip()
 
         return text
 
+    def clean_batch(self, texts: Iterable[str], **options) -> List[str]:
+        """Clean a page or column of texts; each distinct text is cleaned once."""
+        texts = list(texts)
+        cleaned = {text: self.clean_text(text, **options) for text in dict.fromkeys(texts)}
+        return [cleaned[text] for text in texts]
+
+    def _process_text_uncached(self, raw_text: str) -> Tuple[str, Dict[str, List[str]], str]:
+        cleaned_text = self.clean_text(raw_text)
+        detected_keywords = self.detect_target_keywords(cleaned_text)
+        return cleaned_text, detected_keywords, self.categorize_comment_sentiment(detected_keywords)
+
+    def process_text(self, raw_text: str) -> Tuple[str, Dict[str, List[str]], str]:
+        """Clean one comment and detect its keywords and sentiment (memoised by text)."""
+        raw_text = raw_text or ''
+        if len(raw_text) <= TEXT_CACHE_MAX_LENGTH:
+            cleaned_text, detected_keywords, sentiment_category = self._process_cached(raw_text)
+        else:
+            # Long texts rarely repeat and would only evict the short ones
+            cleaned_text, detected_keywords, sentiment_category = self._process_text_uncached(raw_text)
+        # Cached results are shared; hand out a fresh keyword dict
+        if detected_keywords:
+            detected_keywords = {keyword: list(variations) for keyword, variations in detected_keywords.items()}
+        else:
+            detected_keywords = {}
+        return cleaned_text, detected_keywords, sentiment_category
+
+    def process_batch(self, texts: Iterable[str]) -> List[Tuple[str, Dict[str, List[str]], str]]:
+        """process_text over a page or column: [(cleaned_text, detected_keywords, sentiment_category), ...]."""
+        return [self.process_text(text) for text in texts]
+
+    def cache_info(self):
+        """Hit/miss statistics of the process_text memo."""
+        return self._process_cached.cache_info()
+
     def _fix_encoding(self, text: str) -> str:
         """Fix common encoding issues."""
         try:
@@ -72,19 +120,7 @@ class TextCleaner:
 
     def detect_target_keywords(self, text: str) -> Dict[str, List[str]]:
         """Detect target keywords and their variations in text."""
-        text_lower = text.lower()
-        detected_keywords = {}
-
-        for main_keyword, variations in ALL_KEYWORDS.items():
-            found_variations = []
-            for variation in variations:
-                if variation.lower() in text_lower:
-                    found_variations.append(variation)
-
-            if found_variations:
-                detected_keywords[main_keyword] = found_variations
-
-        return detected_keywords
+        return self.keyword_matcher.match(text)
 
     def extract_keywords(self, text: str, min_length: int = 3) -> List[str]:
         """Extract general keywords from text."""
@@ -105,6 +141,22 @@ class TextCleaner:
         else:
             return 'neutral'
 
+    def keyword_bitmask(self, detected_keywords: Dict[str, List[str]]) -> int:
+        """Encode detected main keywords as an integer bitmask (see KEYWORD_BITS)."""
+        mask = 0
+        for keyword in detected_keywords:
+            if keyword in KEYWORD_BITS:
+                mask |= 1 << KEYWORD_BITS[keyword]
+        return mask
+
+    def keywords_from_bitmask(self, mask: int) -> List[str]:
+        """Decode a keyword bitmask back into main keyword names."""
+        return [keyword for keyword, bit in KEYWORD_BITS.items() if mask >> bit & 1]
+
+    def sentiment_code(self, sentiment_category: str) -> int:
+        """Encode a sentiment category as a small integer (see SENTIMENT_CODES)."""
+        return SENTIMENT_CODES.get(sentiment_category, SENTIMENT_CODES['neutral'])
+
     def extract_emojis(self, text: str) -> List[str]:
         """Extract emojis from text."""
         return self.emoji_pattern.findall(text)
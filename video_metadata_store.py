@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import threading
+from settings import VIDEO_METADATA_DIR, VIDEO_VOLATILE_FIELDS
+
+# Field order of video dicts built by MultiChannelVideoFetcher, restored when expanding
+VIDEO_FIELD_ORDER = [
+    'video_id', 'channel_id', 'title', 'description', 'publish_date',
+    'view_count', 'comment_count', 'like_count', 'thumbnail_url'
+]
+
+
+class VideoMetadataStore:
+    # Static video metadata is stored once per distinct payload (objects/<hash>.json, written once);
+    # descriptions get their own objects since channels repeat the same promo text on many videos.
+    # Records carry only video_id, metadata_hash and the volatile statistics.
+    _shared = None
+    _shared_guard = threading.Lock()
+
+    def __init__(self, store_dir=VIDEO_METADATA_DIR):
+        self.store_dir = store_dir
+        self.objects_dir = store_dir / 'objects'
+        self.latest_file = store_dir / 'videos.json'
+        self.history_file = store_dir / 'stats_history.jsonl'
+        self.lock = threading.RLock()
+        self._objects = {}  # hash -> parsed object, for this run
+        self.latest = self._load_latest()  # video_id -> {hash, stats, updated}
+        self.stats = {'objects_written': 0, 'objects_reused': 0}
+
+    @classmethod
+    def shared(cls):
+        """The process-wide store used by default by the archive writers and readers."""
+        with cls._shared_guard:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _load_latest(self):
+        try:
+            if self.latest_file.exists():
+                with open(self.latest_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading video metadata catalog: {e}")
+        return {}
+
+    def _object_path(self, digest):
+        return self.objects_dir / digest[:2] / f"{digest}.json"
+
+    def put(self, obj):
+        """Store a JSON value once by content hash; returns the hash."""
+        data = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+
+        with self.lock:
+            if digest in self._objects:
+                self.stats['objects_reused'] += 1
+                return digest
+            self._objects[digest] = obj
+
+        object_path = self._object_path(digest)
+        if object_path.exists():
+            with self.lock:
+                self.stats['objects_reused'] += 1
+            return digest
+
+        # Objects are immutable; a concurrent writer of the same hash writes the same bytes
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = object_path.with_name(f"{object_path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, object_path)
+        with self.lock:
+            self.stats['objects_written'] += 1
+        return digest
+
+    def get(self, digest):
+        """Load a stored object by hash (None if it is missing)."""
+        with self.lock:
+            if digest in self._objects:
+                return self._objects[digest]
+
+        try:
+            with open(self._object_path(digest), 'r', encoding='utf-8') as f:
+                obj = json.load(f)
+        except FileNotFoundError:
+            print(f"⚠️ Missing video metadata object {digest}")
+            return None
+
+        with self.lock:
+            self._objects[digest] = obj
+        return obj
+
+    def compact(self, video_info):
+        """Replace static metadata with its hash: {video_id, metadata_hash, <volatile stats>}.
+
+        Already compact or empty video_info is returned unchanged.
+        """
+        if not video_info or 'metadata_hash' in video_info:
+            return video_info
+
+        static = {key: value for key, value in video_info.items()
+                  if key not in VIDEO_VOLATILE_FIELDS and key != 'video_id'}
+        if 'description' in static:
+            static['description_hash'] = self.put(static.pop('description'))
+
+        compact_info = {'metadata_hash': self.put(static)}
+        if 'video_id' in video_info:
+            compact_info = {'video_id': video_info['video_id'], **compact_info}
+        for field in VIDEO_VOLATILE_FIELDS:
+            if field in video_info:
+                compact_info[field] = video_info[field]
+        return compact_info
+
+    def expand(self, video_info):
+        """Inverse of compact(); video_info without a metadata_hash is returned unchanged."""
+        if not video_info or 'metadata_hash' not in video_info:
+            return video_info
+
+        static = self.get(video_info['metadata_hash'])
+        if static is None:
+            return {key: value for key, value in video_info.items() if key != 'metadata_hash'}
+
+        fields = {key: value for key, value in static.items() if key != 'description_hash'}
+        if 'description_hash' in static:
+            fields['description'] = self.get(static['description_hash'])
+        fields.update((key, value) for key, value in video_info.items() if key != 'metadata_hash')
+
+        expanded = {key: fields.pop(key) for key in VIDEO_FIELD_ORDER if key in fields}
+        expanded.update(fields)
+        return expanded
+
+    def record_run(self, videos_data, timestamp):
+        """Store a run's video metadata; returns videos_data with compact video records.
+
+        Statistics changes since the last run are appended to the history as deltas.
+        """
+        compact_videos_data = {}
+        deltas = {}
+
+        for channel_id, channel_data in videos_data.items():
+            compact_videos = []
+            for video in channel_data.get('videos', []):
+                compact_info = self.compact(video)
+                compact_videos.append(compact_info)
+
+                video_id = compact_info.get('video_id')
+                if not video_id:
+                    continue
+                stats = [compact_info.get(field, 0) for field in VIDEO_VOLATILE_FIELDS]
+                with self.lock:
+                    previous = self.latest.get(video_id, {}).get('stats', [0] * len(stats))
+                    if stats != previous:
+                        deltas[video_id] = [current - before for current, before in zip(stats, previous)]
+                    self.latest[video_id] = {
+                        'hash': compact_info['metadata_hash'],
+                        'stats': stats,
+                        'updated': timestamp
+                    }
+
+            compact_videos_data[channel_id] = {**channel_data, 'videos': compact_videos}
+
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        if deltas:
+            with open(self.history_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'timestamp': timestamp, 'deltas': deltas}, separators=(',', ':')) + '\n')
+        self.save()
+
+        print(f"🎞️ Video metadata: {len(deltas):,} videos with changed stats, "
+              f"{self.stats['objects_written']:,} new objects, {self.stats['objects_reused']:,} reused")
+        return compact_videos_data
+
+    def save(self):
+        """Persist the latest hash and statistics of every known video."""
+        try:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.latest_file.with_name(self.latest_file.name + '.tmp')
+            with self.lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.latest, f, separators=(',', ':'))
+            os.replace(tmp_path, self.latest_file)
+        except Exception as e:
+            print(f"Error saving video metadata catalog: {e}")
+
+    def stats_history(self, video_id):
+        """Replay the delta history into [(timestamp, {view_count, comment_count, like_count}), ...]."""
+        history = []
+        if not self.history_file.exists():
+            return history
+
+        current = [0] * len(VIDEO_VOLATILE_FIELDS)
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                delta = entry['deltas'].get(video_id)
+                if delta is None:
+                    continue
+                current = [value + change for value, change in zip(current, delta)]
+                history.append((entry['timestamp'], dict(zip(VIDEO_VOLATILE_FIELDS, current))))
+        return history